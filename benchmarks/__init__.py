@@ -0,0 +1 @@
+"""离线基准测试，入口为 python -m benchmarks.run"""
@@ -0,0 +1,213 @@
+"""离线基准测试用的 Ollama 替身，提供 /api/chat 与 /api/embed"""
+
+import asyncio
+import hashlib
+import json
+import re
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+from aiohttp import web
+
+from core.utils.model_lifecycle import parse_keep_alive
+
+_WORD = re.compile(r"\w+")
+
+
+class FakeOllama:
+    """按固定速率流式输出 token 的聊天接口，以及确定性的嵌入接口
+
+    - 最后一条消息是用户提问且配置了 tool_name 时，本轮返回一次工具调用，
+      收到工具结果后再输出文本回复
+    - 嵌入向量由词哈希得到，同样的文本总是得到同样的向量，词重叠越多越相似
+    - 模型未驻留（首次请求、keep_alive 已过期或 options 变化）时先等待
+      load_seconds 模拟加载；不含消息的对话请求只加载模型
+    """
+
+    def __init__(
+        self,
+        tokens_per_second: float = 200.0,
+        response_tokens: int = 32,
+        prefill_seconds: float = 0.0,
+        tool_name: Optional[str] = None,
+        tool_arguments: Optional[dict] = None,
+        embedding_dim: int = 384,
+        embed_latency: float = 0.0,
+        load_seconds: float = 0.0,
+        prefill_tokens_per_second: float = 0.0,
+    ):
+        self.tokens_per_second = tokens_per_second
+        self.response_tokens = response_tokens
+        self.prefill_seconds = prefill_seconds
+        self.tool_name = tool_name
+        self.tool_arguments = tool_arguments or {}
+        self.embedding_dim = embedding_dim
+        self.embed_latency = embed_latency
+        self.load_seconds = load_seconds
+        self.prefill_tokens_per_second = prefill_tokens_per_second
+        self.loads = 0
+        self.last_payloads: Dict[str, dict] = {}
+        # 模型 -> (驻留到期时间, 加载时的 options)
+        self._resident: Dict[str, tuple] = {}
+        self.chat_requests = 0
+        self.embed_requests = 0
+        self.embedded_inputs = 0
+        self._word_vectors: Dict[str, np.ndarray] = {}
+        self._runner: Optional[web.AppRunner] = None
+        self.base_url = ""
+
+    @property
+    def chat_url(self) -> str:
+        return f"{self.base_url}/api/chat"
+
+    @property
+    def embed_url(self) -> str:
+        return f"{self.base_url}/api/embed"
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0):
+        app = web.Application()
+        app.router.add_post("/api/chat", self._chat)
+        app.router.add_post("/api/embed", self._embed)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        self.base_url = f"http://{host}:{self._runner.addresses[0][1]}"
+        return self
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.embedding_dim, dtype=np.float32)
+        for word in _WORD.findall(text.casefold()):
+            vector += self._word_vector(word)
+        if not vector.any():
+            vector[0] = 1.0
+        return vector.tolist()
+
+    def _word_vector(self, word: str) -> np.ndarray:
+        vector = self._word_vectors.get(word)
+        if vector is None:
+            seed = int.from_bytes(hashlib.blake2b(word.encode()).digest()[:8], "big")
+            rng = np.random.default_rng(seed)
+            vector = rng.standard_normal(self.embedding_dim).astype(np.float32)
+            self._word_vectors[word] = vector
+        return vector
+
+    async def _embed(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        inputs = payload["input"]
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        self.last_payloads["embed"] = payload
+        await self._load(payload)
+        self.embed_requests += 1
+        self.embedded_inputs += len(inputs)
+        if self.embed_latency:
+            await asyncio.sleep(self.embed_latency)
+        return web.json_response(
+            {"model": payload["model"], "embeddings": [self.embed(i) for i in inputs]}
+        )
+
+    async def _load(self, payload: dict):
+        model, options = payload["model"], payload.get("options") or {}
+        resident = self._resident.get(model)
+        if (
+            resident is None
+            or resident[0] <= time.monotonic()
+            or resident[1] != options
+        ):
+            self.loads += 1
+            if self.load_seconds:
+                await asyncio.sleep(self.load_seconds)
+        keep_alive = parse_keep_alive(payload.get("keep_alive"))
+        expires = float("inf") if keep_alive is None else time.monotonic() + keep_alive
+        self._resident[model] = (expires, options)
+
+    async def _chat(self, request: web.Request) -> web.StreamResponse:
+        payload = await request.json()
+        self.chat_requests += 1
+        self.last_payloads["chat"] = payload
+        await self._load(payload)
+        if not payload.get("messages"):
+            return web.json_response(
+                {
+                    "model": payload["model"],
+                    "message": {"role": "assistant", "content": ""},
+                    "done": True,
+                    "done_reason": "load",
+                }
+            )
+        messages = payload["messages"]
+
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await response.prepare(request)
+        started = time.perf_counter()
+        # 按消息与工具 schema 的长度估算提示 token 数，预填充耗时与之成正比
+        prompt_tokens = (
+            len(json.dumps(messages)) + len(json.dumps(payload.get("tools") or []))
+        ) // 4
+        prefill = self.prefill_seconds
+        if self.prefill_tokens_per_second:
+            prefill += prompt_tokens / self.prefill_tokens_per_second
+        if prefill:
+            await asyncio.sleep(prefill)
+
+        async def send(chunk: dict):
+            await response.write((json.dumps(chunk) + "\n").encode("utf-8"))
+
+        eval_count = 0
+        if self.tool_name and messages[-1].get("role") == "user":
+            tool_call = {
+                "function": {"name": self.tool_name, "arguments": self.tool_arguments}
+            }
+            await send(
+                {
+                    "model": payload["model"],
+                    "message": {
+                        "role": "assistant",
+                        "content": "",
+                        "tool_calls": [tool_call],
+                    },
+                    "done": False,
+                }
+            )
+            eval_count = 1
+        else:
+            delay = 1.0 / self.tokens_per_second if self.tokens_per_second else 0.0
+            for i in range(self.response_tokens):
+                await send(
+                    {
+                        "model": payload["model"],
+                        "message": {"role": "assistant", "content": f"tok{i} "},
+                        "done": False,
+                    }
+                )
+                if delay:
+                    await asyncio.sleep(delay)
+            eval_count = self.response_tokens
+
+        elapsed = time.perf_counter() - started
+        await send(
+            {
+                "model": payload["model"],
+                "message": {"role": "assistant", "content": ""},
+                "done": True,
+                "prompt_eval_count": prompt_tokens,
+                "prompt_eval_duration": int(max(prefill, 1e-6) * 1e9),
+                "eval_count": eval_count,
+                "eval_duration": int(max(elapsed - prefill, 1e-6) * 1e9),
+                "total_duration": int(elapsed * 1e9),
+            }
+        )
+        await response.write_eof()
+        return response
@@ -0,0 +1,721 @@
+"""离线基准测试
+
+不依赖真实 Ollama 与 npx：启动本地 FakeOllama 和 stub MCP 服务端，测量
+文档编码吞吐、不同语料规模下的检索延迟、带工具调用的单轮延迟以及多会话并发吞吐。
+
+    python -m benchmarks.run                     # 运行并与 benchmarks/baseline.json 对比
+    python -m benchmarks.run --quick --check     # 小规模运行，有退化时返回非零退出码
+    python -m benchmarks.run --save-baseline     # 用本次结果覆盖基线
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import sys
+import time
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from core.agent import Agent
+from core.client import MCPClient
+from core.client_pool import MCPClientPool
+from core.llm import consume_stream
+from core.utils.embedding_retriever import EmbeddingRetriever
+from core.utils.http_client import HTTPClient
+from core.utils.ivf_index import IVFVectorStore
+from core.utils.semantic_cache import SemanticCache
+from core.utils.vector_store import VectorStore
+
+from .fake_ollama import FakeOllama
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STUB_SERVER = os.path.join(ROOT, "tests", "stub_mcp_server.py")
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+DEFAULT_OUTPUT = os.path.join(ROOT, "benchmarks", "results.json")
+
+FIRST_NAMES = ["Leanne", "Ervin", "Clementine", "Patricia", "Chelsey", "Dennis"]
+LAST_NAMES = ["Graham", "Howell", "Bauch", "Lebsack", "Dietrich", "Schulist"]
+CITIES = ["Gwenborough", "Wisokyburgh", "McKenziehaven", "South Elvis", "Roscoeview"]
+COMPANIES = ["Romaguera-Crona", "Deckow-Crist", "Keebler LLC", "Robel-Corkery"]
+
+CONFIGS = {
+    "full": {
+        "documents": 2000,
+        "embedding_dim": 384,
+        "corpus_sizes": [1_000, 10_000, 100_000],
+        "retrieval_dim": 768,
+        "quantization_size": 50_000,
+        "ann_size": 200_000,
+        "queries": 200,
+        "tool_turns": 30,
+        "tool_latency": 0.01,
+        "pool_calls": 64,
+        "model_load_seconds": 1.0,
+        "selection_tools": 40,
+        "prefill_tokens_per_second": 10000.0,
+        "sessions": 8,
+        "session_turns": 5,
+        "tokens_per_second": 500.0,
+        "response_tokens": 32,
+    },
+    "quick": {
+        "documents": 300,
+        "embedding_dim": 128,
+        "corpus_sizes": [1_000, 10_000],
+        "retrieval_dim": 384,
+        "quantization_size": 5_000,
+        "ann_size": 20_000,
+        "queries": 50,
+        "tool_turns": 10,
+        "tool_latency": 0.01,
+        "pool_calls": 24,
+        "model_load_seconds": 0.2,
+        "selection_tools": 20,
+        "prefill_tokens_per_second": 5000.0,
+        "sessions": 4,
+        "session_turns": 3,
+        "tokens_per_second": 1000.0,
+        "response_tokens": 16,
+    },
+}
+
+
+def synthetic_documents(count: int) -> List[str]:
+    """生成与 knowledge/ 中用户档案格式相同的文档"""
+    documents = []
+    for i in range(count):
+        first = FIRST_NAMES[i % len(FIRST_NAMES)]
+        last = LAST_NAMES[(i // len(FIRST_NAMES)) % len(LAST_NAMES)]
+        documents.append(
+            f"# {first} {last} {i}\n\n"
+            f"- **Username**: {first.lower()}{i}\n"
+            f"- **Email**: {first.lower()}.{last.lower()}{i}@example.org\n"
+            f"- **City**: {CITIES[i % len(CITIES)]}\n"
+            f"- **Company**: {COMPANIES[i % len(COMPANIES)]}\n"
+        )
+    return documents
+
+
+def latency_summary(samples: List[float]) -> Dict[str, float]:
+    values = np.asarray(samples) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+    }
+
+
+def stub_client(name: str, latency: float) -> MCPClient:
+    return MCPClient(name, sys.executable, [STUB_SERVER, str(latency)])
+
+
+async def bench_ingestion(server: FakeOllama, documents: List[str]) -> Dict[str, float]:
+    retriever = EmbeddingRetriever("bench-embed", server.embed_url)
+    try:
+        started = time.perf_counter()
+        await retriever.embed_documents_batch(
+            documents, [{"source": f"doc_{i}"} for i in range(len(documents))]
+        )
+        elapsed = time.perf_counter() - started
+    finally:
+        await retriever.http_client.close()
+    return {"docs_per_second": round(len(documents) / elapsed, 1)}
+
+
+async def bench_retrieval(
+    corpus_sizes: List[int], dim: int, queries: int, top_k: int = 3
+) -> Dict[str, Dict[str, float]]:
+    rng = np.random.default_rng(0)
+    query_vectors = rng.standard_normal((queries, dim)).astype(np.float32)
+    results = {}
+    for size in corpus_sizes:
+        matrix = rng.standard_normal((size, dim)).astype(np.float32)
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+        store = VectorStore()
+        store.attach(matrix, [f"doc {i}" for i in range(size)])
+
+        await store.search(query_vectors[0], top_k)  # 预热
+        samples = []
+        for query in query_vectors:
+            started = time.perf_counter()
+            await store.search(query, top_k)
+            samples.append(time.perf_counter() - started)
+        results[f"n={size}"] = latency_summary(samples)
+    return results
+
+
+def clustered_vectors(
+    rng: np.random.Generator, count: int, dim: int, clusters: int = 64
+) -> np.ndarray:
+    """带簇结构的归一化向量，比纯随机向量更接近真实嵌入的分布"""
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, count)
+    vectors = centers[labels] + 0.5 * rng.standard_normal((count, dim)).astype(
+        np.float32
+    )
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def recall_at_k(hits: List[List[tuple]], truth: List[set], top_k: int) -> float:
+    return round(
+        float(
+            np.mean([len(t & {i for i, _ in h}) / top_k for h, t in zip(hits, truth)])
+        ),
+        4,
+    )
+
+
+async def bench_quantization(
+    size: int, dim: int, queries: int, top_k: int = 10
+) -> Dict[str, Dict[str, float]]:
+    """各存储模式的每向量内存、检索延迟，以及相对 float32 精确结果的 recall@k"""
+    rng = np.random.default_rng(1)
+    matrix = clustered_vectors(rng, size, dim)
+    query_vectors = clustered_vectors(rng, queries, dim)
+    documents = [f"doc {i}" for i in range(size)]
+
+    exact = VectorStore()
+    exact.attach(matrix, documents)
+    truth = [
+        {i for i, _ in hits} for hits in exact.search_ids_batch(query_vectors, top_k)
+    ]
+
+    results = {}
+    for mode in (None, "float16", "int8"):
+        store = VectorStore(quantization=mode)
+        store.attach(matrix, documents)
+        samples, hits = [], []
+        for query in query_vectors:
+            started = time.perf_counter()
+            hits.append(store.search_ids(query, top_k))
+            samples.append(time.perf_counter() - started)
+        stats = store.memory_stats()
+        entry = {
+            "bytes_per_vector": stats["bytes_per_vector"],
+            f"recall@{top_k}": recall_at_k(hits, truth, top_k),
+            **latency_summary(samples),
+        }
+        if mode:
+            # 不做精确重排时的召回率，用于评估重排的收益
+            store.rescore_factor = 0
+            raw = store.search_ids_batch(query_vectors, top_k)
+            entry[f"recall@{top_k}_no_rescore"] = recall_at_k(raw, truth, top_k)
+        results[stats["mode"]] = entry
+    return results
+
+
+async def bench_ann(
+    size: int, dim: int, queries: int, top_k: int = 10
+) -> Dict[str, Dict[str, float]]:
+    """IVF 与精确扫描对比：训练耗时、不同 nprobe 下的延迟与 recall@k"""
+    rng = np.random.default_rng(2)
+    matrix = clustered_vectors(rng, size, dim, clusters=256)
+    query_vectors = clustered_vectors(rng, queries, dim, clusters=256)
+    documents = [f"doc {i}" for i in range(size)]
+
+    def timed(store) -> Tuple[List[List[tuple]], List[float]]:
+        hits, samples = [], []
+        for query in query_vectors:
+            started = time.perf_counter()
+            hits.append(store.search_ids(query, top_k))
+            samples.append(time.perf_counter() - started)
+        return hits, samples
+
+    exact = VectorStore()
+    exact.attach(matrix, documents)
+    exact_hits, samples = timed(exact)
+    truth = [{i for i, _ in hits} for hits in exact_hits]
+    results = {"flat": latency_summary(samples)}
+
+    ivf = IVFVectorStore(min_train_size=0)
+    ivf.attach(matrix, documents)
+    started = time.perf_counter()
+    ivf.train()
+    build_seconds = round(time.perf_counter() - started, 2)
+    for nprobe in (4, 8, 16, 32, None):
+        ivf.nprobe = nprobe
+        hits, samples = timed(ivf)
+        results[f"ivf_nprobe={nprobe or 'auto'}"] = {
+            f"recall@{top_k}": recall_at_k(hits, truth, top_k),
+            **latency_summary(samples),
+        }
+    results["ivf_nprobe=auto"]["nprobe"] = ivf.probes
+    results["ivf_build_seconds"] = build_seconds
+    return results
+
+
+async def bench_hybrid(
+    server: FakeOllama, documents: List[str], queries: int
+) -> Dict[str, Dict[str, float]]:
+    """精确词查询（用户名）与泛化查询，分别对比纯向量检索和混合检索的延迟"""
+    exact_queries = [
+        f"What is the email of {doc.split()[1].lower()}{i}?"
+        for i, doc in enumerate(documents[:queries])
+    ]
+    vague_queries = [
+        f"who works at {COMPANIES[i % len(COMPANIES)]} in {CITIES[i % len(CITIES)]}"
+        for i in range(queries)
+    ]
+    results = {}
+    for mode, hybrid in (("dense", False), ("hybrid", True)):
+        # 关闭缓存，重复的查询也要实际检索
+        retriever = EmbeddingRetriever(
+            "bench-embed", server.embed_url, cache_size=0, hybrid=hybrid
+        )
+        try:
+            await retriever.embed_documents_batch(documents)
+            retriever.sync_lexical_index()
+            for kind, prompts in (("exact", exact_queries), ("vague", vague_queries)):
+                before = server.embed_requests
+                samples = []
+                for prompt in prompts:
+                    started = time.perf_counter()
+                    await retriever.retrieve(prompt, 3)
+                    samples.append(time.perf_counter() - started)
+                results[f"{mode}_{kind}"] = {
+                    **latency_summary(samples),
+                    "embed_calls": server.embed_requests - before,
+                }
+        finally:
+            await retriever.http_client.close()
+    return results
+
+
+async def bench_model_warmup(load_seconds: float) -> Dict[str, float]:
+    """模型需要加载时，首轮对话在未预热与已预热两种情况下的延迟"""
+    results = {}
+    async with FakeOllama(
+        tokens_per_second=0, response_tokens=8, load_seconds=load_seconds
+    ) as server:
+        for mode in ("cold", "preloaded"):
+            agent = Agent(f"bench-{mode}", server.chat_url, enable_memory=False)
+            await agent.init()
+            try:
+                if mode == "preloaded":
+                    await agent.warm_up()
+                started = time.perf_counter()
+                await agent.invoke("hello", echo=False)
+                results[f"first_turn_{mode}_ms"] = round(
+                    (time.perf_counter() - started) * 1000, 3
+                )
+            finally:
+                await agent.close()
+    return results
+
+
+class SchemaClient:
+    """只提供工具列表的假客户端，用于测量工具 schema 对请求体积的影响"""
+
+    def __init__(self, count: int):
+        self.name = "schemas"
+        self.tools = [
+            SimpleNamespace(
+                name=f"tool_{i}",
+                description=f"{CITIES[i % len(CITIES)]} {COMPANIES[i % len(COMPANIES)]} "
+                f"operation number {i} for records and reports",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        f"field_{j}": {"type": "string", "description": f"field {j}"}
+                        for j in range(8)
+                    },
+                },
+            )
+            for i in range(count)
+        ]
+
+    def get_all_tools(self):
+        return self.tools
+
+    async def connect_to_server(self):
+        pass
+
+    async def close_connection(self):
+        pass
+
+
+async def bench_tool_selection(
+    tools: int, turns: int, prefill_tokens_per_second: float, top_n: int = 5
+) -> Dict[str, Dict[str, float]]:
+    """工具较多时，每轮发送全部工具与只发送 top_n 个工具的延迟和提示 token 数"""
+    results = {}
+    async with FakeOllama(
+        tokens_per_second=0,
+        response_tokens=4,
+        prefill_tokens_per_second=prefill_tokens_per_second,
+    ) as server:
+        for mode, tool_top_n in (("all_tools", None), (f"top_{top_n}", top_n)):
+            retriever = EmbeddingRetriever("bench-embed", server.embed_url)
+            agent = Agent(
+                "bench-chat",
+                server.chat_url,
+                clients=[SchemaClient(tools)],
+                vector_database=retriever,
+                enable_memory=False,
+                tool_top_n=tool_top_n,
+            )
+            await agent.init()
+            try:
+                await agent.warm_up()
+                samples, prompt_tokens = [], []
+                for i in range(turns):
+                    prompt = f"report for {CITIES[i % len(CITIES)]} number {i}"
+                    started = time.perf_counter()
+                    done = await consume_stream(agent.stream_invoke(prompt), False)
+                    samples.append(time.perf_counter() - started)
+                    prompt_tokens.append(done.usage["prompt_eval_count"])
+            finally:
+                await agent.close()
+            results[mode] = {
+                **latency_summary(samples),
+                "prompt_tokens": int(np.mean(prompt_tokens)),
+            }
+    return results
+
+
+async def bench_response_cache(
+    documents: List[str], turns: int, config: dict
+) -> Dict[str, Dict[str, float]]:
+    """不同会话反复提出的同类问题（大小写、标点、语气词不同），有无语义回答缓存的延迟"""
+    questions = [
+        f"where does {first} {last} live"
+        for first, last in zip(FIRST_NAMES, LAST_NAMES)
+    ]
+    variants = ["{}", "{}?", "{}, please", "{} ?"]
+    prompts = [
+        variants[(i // len(questions)) % len(variants)].format(
+            questions[i % len(questions)]
+        )
+        for i in range(turns * 2)
+    ]
+    results = {}
+    async with FakeOllama(
+        tokens_per_second=config["tokens_per_second"],
+        response_tokens=config["response_tokens"],
+        embedding_dim=config["embedding_dim"],
+    ) as server:
+        for mode, cache in (
+            ("uncached", None),
+            ("cached", SemanticCache("bench-embed", threshold=0.9)),
+        ):
+            retriever = EmbeddingRetriever("bench-embed", server.embed_url)
+            await retriever.embed_documents_batch(documents)
+            agent = Agent(
+                "bench-chat",
+                server.chat_url,
+                clients=[],
+                vector_database=retriever,
+                enable_memory=False,
+                response_cache=cache,
+            )
+            await agent.init()
+            try:
+                samples = []
+                for prompt in prompts:
+                    # 回答缓存只用于会话的第一轮，每个提问使用一个新会话
+                    started = time.perf_counter()
+                    await agent.fork().invoke(prompt, echo=False)
+                    samples.append(time.perf_counter() - started)
+            finally:
+                await agent.close()
+            results[mode] = latency_summary(samples)
+            if cache is not None:
+                results[mode]["hit_rate"] = round(cache.hit_rate, 3)
+    return results
+
+
+async def bench_mcp_pool(
+    calls: int, work_seconds: float = 0.02, replicas: int = 4
+) -> Dict[str, Dict[str, float]]:
+    """并发调用占用服务端事件循环的工具，单个服务端进程与多副本连接池的吞吐"""
+    results = {}
+    for mode, client in (
+        ("single", MCPClient("stub", sys.executable, [STUB_SERVER])),
+        (
+            f"pool_{replicas}",
+            MCPClientPool(
+                "stub",
+                sys.executable,
+                [STUB_SERVER],
+                min_replicas=replicas,
+                max_replicas=replicas,
+            ),
+        ),
+    ):
+        await client.connect_to_server()
+        samples = []
+
+        async def timed_call():
+            started = time.perf_counter()
+            await client.call_tool("block", {"seconds": work_seconds})
+            samples.append(time.perf_counter() - started)
+
+        try:
+            started = time.perf_counter()
+            await asyncio.gather(*[timed_call() for _ in range(calls)])
+            elapsed = time.perf_counter() - started
+        finally:
+            await client.close_connection()
+        results[mode] = {
+            "calls_per_second": round(calls / elapsed, 1),
+            **latency_summary(samples),
+        }
+    return results
+
+
+async def bench_tool_loop(
+    server: FakeOllama, turns: int, tool_latency: float
+) -> Dict[str, float]:
+    """每轮先由模型发起一次工具调用，工具返回后再生成回复"""
+    agent = Agent(
+        "bench-chat",
+        server.chat_url,
+        clients=[stub_client("stub", tool_latency)],
+        enable_memory=False,
+    )
+    await agent.init()
+    try:
+        await agent.invoke("warm up", echo=False)
+        samples = []
+        for i in range(turns):
+            started = time.perf_counter()
+            await agent.invoke(f"question {i}", echo=False)
+            samples.append(time.perf_counter() - started)
+    finally:
+        await agent.close()
+    return latency_summary(samples)
+
+
+async def bench_sessions(
+    server: FakeOllama, sessions: int, turns: int, tool_latency: float
+) -> Dict[str, float]:
+    """多个会话共享 MCP 客户端与连接池并发对话"""
+    http_client = HTTPClient()
+    client = stub_client("stub", tool_latency)
+    agents = [
+        Agent(
+            "bench-chat",
+            server.chat_url,
+            clients=[client],
+            http_client=http_client,
+        )
+        for _ in range(sessions)
+    ]
+    samples = []
+
+    async def run_session(agent: Agent, session: int):
+        for turn in range(turns):
+            started = time.perf_counter()
+            await agent.invoke(f"session {session} question {turn}", echo=False)
+            samples.append(time.perf_counter() - started)
+
+    try:
+        for agent in agents:
+            await agent.init()
+        started = time.perf_counter()
+        await asyncio.gather(*[run_session(a, i) for i, a in enumerate(agents)])
+        elapsed = time.perf_counter() - started
+    finally:
+        # 各会话共享客户端与连接池，只关闭一次
+        await client.close_connection()
+        await http_client.close()
+    return {
+        "turns_per_second": round(sessions * turns / elapsed, 2),
+        **latency_summary(samples),
+    }
+
+
+def flatten(results: dict, prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}."))
+        else:
+            flat[name] = value
+    return flat
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    """返回相对基线退化超过 tolerance 的指标说明
+
+    以 _ms 结尾的指标越小越好，以 per_second 结尾的越大越好，其余不比较。
+    """
+    current, previous = flatten(results), flatten(baseline)
+    regressions = []
+    for name, value in sorted(current.items()):
+        base = previous.get(name)
+        if not base:
+            continue
+        if name.endswith("_ms"):
+            change = value / base - 1
+        elif name.endswith("per_second"):
+            change = base / value - 1 if value else float("inf")
+        else:
+            continue
+        if change > tolerance:
+            regressions.append(f"{name}: {base} -> {value}（退化 {change:.0%}）")
+    return regressions
+
+
+SECTIONS = (
+    "ingestion",
+    "retrieval",
+    "quantization",
+    "ann",
+    "hybrid",
+    "model_warmup",
+    "tool_selection",
+    "response_cache",
+    "mcp_pool",
+    "tool_loop",
+    "sessions",
+)
+
+
+async def run_suite(
+    config: dict, verbose: bool = False, sections: Optional[List[str]] = None
+) -> dict:
+    sections = sections or list(SECTIONS)
+    results = {}
+    # 被测代码会打印大量过程信息，默认屏蔽以免干扰结果输出
+    with contextlib.ExitStack() as stack:
+        if not verbose:
+            devnull = stack.enter_context(open(os.devnull, "w"))
+            stack.enter_context(contextlib.redirect_stdout(devnull))
+        server = FakeOllama(
+            tokens_per_second=config["tokens_per_second"],
+            response_tokens=config["response_tokens"],
+            tool_name="pid",
+            embedding_dim=config["embedding_dim"],
+        )
+        async with server:
+            if "ingestion" in sections:
+                results["ingestion"] = await bench_ingestion(
+                    server, synthetic_documents(config["documents"])
+                )
+            if "retrieval" in sections:
+                results["retrieval"] = await bench_retrieval(
+                    config["corpus_sizes"], config["retrieval_dim"], config["queries"]
+                )
+            if "quantization" in sections:
+                results["quantization"] = await bench_quantization(
+                    config["quantization_size"],
+                    config["retrieval_dim"],
+                    config["queries"],
+                )
+            if "ann" in sections:
+                results["ann"] = await bench_ann(
+                    config["ann_size"], config["retrieval_dim"], config["queries"]
+                )
+            if "hybrid" in sections:
+                results["hybrid"] = await bench_hybrid(
+                    server, synthetic_documents(config["documents"]), config["queries"]
+                )
+            if "model_warmup" in sections:
+                results["model_warmup"] = await bench_model_warmup(
+                    config["model_load_seconds"]
+                )
+            if "tool_selection" in sections:
+                results["tool_selection"] = await bench_tool_selection(
+                    config["selection_tools"],
+                    config["tool_turns"],
+                    config["prefill_tokens_per_second"],
+                )
+            if "response_cache" in sections:
+                results["response_cache"] = await bench_response_cache(
+                    synthetic_documents(200), config["tool_turns"], config
+                )
+            if "mcp_pool" in sections:
+                results["mcp_pool"] = await bench_mcp_pool(config["pool_calls"])
+            if "tool_loop" in sections:
+                results["tool_loop"] = await bench_tool_loop(
+                    server, config["tool_turns"], config["tool_latency"]
+                )
+            if "sessions" in sections:
+                results["sessions"] = await bench_sessions(
+                    server,
+                    config["sessions"],
+                    config["session_turns"],
+                    config["tool_latency"],
+                )
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="离线基准测试")
+    parser.add_argument("--quick", action="store_true", help="小规模快速运行")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="结果 JSON 路径")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="基线 JSON 路径")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.25, help="允许的相对退化比例"
+    )
+    parser.add_argument("--check", action="store_true", help="有退化时返回非零")
+    parser.add_argument(
+        "--save-baseline", action="store_true", help="把本次结果写为基线"
+    )
+    parser.add_argument("--verbose", action="store_true", help="显示被测代码的输出")
+    parser.add_argument(
+        "--only", nargs="+", choices=SECTIONS, help="只运行指定的测试项"
+    )
+    args = parser.parse_args(argv)
+
+    profile = "quick" if args.quick else "full"
+    config = CONFIGS[profile]
+    results = asyncio.run(run_suite(config, args.verbose, args.only))
+    report = {
+        "profile": profile,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": config,
+        "results": results,
+    }
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    print(f"结果已写入 {args.output}")
+
+    if args.save_baseline:
+        if args.only:
+            # 只运行了部分测试项时，保留基线中其余项的结果
+            try:
+                with open(args.baseline, "r", encoding="utf-8") as f:
+                    previous = json.load(f)
+                if previous.get("profile") == profile:
+                    report["results"] = {**previous["results"], **results}
+            except OSError:
+                pass
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"基线已更新: {args.baseline}")
+        return 0
+
+    try:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    except OSError:
+        print("未找到基线文件，跳过对比")
+        return 0
+    if baseline.get("profile") != profile:
+        print(f"基线为 {baseline.get('profile')} 规模，与本次运行不同，跳过对比")
+        return 0
+
+    regressions = compare(results, baseline["results"], args.tolerance)
+    if not regressions:
+        print("与基线相比没有明显退化")
+        return 0
+    print("相对基线的退化:")
+    for line in regressions:
+        print(f"  {line}")
+    return 1 if args.check else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
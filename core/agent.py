@@ -1,34 +1,36 @@
 import asyncio
+import copy
 import json
-from typing import Any, List, Optional
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional
 
 from dotenv import load_dotenv
-from mcp import Tool
 
 from core.utils.embedding_retriever import EmbeddingRetriever
 
 from .client import MCPClient
-from .llm import LLM, ToolCall
+from .llm import (
+    CONTEXT_TOP_K,
+    LLM,
+    DoneEvent,
+    LLMResponseData,
+    StreamEvent,
+    TextDelta,
+    ToolCall,
+    ToolResultEvent,
+    consume_stream,
+)
+from .memory import ConversationMemory
+from .tool_registry import ToolRegistry
+from .tool_selector import ToolSelector
+from .utils.http_client import HTTPClient
+from .utils.metrics import metrics
+from .utils.model_lifecycle import ModelLifecycle
+from .utils.semantic_cache import SemanticCache, document_id
 from .utils.util import log_title
 
 load_dotenv()
 
 
-def transform_tools_format(tool_calls: ToolCall, tools: List[Tool]):
-    for tool in tools:
-        # 创建目标数据格式
-        function_info = {
-            "function": {
-                "name": tool.name,
-                "description": tool.description,
-                "parameters": tool.inputSchema,
-            }
-        }
-
-        # 将转换后的数据添加到 ToolCall
-        tool_calls.add_tool_call(function_info)
-
-
 class Agent:
     def __init__(
         self,
@@ -38,6 +40,15 @@ class Agent:
         sys_prompt: Optional[str] = None,
         vector_database: Optional[EmbeddingRetriever] = None,
         enable_memory: bool = True,
+        http_client: Optional[HTTPClient] = None,
+        tool_concurrency: int = 4,
+        tool_timeout: Optional[float] = 60.0,
+        namespace_tools: bool = False,
+        memory: Optional[ConversationMemory] = None,
+        model_lifecycle: Optional[ModelLifecycle] = None,
+        tool_top_n: Optional[int] = None,
+        pinned_tools: Iterable[str] = (),
+        response_cache: Optional[SemanticCache] = None,
     ):
         self.model = model
         self.api_url = api_url
@@ -45,8 +56,36 @@ class Agent:
         self.sys_prompt = sys_prompt
         self.vector_database = vector_database
         self.enable_memory = enable_memory
+        self.memory = memory or ConversationMemory()
+        # 与检索器共用同一个连接池
+        if http_client is None and vector_database is not None:
+            http_client = vector_database.http_client
+        self.http_client = http_client or HTTPClient()
+        # 未指定时只用于预热，请求中不附加 keep_alive 与 options
+        self.model_lifecycle = model_lifecycle or ModelLifecycle(
+            self.http_client, keep_alive=None, rewarm=False
+        )
+        if model not in self.model_lifecycle.models:
+            self.model_lifecycle.add_model("chat", model, api_url)
+        if vector_database is not None:
+            name = vector_database.embedding_model
+            if name not in self.model_lifecycle.models:
+                self.model_lifecycle.add_model("embed", name, vector_database.api_url)
         self.llm = None
-        self.tool_calls = ToolCall()
+        self.tool_registry = ToolRegistry(namespaced=namespace_tools)
+        self.tool_calls = self.tool_registry.tool_calls
+        # 设置 tool_top_n 且有检索器时，每次提问只发送最相关的工具与 pinned_tools
+        self.tool_selector = None
+        if tool_top_n and vector_database is not None:
+            self.tool_selector = ToolSelector(
+                vector_database, self.tool_registry, tool_top_n, pinned_tools
+            )
+        # 语义相近且检索到相同文档的提问直接返回缓存的回答，需要检索器
+        self.response_cache = response_cache if vector_database else None
+        # 每个客户端同时执行的工具调用数上限，以及单次调用超时（秒）
+        self.tool_concurrency = tool_concurrency
+        self.tool_timeout = tool_timeout
+        self._tool_semaphores: Dict[str, asyncio.Semaphore] = {}
 
     async def init(self):
         log_title("初始化智能体")
@@ -67,72 +106,181 @@ class Agent:
                 # 过滤掉失败的客户端
                 self.clients = [client for client in self.clients if client is not None]
 
-                # 获取所有工具
+                # 构建工具注册表，服务端工具列表变化时增量刷新
                 for client in self.clients:
-                    transform_tools_format(self.tool_calls, client.get_all_tools())
+                    self.tool_registry.register(client)
+                    client.on_tools_changed = self.tool_registry.refresh
 
             # 初始化 LLM
-            self.llm = LLM(
-                self.api_url,
-                self.model,
-                self.sys_prompt,
-                self.vector_database,
-                self.tool_calls,
-            )
+            self.llm = self._create_llm(self.memory)
 
         except Exception as e:
             # 捕获并记录异常
             print(f"初始化失败: {e}")
             raise  # 重新抛出异常以便调用者处理
 
+    async def warm_up(self):
+        """预先加载对话模型与嵌入模型，并为已注册的工具计算向量，可与 init() 并发执行"""
+        await self.model_lifecycle.preload()
+        if self.tool_selector is not None:
+            await self.tool_selector.sync()
+
+    def _create_llm(self, memory: ConversationMemory) -> LLM:
+        return LLM(
+            self.api_url,
+            self.model,
+            self.sys_prompt,
+            self.vector_database,
+            self.tool_calls,
+            self.http_client,
+            memory,
+            self.model_lifecycle,
+            self.tool_selector,
+        )
+
+    def fork(self) -> "Agent":
+        """创建一个新会话：共享客户端、工具注册表、检索器与连接池，对话历史独立
+
+        新会话不拥有共享资源，丢弃即可，不要对其调用 close()。
+        """
+        if not self.llm:
+            raise RuntimeError("LLM not initialized")
+        session = copy.copy(self)
+        session.memory = copy.copy(self.memory)
+        session.memory.reset()
+        session.llm = self._create_llm(session.memory)
+        return session
+
     async def close(self):
-        await asyncio.gather(*[client.close_connection() for client in self.clients])
-        self.tool_calls.clear()
+        await self.model_lifecycle.stop()
+        await asyncio.gather(
+            *[client.close_connection() for client in self.clients or []]
+        )
+        self.tool_registry.clear()
+        await self.http_client.close()
 
     def clear_memory(self):
         self.llm.clear_messages()
         print("Memory cleared.")
 
-    async def invoke(self, prompt: str):
+    async def invoke(self, prompt: str, echo: bool = True):
+        done = await consume_stream(self.stream_invoke(prompt), echo)
+        return done.response.content
+
+    async def stream_invoke(self, prompt: str) -> AsyncIterator[StreamEvent]:
+        """流式执行一次完整对话（含工具调用轮次），最后产出汇总统计的 DoneEvent"""
         if not self.llm:
             raise RuntimeError("LLM not initialized")
-        response = await self.llm.chat(prompt)
-        while True:
-            for tool_call in response.tool_call.get_all_tools():
-                func = tool_call.get("function")
-                func_name = func.get("name")
-                func_args = func.get("parameters")
-
-                # 查找匹配的工具和对应的 client
-                match = next(
-                    (
-                        (client, tool)
-                        for client in self.clients
-                        for tool in client.get_all_tools()
-                        if tool.name == func_name
-                    ),
-                    None,
-                )
 
-                if match:
-                    client, tool = match
-                    print(f"调用工具: {tool.name}，参数: {func_args}")
-                    result = await client.call_tool(tool.name, func_args)
-                    tool_message = (
-                        f"工具名称: {tool.name}\n状态: 成功\n结果: {result.content}"
-                    )
-                else:
-                    tool_message = (
-                        f"工具名称: {func_name}\n状态: 错误\n结果: 工具未找到"
-                    )
+        cache_key = await self._response_cache_key(prompt)
+        if cache_key is not None:
+            cached = self.response_cache.lookup(*cache_key)
+            if cached is not None:
+                async for event in self._replay_cached(prompt, cached.answer):
+                    yield event
+                return
 
-                self.llm.add_tool_message(tool_message)
+        with metrics.span("agent.invoke") as span:
+            usage: Dict[str, int] = {}
+            rounds = 0
+            next_prompt: Optional[str] = prompt
+            while True:
+                done = None
+                async for event in self.llm.stream_chat(next_prompt):
+                    if isinstance(event, DoneEvent):
+                        done = event
+                    else:
+                        yield event
+                next_prompt = None
+                rounds += 1
+                for key, value in done.usage.items():
+                    usage[key] = usage.get(key, 0) + value
 
-                response = await self.llm.chat()
-                continue
-            break
+                response = done.response
+                if not response.tool_call.get_tools_num():
+                    break
+
+                # 同一轮的工具调用并发执行，按原顺序写回结果后只再请求一次模型
+                tool_calls = response.tool_call.get_all_tools()
+                tool_messages = await asyncio.gather(
+                    *[self._call_tool(tool_call) for tool_call in tool_calls]
+                )
+                for tool_call, tool_message in zip(tool_calls, tool_messages):
+                    self.llm.add_tool_message(tool_message)
+                    yield ToolResultEvent(tool_call["function"]["name"], tool_message)
+            span.set(rounds=rounds)
+            metrics.inc("agent_invocations_total")
+            metrics.inc("agent_llm_rounds_total", rounds)
 
         if self.enable_memory:
             self.llm.add_assistant_message(response.content)
+        # 调用过工具的回答依赖工具结果，不缓存
+        if cache_key is not None and rounds == 1 and response.content:
+            self.response_cache.put(*cache_key, prompt, response.content)
+
+        yield DoneEvent(response, usage, done.stats)
+
+    async def _response_cache_key(self, prompt: str):
+        """(提问向量, 检索到的文档标识)
+
+        缓存键不含对话历史，所以只用于会话的第一轮：之后的提问（如"他的邮箱呢？"）
+        依赖前文，其回答也不能给其它会话使用。知识库仍在构建时同样不使用缓存。
+        """
+        retriever = self.vector_database
+        if (
+            self.response_cache is None
+            or self.llm.has_history
+            or retriever.status != "ready"
+        ):
+            return None
+        # 与 LLM 检索上下文时的参数相同，两次检索命中同一份结果缓存
+        embedding = await retriever.embed_query(prompt)
+        documents = await retriever.retrieve(prompt, CONTEXT_TOP_K)
+        return embedding, [document_id(document) for document in documents]
+
+    async def _replay_cached(
+        self, prompt: str, answer: str
+    ) -> AsyncIterator[StreamEvent]:
+        """以与正常回答相同的事件与对话历史返回缓存的回答"""
+        documents = await self.vector_database.retrieve(prompt, CONTEXT_TOP_K)
+        self.llm.add_context_message("\n".join(documents))
+        self.llm.add_user_message(prompt)
+        if self.enable_memory:
+            self.llm.add_assistant_message(answer)
+        metrics.inc("agent_invocations_total")
+        yield TextDelta(answer)
+        yield DoneEvent(LLMResponseData(answer, ToolCall()), {})
+
+    async def _call_tool(self, tool_call: dict) -> str:
+        func = tool_call.get("function")
+        func_name = func.get("name")
+        func_args = func.get("parameters")
+
+        entry = self.tool_registry.resolve(func_name)
+        if entry is None:
+            return f"工具名称: {func_name}\n状态: 错误\n结果: 工具未找到"
+
+        client, tool, name = entry.client, entry.tool, entry.name
+        semaphore = self._tool_semaphores.get(client.name)
+        if semaphore is None:
+            # 连接池的并发上限按副本数放大
+            replicas = getattr(client, "max_replicas", 1)
+            semaphore = asyncio.Semaphore(self.tool_concurrency * replicas)
+            self._tool_semaphores[client.name] = semaphore
+        print(f"调用工具: {name}，参数: {func_args}")
+        try:
+            async with semaphore:
+                result = await asyncio.wait_for(
+                    client.call_tool(tool.name, func_args), self.tool_timeout
+                )
+        except asyncio.TimeoutError:
+            metrics.inc("agent_tool_calls_total", tool=name, status="timeout")
+            return (
+                f"工具名称: {name}\n状态: 错误\n结果: 调用超时（{self.tool_timeout}s）"
+            )
+        except Exception as e:
+            metrics.inc("agent_tool_calls_total", tool=name, status="error")
+            return f"工具名称: {name}\n状态: 错误\n结果: {e}"
 
-        return response.content
+        metrics.inc("agent_tool_calls_total", tool=name, status="ok")
+        return f"工具名称: {name}\n状态: 成功\n结果: {result.content}"
@@ -1,52 +1,268 @@
 import asyncio
+import hashlib
+import json
+import os
 from contextlib import AsyncExitStack
-from typing import List, Optional
+from typing import Callable, Dict, List, Optional
 
-from mcp import ClientSession, StdioServerParameters, Tool
+from mcp import ClientSession, StdioServerParameters, Tool, types
 from mcp.client.stdio import stdio_client
 
+from .utils.cache import LRUCache
+from .utils.metrics import metrics
+
+
+def canonical_arguments(arguments: Optional[dict]) -> str:
+    return json.dumps(
+        arguments or {},
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+        default=str,
+    )
+
+
+def _string_values(value) -> List[str]:
+    if isinstance(value, str):
+        return [value]
+    if isinstance(value, dict):
+        value = list(value.values())
+    if isinstance(value, (list, tuple)):
+        return [s for item in value for s in _string_values(item)]
+    return []
+
+
+def _related(a: str, b: str) -> bool:
+    """相同路径，或一方是另一方的上级目录"""
+    if a == b:
+        return True
+    shorter, longer = sorted((a.rstrip("/\\"), b.rstrip("/\\")), key=len)
+    separator = longer[len(shorter) : len(shorter) + 1]
+    return longer.startswith(shorter) and separator in "/\\"
+
 
 class MCPClient:
-    def __init__(self, name: str, command: str, arguments: list):
+    """stdio MCP 服务端客户端
+
+    cache_tools 为可缓存的只读工具及其缓存秒数（None 表示不过期），例如
+    {"fetch": 300, "read_file": 60}；不在其中的工具视为写操作，调用后会让
+    参数中涉及相同路径（或其上下级目录）的缓存失效，参数中没有字符串时清空缓存。
+
+    lazy=True 时，若 schema_cache_dir 中有该命令的工具列表缓存，connect_to_server
+    直接返回缓存的工具，子进程在第一次 call_tool 时才启动，同时在后台启动并核对工具列表。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        command: str,
+        arguments: list,
+        cache_tools: Optional[Dict[str, Optional[float]]] = None,
+        cache_size: int = 256,
+        lazy: bool = False,
+        schema_cache_dir: Optional[str] = None,
+    ):
         # Initialize session and client objects
         self.session: Optional[ClientSession] = None
         self.stdio = None
         self.write = None
-        self.exit_stack = AsyncExitStack()
 
         self.name = name
         self.command = command
         self.arguments = arguments
         self.tools: List[Tool] = []
+        # 服务端通知工具列表变化并重新拉取后回调
+        self.on_tools_changed: Optional[Callable[["MCPClient"], None]] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self.cache_tools = cache_tools or {}
+        self.result_cache = LRUCache(cache_size)
+
+        self.lazy = lazy
+        self.schema_cache_dir = schema_cache_dir or os.path.join(
+            os.path.expanduser("~"), ".cache", "mcp-client", "tools"
+        )
+        # 会话的上下文管理器在专用任务中进入和退出，避免跨任务关闭 anyio 的 cancel scope
+        self._session_task: Optional[asyncio.Task] = None
+        self._closing = asyncio.Event()
+        self._connect_lock = asyncio.Lock()
+
+    @property
+    def schema_cache_path(self) -> str:
+        key = json.dumps([self.command, self.arguments], ensure_ascii=False)
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.schema_cache_dir, f"{digest}.json")
+
+    @property
+    def connected(self) -> bool:
+        return self.session is not None
 
     async def connect_to_server(self):
+        if self.lazy:
+            cached = self._load_cached_tools()
+            if cached is not None:
+                self.tools = cached
+                print("使用缓存的工具:", [tool.name for tool in self.tools])
+                self._refresh_task = asyncio.create_task(self._refresh_in_background())
+                return
+
+        await self._ensure_session()
+
+        # List available tools
+        self.tools = await self._list_tools()
+        self._save_cached_tools()
+        print("连接到工具:", [tool.name for tool in self.tools])
+
+    async def refresh_tools(self):
+        if not self.connected:
+            raise RuntimeError("Session not initialized. Call connect_to_server first.")
+        self.tools = await self._list_tools()
+        self._save_cached_tools()
+        if self.on_tools_changed is not None:
+            self.on_tools_changed(self)
+
+    async def _refresh_in_background(self):
+        """启动子进程并核对缓存的工具列表"""
+        try:
+            await self._ensure_session()
+            tools = await self._list_tools()
+        except Exception as e:
+            print(f"后台刷新工具列表失败 {self.name}: {e}")
+            return
+        if self._dump_tools(tools) != self._dump_tools(self.tools):
+            self.tools = tools
+            self._save_cached_tools()
+            if self.on_tools_changed is not None:
+                self.on_tools_changed(self)
+
+    async def _list_tools(self) -> List[Tool]:
+        response = await self.session.list_tools()
+        return response.tools
+
+    async def _handle_message(self, message):
+        if isinstance(message, types.ServerNotification) and isinstance(
+            message.root, types.ToolListChangedNotification
+        ):
+            # 在接收循环里等待 list_tools 的响应会死锁，放到后台任务执行
+            self._refresh_task = asyncio.create_task(self.refresh_tools())
+
+    async def _ensure_session(self):
+        async with self._connect_lock:
+            if self.session is not None:
+                return
+            ready = asyncio.get_running_loop().create_future()
+            self._closing = asyncio.Event()
+            self._session_task = asyncio.create_task(self._run_session(ready))
+            await ready
+
+    async def _run_session(self, ready: asyncio.Future):
         server_params = StdioServerParameters(
             command=self.command, args=self.arguments, env=None
         )
+        try:
+            async with AsyncExitStack() as exit_stack:
+                stdio_transport = await exit_stack.enter_async_context(
+                    stdio_client(server_params)
+                )
+                self.stdio, self.write = stdio_transport
+                session = await exit_stack.enter_async_context(
+                    ClientSession(
+                        self.stdio, self.write, message_handler=self._handle_message
+                    )
+                )
+                await session.initialize()
+                self.session = session
+                ready.set_result(None)
+                await self._closing.wait()
+        except Exception as e:
+            if not ready.done():
+                ready.set_exception(e)
+            else:
+                print(f"客户端 {self.name} 会话异常退出: {e}")
+        finally:
+            self.session = None
 
-        stdio_transport = await self.exit_stack.enter_async_context(
-            stdio_client(server_params)
-        )
-        self.stdio, self.write = stdio_transport
-        self.session = await self.exit_stack.enter_async_context(
-            ClientSession(self.stdio, self.write)
-        )
+    def _load_cached_tools(self) -> Optional[List[Tool]]:
+        try:
+            with open(self.schema_cache_path, "r", encoding="utf-8") as f:
+                return [Tool.model_validate(tool) for tool in json.load(f)["tools"]]
+        except (OSError, ValueError, KeyError):
+            return None
 
-        await self.session.initialize()
+    def _save_cached_tools(self):
+        try:
+            os.makedirs(self.schema_cache_dir, exist_ok=True)
+            tmp_path = self.schema_cache_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(
+                    {
+                        "command": self.command,
+                        "arguments": self.arguments,
+                        "tools": self._dump_tools(self.tools),
+                    },
+                    f,
+                    ensure_ascii=False,
+                )
+            os.replace(tmp_path, self.schema_cache_path)
+        except OSError as e:
+            print(f"工具列表缓存写入失败 {self.name}: {e}")
 
-        # List available tools
-        response = await self.session.list_tools()
-        self.tools = response.tools
-        print("连接到工具:", [tool.name for tool in self.tools])
+    @staticmethod
+    def _dump_tools(tools: List[Tool]) -> List[dict]:
+        return [tool.model_dump(mode="json", exclude_none=True) for tool in tools]
 
     def get_all_tools(self):
         return self.tools
 
-    def call_tool(self, name: str, arguments: dict):
-        if self.session is None:
-            raise RuntimeError("Session not initialized. Call connect_to_server first.")
-        return self.session.call_tool(name, arguments)
+    async def call_tool(self, name: str, arguments: dict):
+        with metrics.span("mcp.call_tool", server=self.name, tool=name) as span:
+            if not self.connected:
+                if not self.lazy:
+                    raise RuntimeError(
+                        "Session not initialized. Call connect_to_server first."
+                    )
+                with metrics.span("mcp.start_session", server=self.name):
+                    await self._ensure_session()
+
+            if name not in self.cache_tools:
+                try:
+                    return await self._call(name, arguments)
+                finally:
+                    if self.cache_tools:
+                        self._invalidate(arguments)
+
+            key = (name, canonical_arguments(arguments))
+            result = self.result_cache.get(key)
+            span.set(cached=result is not None)
+            metrics.inc(
+                "mcp_tool_cache_total",
+                server=self.name,
+                tool=name,
+                result="miss" if result is None else "hit",
+            )
+            if result is None:
+                result = await self._call(name, arguments)
+                if not result.isError:
+                    self.result_cache.put(key, result, ttl=self.cache_tools[name])
+            return result
+
+    async def _call(self, name: str, arguments: dict):
+        return await self.session.call_tool(name, arguments)
+
+    def _invalidate(self, arguments: Optional[dict]):
+        written = _string_values(arguments or {})
+        if not written:
+            self.result_cache.clear()
+            return
+        for key in self.result_cache.keys():
+            cached = _string_values(json.loads(key[1]))
+            if any(_related(a, b) for a in written for b in cached):
+                self.result_cache.pop(key)
 
     async def close_connection(self):
-        await self.exit_stack.aclose()
+        if self._refresh_task is not None and not self._refresh_task.done():
+            self._refresh_task.cancel()
+        if self._session_task is not None:
+            self._closing.set()
+            await self._session_task
+            self._session_task = None
         print("\nConnection closed.")
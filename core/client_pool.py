@@ -0,0 +1,253 @@
+import asyncio
+import time
+from typing import List, Optional, Set
+
+from mcp import Tool
+from mcp.shared.exceptions import McpError
+
+from .client import MCPClient
+from .utils.metrics import metrics
+
+
+class Replica:
+    def __init__(self, client: MCPClient):
+        self.client = client
+        self.in_flight = 0
+        self.calls = 0
+        self.last_used = time.monotonic()
+        # 子进程退出后进行中的请求收不到响应，副本被判定崩溃时用它结束这些请求
+        self.dead: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+class MCPClientPool(MCPClient):
+    """同一服务端命令的多个子进程副本，对智能体表现为一个客户端
+
+    调用发给进行中请求最少的副本；所有副本的积压都达到 scale_up_depth 时在后台
+    增加一个副本（不超过 max_replicas），空闲超过 idle_timeout 秒的副本被关闭
+    （不少于 min_replicas）。副本调用出现传输错误或健康检查 ping 失败时视为崩溃，
+    关闭后重新启动一个。结果缓存与失效由池统一处理，各副本不单独缓存。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        command: str,
+        arguments: list,
+        min_replicas: int = 1,
+        max_replicas: int = 4,
+        scale_up_depth: int = 2,
+        idle_timeout: float = 60.0,
+        health_interval: float = 10.0,
+        **kwargs,
+    ):
+        super().__init__(name, command, arguments, **kwargs)
+        if not 1 <= min_replicas <= max_replicas:
+            raise ValueError("Require 1 <= min_replicas <= max_replicas")
+        self.min_replicas = min_replicas
+        self.max_replicas = max_replicas
+        self.scale_up_depth = scale_up_depth
+        self.idle_timeout = idle_timeout
+        self.health_interval = health_interval
+        self.replicas: List[Replica] = []
+        self.restarts = 0
+        self.scale_ups = 0
+        self.scale_downs = 0
+        self._starting = 0
+        self._sequence = 0
+        self._tasks: Set[asyncio.Task] = set()
+        self._monitor_task: Optional[asyncio.Task] = None
+
+    @property
+    def connected(self) -> bool:
+        return bool(self.replicas)
+
+    async def _ensure_session(self):
+        async with self._connect_lock:
+            missing = self.min_replicas - len(self.replicas) - self._starting
+            if self.replicas and missing <= 0:
+                return
+            results = await asyncio.gather(
+                *[self._start_replica() for _ in range(max(missing, 1))],
+                return_exceptions=True,
+            )
+            if not self.replicas:
+                raise next(r for r in results if isinstance(r, Exception))
+            if self._monitor_task is None:
+                self._monitor_task = asyncio.create_task(self._monitor())
+
+    async def _start_replica(self) -> Replica:
+        self._sequence += 1
+        client = MCPClient(
+            f"{self.name}#{self._sequence}",
+            self.command,
+            self.arguments,
+            schema_cache_dir=self.schema_cache_dir,
+        )
+        client.on_tools_changed = self._on_replica_tools_changed
+        self._starting += 1
+        try:
+            with metrics.span("mcp.start_replica", server=self.name):
+                await client._ensure_session()
+        except BaseException:
+            # 启动中途被取消时子进程可能已经启动，需要关闭
+            await client.close_connection()
+            raise
+        finally:
+            self._starting -= 1
+        replica = Replica(client)
+        self.replicas.append(replica)
+        self._record_size()
+        return replica
+
+    def _spawn(self, reason: str):
+        """在后台启动一个副本，失败时只记录"""
+
+        async def start():
+            try:
+                await self._start_replica()
+            except Exception as e:
+                print(f"客户端 {self.name} 副本启动失败（{reason}）: {e}")
+
+        task = asyncio.create_task(start())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _stop_replica(self, replica: Replica):
+        if replica in self.replicas:
+            self.replicas.remove(replica)
+            self._record_size()
+        try:
+            await replica.client.close_connection()
+        except Exception as e:
+            print(f"客户端 {replica.client.name} 关闭失败: {e}")
+
+    def _replace(self, replica: Replica, error: Exception):
+        if replica not in self.replicas:
+            return
+        print(f"客户端 {replica.client.name} 副本异常，重新启动: {error}")
+        replica.dead.set_result(error)
+        self.restarts += 1
+        metrics.inc("mcp_pool_restarts_total", server=self.name)
+        self.replicas.remove(replica)
+        self._record_size()
+        task = asyncio.create_task(self._stop_replica(replica))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        self._spawn("restart")
+
+    def _least_loaded(self) -> Replica:
+        return min(self.replicas, key=lambda r: (r.in_flight, r.calls))
+
+    async def _list_tools(self) -> List[Tool]:
+        return await self._least_loaded().client._list_tools()
+
+    async def _call(self, name: str, arguments: dict):
+        if not self.replicas:
+            # 所有副本都已崩溃，等待重新启动
+            await self._ensure_session()
+        replica = self._least_loaded()
+        if (
+            replica.in_flight >= self.scale_up_depth
+            and self._starting == 0
+            and len(self.replicas) < self.max_replicas
+        ):
+            self.scale_ups += 1
+            metrics.inc("mcp_pool_scale_total", server=self.name, direction="up")
+            self._spawn("scale up")
+
+        replica.in_flight += 1
+        replica.calls += 1
+        call = None
+        try:
+            call = asyncio.ensure_future(
+                replica.client.session.call_tool(name, arguments)
+            )
+            await asyncio.wait(
+                {call, replica.dead}, return_when=asyncio.FIRST_COMPLETED
+            )
+            if not call.done():
+                raise ConnectionError(
+                    f"副本 {replica.client.name} 已退出: {replica.dead.result()}"
+                )
+            return call.result()
+        except McpError:
+            # 服务端正常返回的错误响应
+            raise
+        except Exception as e:
+            self._replace(replica, e)
+            raise
+        finally:
+            if call is not None and not call.done():
+                call.cancel()
+            replica.in_flight -= 1
+            replica.last_used = time.monotonic()
+
+    def _on_replica_tools_changed(self, client: MCPClient):
+        if self._dump_tools(client.tools) == self._dump_tools(self.tools):
+            return
+        self.tools = client.tools
+        self._save_cached_tools()
+        if self.on_tools_changed is not None:
+            self.on_tools_changed(self)
+
+    async def _monitor(self):
+        """定期回收空闲副本，并 ping 所有副本检查子进程是否存活"""
+        while True:
+            await asyncio.sleep(self.health_interval)
+            now = time.monotonic()
+            for replica in list(self.replicas):
+                if (
+                    len(self.replicas) > self.min_replicas
+                    and not replica.in_flight
+                    and now - replica.last_used > self.idle_timeout
+                ):
+                    self.scale_downs += 1
+                    metrics.inc(
+                        "mcp_pool_scale_total", server=self.name, direction="down"
+                    )
+                    await self._stop_replica(replica)
+            await asyncio.gather(*[self._check(r) for r in list(self.replicas)])
+            if len(self.replicas) + self._starting < self.min_replicas:
+                self._spawn("min replicas")
+
+    async def _check(self, replica: Replica):
+        try:
+            if replica.client.session is None:
+                raise RuntimeError("会话已退出")
+            await asyncio.wait_for(
+                replica.client.session.send_ping(), self.health_interval
+            )
+        except asyncio.TimeoutError as e:
+            # 正在执行阻塞工具的副本可能来不及响应 ping，不算崩溃
+            if not replica.in_flight:
+                self._replace(replica, e)
+        except Exception as e:
+            # 子进程退出后写入请求会立即失败
+            self._replace(replica, e)
+
+    def _record_size(self):
+        metrics.set_gauge("mcp_pool_replicas", len(self.replicas), server=self.name)
+
+    def stats(self) -> dict:
+        return {
+            "replicas": len(self.replicas),
+            "starting": self._starting,
+            "restarts": self.restarts,
+            "scale_ups": self.scale_ups,
+            "scale_downs": self.scale_downs,
+            "in_flight": [r.in_flight for r in self.replicas],
+            "calls": [r.calls for r in self.replicas],
+        }
+
+    async def close_connection(self):
+        if self._refresh_task is not None and not self._refresh_task.done():
+            self._refresh_task.cancel()
+        tasks = list(self._tasks)
+        if self._monitor_task is not None:
+            tasks.append(self._monitor_task)
+            self._monitor_task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await asyncio.gather(*[self._stop_replica(r) for r in list(self.replicas)])
+        print(f"\n{self.name} 连接池已关闭")
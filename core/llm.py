@@ -1,14 +1,22 @@
 import json
 import os
-from typing import List, NamedTuple, Optional, Union
+import time
+from typing import TYPE_CHECKING, AsyncIterator, List, NamedTuple, Optional, Union
 
-import aiohttp
 from mcp import Tool
 
 from core.utils.embedding_retriever import EmbeddingRetriever
 
+from .memory import ContextMessage, ConversationMemory
+from .utils.http_client import HTTPClient
+from .utils.metrics import metrics
+from .utils.model_lifecycle import ModelLifecycle
+from .utils.ndjson import iter_ndjson
 from .utils.util import log_title
 
+if TYPE_CHECKING:
+    from .tool_selector import ToolSelection, ToolSelector
+
 
 class ToolCall:
 
@@ -58,6 +66,73 @@ class LLMResponseData(NamedTuple):
     tool_call: ToolCall
 
 
+# Ollama 在最后一个分片中返回的统计字段
+USAGE_KEYS = (
+    "prompt_eval_count",
+    "prompt_eval_duration",
+    "eval_count",
+    "eval_duration",
+    "load_duration",
+    "total_duration",
+)
+
+
+# 每次提问检索的知识库文档数
+CONTEXT_TOP_K = 3
+
+
+class TextDelta(NamedTuple):
+    content: str
+
+
+class ToolCallEvent(NamedTuple):
+    tool_call: dict
+
+
+class ToolResultEvent(NamedTuple):
+    name: str
+    content: str
+
+
+class StreamStats(NamedTuple):
+    ttft: Optional[float]  # 首个文本分片到达的耗时（秒）
+    duration: float
+    tokens: int
+    tokens_per_second: float
+
+
+class DoneEvent(NamedTuple):
+    response: LLMResponseData
+    usage: dict
+    stats: Optional[StreamStats] = None
+
+
+StreamEvent = Union[TextDelta, ToolCallEvent, ToolResultEvent, DoneEvent]
+
+
+async def consume_stream(
+    events: AsyncIterator[StreamEvent], echo: bool = True
+) -> Optional[DoneEvent]:
+    """消费事件流，echo 时把文本增量打印到终端，返回最后的 DoneEvent
+
+    "模型: " 前缀在每段回答的第一个文本增量到达时才打印，检索、预热等输出
+    不会夹在前缀与回答之间；工具调用之后的回答重新打印前缀。
+    """
+    done = None
+    prefix_pending = True
+    async for event in events:
+        if isinstance(event, TextDelta) and echo:
+            if prefix_pending:
+                print("模型: ", end="", flush=True)
+                prefix_pending = False
+            print(event.content, end="", flush=True)
+        elif isinstance(event, ToolResultEvent):
+            prefix_pending = True
+        elif isinstance(event, DoneEvent):
+            done = event
+    return done
+
+
 class LLM:
 
     def __init__(
@@ -67,17 +142,34 @@ class LLM:
         sys_prompt: Optional[str] = None,
         vector_database: Optional[EmbeddingRetriever] = None,
         tools: Optional[ToolCall] = None,
+        http_client: Optional[HTTPClient] = None,
+        memory: Optional[ConversationMemory] = None,
+        lifecycle: Optional[ModelLifecycle] = None,
+        tool_selector: Optional["ToolSelector"] = None,
     ):
         self.url = api_url
         self.model = model
         self.sys_prompt = sys_prompt
         self.vector_database = vector_database
         self.tools = tools
+        self.http_client = http_client or HTTPClient()
+        self.memory = memory
+        # 提供 keep_alive 与 options（num_ctx、num_thread 等）并记录模型使用时间
+        self.lifecycle = lifecycle
+        # 按提问挑选工具；同一轮对话的工具调用往返沿用提问时的选择
+        self.tool_selector = tool_selector
+        self.tool_selection: Optional["ToolSelection"] = None
+        self.last_stats: Optional[StreamStats] = None
         self.messages = []
 
         if sys_prompt:
             self.messages.append({"role": "system", "content": self.sys_prompt})
 
+    @property
+    def has_history(self) -> bool:
+        """是否已有之前轮次的消息（系统提示词除外）"""
+        return any(message["role"] != "system" for message in self.messages)
+
     def add_user_message(self, content: str):
         """添加用户消息到上下文"""
         self.messages.append({"role": "user", "content": content})
@@ -89,56 +181,153 @@ class LLM:
     def add_tool_message(self, content: str):
         self.messages.append({"role": "tool", "content": content})
 
-    async def chat(self, prompt: Optional[str] = None):
+    def add_context_message(self, content: str):
+        """添加检索到的上下文，记忆管理会丢弃过期的上下文"""
+        self.messages.append(ContextMessage(role="user", content=content))
+
+    async def chat(self, prompt: Optional[str] = None, echo: bool = True):
+        done = await consume_stream(self.stream_chat(prompt), echo)
+        return done.response if done else None
+
+    async def stream_chat(
+        self, prompt: Optional[str] = None
+    ) -> AsyncIterator[StreamEvent]:
+        """逐个产出文本增量、工具调用，最后产出带统计信息的 DoneEvent"""
 
         if prompt:
             if self.vector_database:
-                context_list = await self.vector_database.retrieve(prompt, 3)
+                if self.vector_database.status == "warming":
+                    print("知识库索引仍在构建中，检索结果可能不完整")
+                context_list = await self.vector_database.retrieve(
+                    prompt, CONTEXT_TOP_K
+                )
                 context = "\n".join(context_list)
-                self.add_user_message(context)
+                self.add_context_message(context)
             self.add_user_message(prompt)
+            if self.tool_selector is not None and self.tools:
+                self.tool_selection = await self.tool_selector.select(prompt)
 
         payload = {
             "model": self.model,
-            "messages": self.messages,
+            "messages": self._prepare_messages(),
             "stream": True,
-            "tools": self.tools.get_all_tools() if self.tools else [],
         }
-
-        print("模型: ", end="", flush=True)
-        async with aiohttp.ClientSession() as session:
-            async with session.post(self.url, json=payload) as response:
+        if self.lifecycle is not None:
+            payload.update(self.lifecycle.request_fields(self.model))
+        selection = self.tool_selection if self.tools else None
+        if selection is None:
+            payload["tools"] = self.tools.get_all_tools() if self.tools else []
+            request = {"json": payload}
+        else:
+            # 工具列表使用缓存的序列化结果，不必每次请求重新编码
+            body = json.dumps(payload)[:-1] + ', "tools": ' + selection.json + "}"
+            request = {
+                "data": body.encode("utf-8"),
+                "headers": {"Content-Type": "application/json"},
+            }
+            self._report_selection(selection)
+
+        started = time.perf_counter()
+        ttft = None
+        with metrics.span("llm.chat", model=self.model) as span:
+            async with self.http_client.post(
+                self.url, lane="chat", **request
+            ) as response:
                 if response.status != 200:
                     log_title(f"请求失败: {response.status}")
-                    return
+                    raise RuntimeError(f"请求失败: {response.status}")
 
-                full_response = ""
+                fragments = []
                 tool_call_obj = ToolCall()
-
-                async for raw_line in response.content:
-                    try:
-                        data = json.loads(raw_line.decode("utf-8"))
-                        content = data.get("message", {}).get("content")
-                        print(content, end="", flush=True)
-
-                        full_response += content
-
-                        # 工具调用处理
-                        tool_calls = data.get("message", {}).get("tool_calls", [])
-                        if tool_calls:
-                            tool_call_obj.add_tool_call(tool_calls)
-
-                        # 判断是否结束
-                        if data.get("done"):
-                            break
-
-                    except Exception as e:
-                        print(f"解析错误: {e}")
-
-                return LLMResponseData(full_response, tool_call_obj)
+                usage = {}
+
+                async for data in iter_ndjson(response.content):
+                    message = data.get("message", {})
+                    content = message.get("content")
+                    if content:
+                        if ttft is None:
+                            ttft = time.perf_counter() - started
+                        fragments.append(content)
+                        yield TextDelta(content)
+
+                    # 工具调用处理
+                    for tool_call in message.get("tool_calls", []):
+                        tool_call_obj.add_tool_call(tool_call)
+                        yield ToolCallEvent(tool_call)
+
+                    # 判断是否结束
+                    if data.get("done"):
+                        usage = {k: data[k] for k in USAGE_KEYS if k in data}
+                        break
+
+            self.last_stats = self._stream_stats(started, ttft, len(fragments), usage)
+            self._record_stats(span, self.last_stats)
+            if selection is not None:
+                self._record_prefill_saved(selection, usage)
+        yield DoneEvent(
+            LLMResponseData("".join(fragments), tool_call_obj), usage, self.last_stats
+        )
+
+    @staticmethod
+    def _stream_stats(
+        started: float, ttft: Optional[float], fragments: int, usage: dict
+    ) -> StreamStats:
+        duration = time.perf_counter() - started
+        if usage.get("eval_count") and usage.get("eval_duration"):
+            # Ollama 给出的生成耗时单位为纳秒
+            tokens = usage["eval_count"]
+            rate = tokens / (usage["eval_duration"] / 1e9)
+        else:
+            tokens = fragments
+            generating = duration - (ttft or 0.0)
+            rate = tokens / generating if generating > 0 else 0.0
+        return StreamStats(ttft, duration, tokens, rate)
+
+    def _record_stats(self, span, stats: StreamStats):
+        span.set(tokens=stats.tokens, ttft=stats.ttft)
+        if stats.ttft is not None:
+            metrics.observe("llm_ttft_seconds", stats.ttft, model=self.model)
+        metrics.observe("llm_generation_seconds", stats.duration, model=self.model)
+        metrics.inc("llm_tokens_total", stats.tokens, model=self.model)
+        metrics.set_gauge(
+            "llm_tokens_per_second", stats.tokens_per_second, model=self.model
+        )
+
+    def _report_selection(self, selection: "ToolSelection"):
+        if selection.saved_tokens > 0:
+            print(
+                f"工具筛选: 发送 {len(selection.names)}/{selection.total_tools} 个工具，"
+                f"节省约 {selection.saved_tokens} tokens"
+            )
+        metrics.inc("llm_tool_tokens_saved_total", selection.saved_tokens)
+
+    def _record_prefill_saved(self, selection: "ToolSelection", usage: dict):
+        """按本次请求实测的预填充速度估算少发送的工具节省的时间"""
+        count = usage.get("prompt_eval_count")
+        duration = usage.get("prompt_eval_duration")
+        if not (selection.saved_tokens > 0 and count and duration):
+            return
+        saved = selection.saved_tokens / (count / (duration / 1e9))
+        metrics.inc("llm_prefill_seconds_saved_total", saved)
+        print(f"工具筛选: 预填充约节省 {saved * 1000:.0f} ms")
+
+    def _prepare_messages(self) -> List[dict]:
+        if self.memory is None:
+            return self.messages
+        messages = self.memory.prepare(self.messages)
+        stats = self.memory.last_stats
+        if stats.saved_tokens:
+            print(
+                f"上下文压缩: 原始约 {stats.history_tokens} tokens，"
+                f"发送约 {stats.sent_tokens} tokens，节省 {stats.saved_tokens} tokens"
+            )
+        return messages
 
     def get_all_tools(self):
         return [{"type": "function", "function": tool} for tool in self.tools]
 
     def clear_messages(self):
         self.messages.clear()
+        self.tool_selection = None
+        if self.memory is not None:
+            self.memory.reset()
@@ -0,0 +1,161 @@
+from typing import List, NamedTuple
+
+from .utils.tokens import estimate_tokens
+
+
+class ContextMessage(dict):
+    """检索得到的 RAG 上下文消息，序列化后与普通 user 消息相同"""
+
+
+class TruncatedMessage(dict):
+    """已截断的工具结果，长度仍超过 max_tool_chars，之后整理时不再重复截断"""
+
+
+def message_tokens(message: dict) -> int:
+    # 每条消息额外计入角色等格式开销
+    return estimate_tokens(message.get("content") or "") + 4
+
+
+class MemoryStats(NamedTuple):
+    history_tokens: int  # 不做任何裁剪时本次请求的 token 数
+    sent_tokens: int
+    saved_tokens: int
+    folded_turns: int
+
+
+class ConversationMemory:
+    """按 token 预算整理对话历史
+
+    - 系统提示始终保留，最近 keep_recent_turns 轮原样保留
+    - 只保留最新一轮的 RAG 上下文，更早的直接丢弃
+    - 旧轮次中过长的工具结果截断到 max_tool_chars
+    - 超出预算或超出保留轮数的旧轮次折叠进滚动摘要
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = 8192,
+        keep_recent_turns: int = 4,
+        max_tool_chars: int = 4000,
+        summary_line_chars: int = 120,
+        max_summary_tokens: int = 512,
+    ):
+        self.max_tokens = max_tokens
+        self.keep_recent_turns = keep_recent_turns
+        self.max_tool_chars = max_tool_chars
+        self.summary_line_chars = summary_line_chars
+        self.max_summary_tokens = max_summary_tokens
+        self.summary_lines: List[str] = []
+        self.last_stats: MemoryStats = MemoryStats(0, 0, 0, 0)
+        # 已从历史中移除的消息 token 数，用于计算节省量
+        self._removed_tokens = 0
+
+    def reset(self):
+        self.summary_lines = []
+        self._removed_tokens = 0
+
+    def prepare(self, messages: List[dict]) -> List[dict]:
+        """原地整理 messages，返回本次请求要发送的消息列表"""
+        history_tokens = self._removed_tokens + sum(map(message_tokens, messages))
+
+        head = []
+        while len(head) < len(messages) and messages[len(head)]["role"] == "system":
+            head.append(messages[len(head)])
+        turns = self._split_turns(messages[len(head) :])
+
+        for turn in turns[:-1]:
+            self._compact_turn(turn)
+
+        folded = 0
+        while len(turns) > 1 and (
+            len(turns) > self.keep_recent_turns
+            or self._count(head, turns) > self.max_tokens
+        ):
+            self._fold(turns.pop(0))
+            folded += 1
+
+        if turns and self._count(head, turns) > self.max_tokens:
+            self._truncate_tools(turns[-1])
+        # 仍超出预算时缩短摘要，最新一轮始终完整发送
+        while self.summary_lines and self._count(head, turns) > self.max_tokens:
+            self.summary_lines.pop(0)
+
+        messages[:] = head + [m for turn in turns for m in turn]
+        payload = list(head)
+        if self.summary_lines:
+            payload.append({"role": "system", "content": self._summary_text()})
+        payload.extend(messages[len(head) :])
+
+        sent_tokens = sum(map(message_tokens, payload))
+        self.last_stats = MemoryStats(
+            history_tokens, sent_tokens, max(0, history_tokens - sent_tokens), folded
+        )
+        return payload
+
+    def _split_turns(self, messages: List[dict]) -> List[List[dict]]:
+        """每轮从一条 RAG 上下文或用户提问开始"""
+        turns: List[List[dict]] = []
+        for message in messages:
+            starts_turn = isinstance(message, ContextMessage) or (
+                message["role"] == "user"
+                and not (
+                    turns
+                    and len(turns[-1]) == 1
+                    and isinstance(turns[-1][0], ContextMessage)
+                )
+            )
+            if starts_turn or not turns:
+                turns.append([])
+            turns[-1].append(message)
+        return turns
+
+    def _compact_turn(self, turn: List[dict]):
+        for message in [m for m in turn if isinstance(m, ContextMessage)]:
+            turn.remove(message)
+            self._removed_tokens += message_tokens(message)
+        self._truncate_tools(turn)
+
+    def _truncate_tools(self, turn: List[dict]):
+        for i, message in enumerate(turn):
+            content = message.get("content") or ""
+            if (
+                message["role"] != "tool"
+                or isinstance(message, TruncatedMessage)
+                or len(content) <= self.max_tool_chars
+            ):
+                continue
+            truncated = TruncatedMessage(
+                message,
+                content=content[: self.max_tool_chars]
+                + f"\n...[已截断 {len(content) - self.max_tool_chars} 字符]",
+            )
+            self._removed_tokens += message_tokens(message) - message_tokens(truncated)
+            turn[i] = truncated
+
+    def _fold(self, turn: List[dict]):
+        for message in turn:
+            self._removed_tokens += message_tokens(message)
+            if isinstance(message, ContextMessage):
+                continue
+            content = " ".join((message.get("content") or "").split())
+            if content:
+                self.summary_lines.append(
+                    f"{message['role']}: {content[: self.summary_line_chars]}"
+                )
+        # 摘要本身也受预算限制，超出时丢弃最早的内容
+        while (
+            len(self.summary_lines) > 1
+            and estimate_tokens(self._summary_text()) > self.max_summary_tokens
+        ):
+            self.summary_lines.pop(0)
+
+    def _summary_text(self) -> str:
+        return "此前对话摘要:\n" + "\n".join(self.summary_lines)
+
+    def _count(self, head: List[dict], turns: List[List[dict]]) -> int:
+        summary = estimate_tokens(self._summary_text()) + 4 if self.summary_lines else 0
+        return (
+            summary
+            + sum(map(message_tokens, head))
+            + sum(message_tokens(m) for turn in turns for m in turn)
+        )
@@ -0,0 +1,177 @@
+import json
+from typing import Optional
+
+from aiohttp import WSMsgType, web
+
+from .llm import DoneEvent, StreamEvent, TextDelta, ToolCallEvent, ToolResultEvent
+from .session import SessionLimitError, SessionManager
+from .utils.metrics import metrics
+
+SESSIONS_KEY = web.AppKey("sessions", SessionManager)
+
+
+def event_to_dict(event: StreamEvent) -> dict:
+    """把流式事件转换为可 JSON 序列化的字典"""
+    if isinstance(event, TextDelta):
+        return {"type": "text", "content": event.content}
+    if isinstance(event, ToolCallEvent):
+        return {"type": "tool_call", "tool_call": event.tool_call}
+    if isinstance(event, ToolResultEvent):
+        return {"type": "tool_result", "name": event.name, "content": event.content}
+    if isinstance(event, DoneEvent):
+        stats = event.stats._asdict() if event.stats else None
+        return {
+            "type": "done",
+            "content": event.response.content,
+            "usage": event.usage,
+            "stats": stats,
+        }
+    raise TypeError(f"未知事件类型: {type(event).__name__}")
+
+
+def _error(status: int, message: str) -> web.Response:
+    return web.json_response({"error": message}, status=status)
+
+
+def _session_or_404(request: web.Request):
+    manager = request.app[SESSIONS_KEY]
+    session = manager.get(request.match_info["session_id"])
+    if session is None:
+        raise web.HTTPNotFound(
+            text=json.dumps({"error": "会话不存在或已过期"}),
+            content_type="application/json",
+        )
+    return session
+
+
+async def _prompt_from(request: web.Request) -> Optional[str]:
+    try:
+        payload = await request.json()
+    except ValueError:
+        return None
+    prompt = payload.get("prompt") if isinstance(payload, dict) else None
+    return prompt.strip() if isinstance(prompt, str) and prompt.strip() else None
+
+
+async def create_session(request: web.Request) -> web.Response:
+    try:
+        session = request.app[SESSIONS_KEY].create()
+    except SessionLimitError as e:
+        return _error(503, str(e))
+    return web.json_response({"session_id": session.id}, status=201)
+
+
+async def delete_session(request: web.Request) -> web.Response:
+    if not request.app[SESSIONS_KEY].close(request.match_info["session_id"]):
+        return _error(404, "会话不存在或已过期")
+    return web.json_response({"closed": True})
+
+
+async def chat(request: web.Request) -> web.StreamResponse:
+    """POST /sessions/{id}/chat，以 NDJSON 流式返回事件"""
+    session = _session_or_404(request)
+    prompt = await _prompt_from(request)
+    if prompt is None:
+        return _error(400, "缺少 prompt")
+    if session.busy:
+        return _error(409, "会话正在处理上一轮对话")
+
+    response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+    await response.prepare(request)
+    try:
+        async for event in session.stream(prompt):
+            line = json.dumps(event_to_dict(event), ensure_ascii=False) + "\n"
+            await response.write(line.encode("utf-8"))
+    except ConnectionResetError:
+        # 客户端已断开，无法再写入错误信息
+        return response
+    except Exception as e:
+        error = {"type": "error", "error": str(e)}
+        await response.write((json.dumps(error, ensure_ascii=False) + "\n").encode())
+    await response.write_eof()
+    return response
+
+
+async def websocket(request: web.Request) -> web.WebSocketResponse:
+    """GET /sessions/{id}/ws，每条消息 {"prompt": ...} 触发一轮对话，事件逐条推送"""
+    session = _session_or_404(request)
+    ws = web.WebSocketResponse(heartbeat=30)
+    await ws.prepare(request)
+
+    session.connections += 1
+    try:
+        async for message in ws:
+            session.touch()
+            if message.type != WSMsgType.TEXT:
+                continue
+            try:
+                prompt = json.loads(message.data).get("prompt")
+            except (ValueError, AttributeError):
+                prompt = None
+            if not prompt:
+                await ws.send_json({"type": "error", "error": "缺少 prompt"})
+                continue
+            try:
+                async for event in session.stream(prompt):
+                    await ws.send_json(event_to_dict(event))
+            except ConnectionResetError:
+                # 客户端已断开，无法再推送错误信息
+                break
+            except Exception as e:
+                if ws.closed:
+                    break
+                await ws.send_json({"type": "error", "error": str(e)})
+    finally:
+        session.connections -= 1
+        session.touch()
+    return ws
+
+
+async def health(request: web.Request) -> web.Response:
+    manager = request.app[SESSIONS_KEY]
+    stats = manager.stats()
+    if manager.agent.vector_database is not None:
+        stats["retrieval"] = manager.agent.vector_database.status
+    stats["models"] = manager.agent.model_lifecycle.stats()
+    if manager.agent.response_cache is not None:
+        stats["response_cache"] = manager.agent.response_cache.stats()
+    scheduler = manager.agent.http_client.scheduler
+    if scheduler is not None:
+        stats["backend"] = scheduler.stats()
+    return web.json_response(stats)
+
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(
+        text=metrics.prometheus_text(), content_type="text/plain", charset="utf-8"
+    )
+
+
+def create_app(manager: SessionManager) -> web.Application:
+    """多会话服务：
+
+    - POST   /sessions               创建会话
+    - DELETE /sessions/{id}          关闭会话
+    - POST   /sessions/{id}/chat     {"prompt": ...}，NDJSON 流式返回
+    - GET    /sessions/{id}/ws       WebSocket 对话
+    - GET    /health                 会话与后端队列统计
+    - GET    /metrics                Prometheus 指标
+    """
+    app = web.Application()
+    app[SESSIONS_KEY] = manager
+    app.router.add_post("/sessions", create_session)
+    app.router.add_delete("/sessions/{session_id}", delete_session)
+    app.router.add_post("/sessions/{session_id}/chat", chat)
+    app.router.add_get("/sessions/{session_id}/ws", websocket)
+    app.router.add_get("/health", health)
+    app.router.add_get("/metrics", metrics_handler)
+
+    async def on_startup(app: web.Application):
+        manager.start()
+
+    async def on_cleanup(app: web.Application):
+        await manager.stop()
+
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
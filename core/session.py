@@ -0,0 +1,145 @@
+import asyncio
+import time
+import uuid
+from typing import Dict, Optional
+
+from .agent import Agent
+from .utils.metrics import metrics
+
+
+class SessionLimitError(RuntimeError):
+    """并发会话数已达上限"""
+
+
+class SessionBusyError(RuntimeError):
+    """会话正在处理上一轮对话"""
+
+
+class Session:
+    def __init__(self, session_id: str, agent: Agent):
+        self.id = session_id
+        self.agent = agent
+        self.created_at = time.monotonic()
+        self.last_active = self.created_at
+        self.turns = 0
+        # 打开中的 WebSocket 连接数，连接期间会话不会因空闲被回收
+        self.connections = 0
+        # 同一会话的对话轮次必须串行，否则消息历史会交错
+        self.lock = asyncio.Lock()
+
+    @property
+    def busy(self) -> bool:
+        return self.lock.locked()
+
+    def touch(self):
+        self.last_active = time.monotonic()
+
+    async def stream(self, prompt: str):
+        """流式执行一轮对话；会话忙时立即报错而不是排队"""
+        if self.busy:
+            raise SessionBusyError(f"会话 {self.id} 正在处理上一轮对话")
+        async with self.lock:
+            self.touch()
+            try:
+                async for event in self.agent.stream_invoke(prompt):
+                    yield event
+                self.turns += 1
+            finally:
+                self.touch()
+
+
+class SessionManager:
+    """管理多个并发会话
+
+    每个会话由已初始化的 Agent fork 得到，拥有独立的消息历史；MCP 客户端、
+    检索器与 HTTP 连接池在所有会话间共享。空闲超过 idle_timeout 秒的会话
+    会被后台任务回收，会话数达到 max_sessions 时拒绝新建。
+    """
+
+    def __init__(
+        self,
+        agent: Agent,
+        max_sessions: int = 64,
+        idle_timeout: Optional[float] = 900.0,
+    ):
+        self.agent = agent
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.sessions: Dict[str, Session] = {}
+        self.evicted = 0
+        self._reaper: Optional[asyncio.Task] = None
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def create(self) -> Session:
+        if len(self.sessions) >= self.max_sessions:
+            self.evict_idle()
+        if len(self.sessions) >= self.max_sessions:
+            raise SessionLimitError(f"会话数已达上限 {self.max_sessions}")
+        session = Session(uuid.uuid4().hex, self.agent.fork())
+        self.sessions[session.id] = session
+        self._report()
+        return session
+
+    def get(self, session_id: str) -> Optional[Session]:
+        return self.sessions.get(session_id)
+
+    def close(self, session_id: str) -> bool:
+        removed = self.sessions.pop(session_id, None) is not None
+        self._report()
+        return removed
+
+    def evict_idle(self) -> int:
+        """回收空闲超时、没有进行中对话且没有 WebSocket 连接的会话，返回回收数量"""
+        if self.idle_timeout is None:
+            return 0
+        deadline = time.monotonic() - self.idle_timeout
+        expired = [
+            session_id
+            for session_id, session in self.sessions.items()
+            if not session.busy
+            and not session.connections
+            and session.last_active < deadline
+        ]
+        for session_id in expired:
+            del self.sessions[session_id]
+        if expired:
+            self.evicted += len(expired)
+            metrics.inc("server_sessions_evicted_total", len(expired))
+            self._report()
+        return len(expired)
+
+    def start(self):
+        if self.idle_timeout is not None and self._reaper is None:
+            self._reaper = asyncio.create_task(self._reap())
+
+    async def stop(self):
+        if self._reaper is not None:
+            self._reaper.cancel()
+            try:
+                await self._reaper
+            except asyncio.CancelledError:
+                pass
+            self._reaper = None
+        self.sessions.clear()
+        self._report()
+
+    async def _reap(self):
+        interval = max(1.0, self.idle_timeout / 4)
+        while True:
+            await asyncio.sleep(interval)
+            evicted = self.evict_idle()
+            if evicted:
+                print(f"回收空闲会话 {evicted} 个，当前会话数 {len(self.sessions)}")
+
+    def _report(self):
+        metrics.set_gauge("server_sessions", len(self.sessions))
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self.sessions),
+            "max_sessions": self.max_sessions,
+            "busy": sum(session.busy for session in self.sessions.values()),
+            "evicted": self.evicted,
+        }
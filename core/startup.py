@@ -0,0 +1,85 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Dict, List, Optional
+
+from .utils.metrics import metrics
+
+
+class Startup:
+    """启动编排：各阶段并发执行并记录耗时
+
+    run() 用于关键路径上的阶段（完成后才能接受输入），background() 用于可以
+    在接受输入之后才完成的阶段，如知识库编码与模型预热。失败的后台阶段只记录
+    错误，不影响其它阶段。
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, dict] = {}
+        self.milestones: Dict[str, float] = {}
+        self._tasks: List[asyncio.Task] = []
+
+    async def run(self, name: str, awaitable: Awaitable) -> Any:
+        begin = time.perf_counter()
+        stage = self.stages[name] = {"start": begin - self.started, "status": "running"}
+        try:
+            with metrics.span("startup.stage", stage=name):
+                result = await awaitable
+        except asyncio.CancelledError:
+            stage["status"] = "cancelled"
+            raise
+        except Exception as e:
+            stage["status"] = "failed"
+            stage["error"] = str(e)
+            raise
+        else:
+            stage["status"] = "ok"
+            return result
+        finally:
+            stage["duration"] = time.perf_counter() - begin
+
+    def background(self, name: str, awaitable: Awaitable) -> asyncio.Task:
+        async def guarded():
+            try:
+                return await self.run(name, awaitable)
+            except Exception as e:
+                print(f"启动阶段 {name} 失败: {e}")
+
+        self.stages[name] = {
+            "start": time.perf_counter() - self.started,
+            "status": "running",
+        }
+        task = asyncio.create_task(guarded())
+        self._tasks.append(task)
+        return task
+
+    def mark(self, name: str):
+        """记录一个时间点，如可以接受输入的时刻"""
+        self.milestones[name] = time.perf_counter() - self.started
+
+    @property
+    def pending(self) -> List[str]:
+        return [name for name, s in self.stages.items() if s["status"] == "running"]
+
+    async def wait(self, timeout: Optional[float] = None):
+        """等待所有后台阶段结束"""
+        if self._tasks:
+            await asyncio.wait(self._tasks, timeout=timeout)
+
+    async def cancel(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def report(self) -> str:
+        lines = []
+        for name, stage in sorted(self.stages.items(), key=lambda s: s[1]["start"]):
+            duration = stage.get("duration")
+            timing = f"{duration:.2f}s" if duration is not None else "进行中"
+            line = f"  {name:<16} +{stage['start']:.2f}s  {timing:<8} {stage['status']}"
+            if stage.get("error"):
+                line += f" ({stage['error']})"
+            lines.append(line)
+        for name, at in self.milestones.items():
+            lines.append(f"  {name:<16} +{at:.2f}s")
+        return "\n".join(lines)
@@ -0,0 +1,133 @@
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from mcp import Tool
+
+from .client import MCPClient
+from .llm import ToolCall
+
+
+class ToolEntry(NamedTuple):
+    name: str  # 暴露给模型的名称
+    client: MCPClient
+    tool: Tool  # 服务端原始 schema，tool.name 为服务端名称
+    payload: dict  # 发送给模型的工具描述，只构建一次
+
+
+class ToolRegistry:
+    """工具名到 (client, schema) 的映射，在 Agent.init 时构建
+
+    不同服务端出现同名工具时，这些工具改用 "服务名__工具名" 暴露；
+    namespaced=True 时所有工具都使用带命名空间的名称。带命名空间的名称始终可以解析。
+    """
+
+    SEPARATOR = "__"
+
+    def __init__(self, namespaced: bool = False):
+        self.namespaced = namespaced
+        self.tool_calls = ToolCall()
+        # 暴露的工具集合每次变化后递增，供工具筛选判断是否需要重新编码
+        self.version = 0
+        self._entries: Dict[str, ToolEntry] = {}
+        # 服务端工具名 -> {客户端名: (client, tool)}
+        self._owners: Dict[str, Dict[str, Tuple[MCPClient, Tool]]] = {}
+        # 服务端工具名 -> 当前暴露名称；客户端名 -> 其服务端工具名
+        self._labels: Dict[str, List[str]] = {}
+        self._client_tools: Dict[str, Set[str]] = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, name: str):
+        return self.resolve(name) is not None
+
+    def register(self, client: MCPClient):
+        tools = self._client_tools.setdefault(client.name, set())
+        for tool in client.get_all_tools():
+            self._owners.setdefault(tool.name, {})[client.name] = (client, tool)
+            tools.add(tool.name)
+            self._relabel(tool.name)
+        self._sync_tool_calls()
+
+    def unregister(self, client: MCPClient):
+        for raw_name in self._client_tools.pop(client.name, set()):
+            self._owners[raw_name].pop(client.name, None)
+            self._relabel(raw_name)
+        self._sync_tool_calls()
+
+    def refresh(self, client: MCPClient):
+        """客户端工具列表变化后增量更新，只改动增删或 schema 变化的工具"""
+        current = {tool.name: tool for tool in client.get_all_tools()}
+        registered = self._client_tools.get(client.name, set())
+        self._client_tools[client.name] = set(current)
+
+        changed = set()
+        for raw_name in registered - current.keys():
+            self._owners[raw_name].pop(client.name, None)
+            changed.add(raw_name)
+        for raw_name, tool in current.items():
+            owners = self._owners.setdefault(raw_name, {})
+            previous = owners.get(client.name)
+            if previous is None or previous[1] != tool:
+                owners[client.name] = (client, tool)
+                changed.add(raw_name)
+
+        for raw_name in changed:
+            self._relabel(raw_name)
+        if changed:
+            self._sync_tool_calls()
+            print(f"工具列表已更新: {client.name}，变化 {len(changed)} 个")
+
+    def resolve(self, name: str) -> Optional[ToolEntry]:
+        entry = self._entries.get(name)
+        if entry is not None:
+            return entry
+        # 带命名空间的名称始终可用
+        client_name, sep, raw_name = name.partition(self.SEPARATOR)
+        owner = self._owners.get(raw_name, {}).get(client_name) if sep else None
+        if owner is None:
+            return None
+        return self._entries.get(raw_name) or self._entries.get(name)
+
+    def get_all_entries(self) -> List[ToolEntry]:
+        return list(self._entries.values())
+
+    def clear(self):
+        self._entries.clear()
+        self._owners.clear()
+        self._labels.clear()
+        self._client_tools.clear()
+        self.tool_calls.clear()
+        self.version += 1
+
+    def _relabel(self, raw_name: str):
+        """重新计算某个服务端工具名在各客户端下的暴露名称"""
+        for name in self._labels.pop(raw_name, []):
+            self._entries.pop(name, None)
+
+        owners = self._owners.get(raw_name) or {}
+        if not owners:
+            self._owners.pop(raw_name, None)
+            return
+        if len(owners) > 1:
+            print(
+                f"工具名冲突: {raw_name} 同时存在于 {list(owners)}，改用带命名空间的名称"
+            )
+
+        for client_name, (client, tool) in owners.items():
+            name = raw_name
+            if self.namespaced or len(owners) > 1:
+                name = f"{client_name}{self.SEPARATOR}{raw_name}"
+            payload = {
+                "function": {
+                    "name": name,
+                    "description": tool.description,
+                    "parameters": tool.inputSchema,
+                }
+            }
+            self._entries[name] = ToolEntry(name, client, tool, payload)
+            self._labels.setdefault(raw_name, []).append(name)
+
+    def _sync_tool_calls(self):
+        # LLM 持有同一个 ToolCall 对象，这里只替换其中的引用列表
+        self.tool_calls.function_calls = [e.payload for e in self._entries.values()]
+        self.version += 1
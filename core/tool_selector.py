@@ -0,0 +1,138 @@
+import json
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from .memory import estimate_tokens
+from .tool_registry import ToolRegistry
+from .utils.cache import LRUCache
+from .utils.embedding_retriever import EmbeddingRetriever
+from .utils.lexical_index import BM25Index
+from .utils.metrics import metrics
+from .utils.scheduler import Priority
+
+
+class ToolSelection(NamedTuple):
+    names: Tuple[str, ...]
+    payloads: List[dict]
+    json: str  # 序列化后的工具列表，直接拼入请求体
+    tokens: int
+    total_tools: int
+    total_tokens: int  # 发送全部工具时的 token 数
+
+    @property
+    def saved_tokens(self) -> int:
+        return self.total_tokens - self.tokens
+
+
+class ToolSelector:
+    """按提问挑选发送给模型的工具
+
+    每个工具的名称与描述只编码一次（schema 变化时重新编码）。本轮检索已经
+    计算过提问向量时，与之计算余弦相似度取前 top_n 个；否则（检索走了词法快速
+    路径或没有检索）不为选工具单独请求一次嵌入，改用工具名称与描述上的 BM25
+    排序，精度略低，没有任何工具匹配时发送全部工具。最后再加上 pinned 中的工具；
+    工具总数不超过 top_n 时全部发送。选中的工具按注册顺序排列，同一组工具的
+    序列化结果会被缓存。
+    """
+
+    def __init__(
+        self,
+        retriever: EmbeddingRetriever,
+        registry: ToolRegistry,
+        top_n: int = 8,
+        pinned: Iterable[str] = (),
+        cache_size: int = 256,
+    ):
+        self.retriever = retriever
+        self.registry = registry
+        self.top_n = top_n
+        self.pinned = set(pinned)
+        # (名称, 描述) -> 归一化后的向量
+        self._vectors: Dict[Tuple[str, str], np.ndarray] = {}
+        self._names: List[str] = []
+        self._matrix: Optional[np.ndarray] = None
+        self._lexical = BM25Index()
+        self._synced_version = -1
+        self._selections = LRUCache(cache_size)
+
+    async def sync(self):
+        """为新增或描述变化的工具计算向量"""
+        version = self.registry.version
+        if version == self._synced_version:
+            return
+        entries = self.registry.get_all_entries()
+        keys = [self._key(entry.payload) for entry in entries]
+        missing = [key for key in dict.fromkeys(keys) if key not in self._vectors]
+        if missing:
+            texts = [f"{name}: {description}" for name, description in missing]
+            embeddings = await self.retriever.embed_texts(texts, Priority.BULK)
+            for key, embedding in zip(missing, embeddings):
+                vector = np.asarray(embedding, dtype=np.float32)
+                norm = np.linalg.norm(vector)
+                self._vectors[key] = vector / norm if norm else vector
+        self._names = [entry.name for entry in entries]
+        self._matrix = np.stack([self._vectors[key] for key in keys]) if keys else None
+        self._lexical = BM25Index()
+        for name, description in keys:
+            self._lexical.add(f"{name} {description}")
+        self._selections.clear()
+        self._synced_version = version
+
+    async def select(self, prompt: str) -> ToolSelection:
+        entries = self.registry.get_all_entries()
+        if len(entries) <= self.top_n + len(self.pinned):
+            return self._selection(tuple(entry.name for entry in entries))
+
+        try:
+            await self.sync()
+        except Exception as e:
+            # 选择失败时退回发送全部工具，不影响对话
+            print(f"工具筛选失败，发送全部工具: {e}")
+            return self._selection(tuple(entry.name for entry in entries))
+
+        embedding = self.retriever.cached_query_embedding(prompt)
+        if embedding is not None:
+            scores = self._matrix @ np.asarray(embedding, np.float32)
+            order = np.argsort(-scores, kind="stable").tolist()
+            route = "embedding"
+        else:
+            hits = self._lexical.search(prompt, len(self._names))
+            if not hits:
+                metrics.inc("tool_selection_total", route="all")
+                return self._selection(tuple(self._names))
+            # 匹配到的工具在前，不足 top_n 时按注册顺序补齐
+            matched = [hit.id for hit in hits]
+            order = matched + sorted(set(range(len(self._names))) - set(matched))
+            route = "lexical"
+
+        ranked = [self._names[i] for i in order if self._names[i] not in self.pinned]
+        chosen = set(ranked[: self.top_n]) | (self.pinned & set(self._names))
+        names = tuple(name for name in self._names if name in chosen)
+        metrics.inc("tool_selection_total", route=route)
+        return self._selection(names)
+
+    def _selection(self, names: Tuple[str, ...]) -> ToolSelection:
+        key = (self.registry.version, names)
+        selection = self._selections.get(key)
+        if selection is None:
+            entries = self.registry.get_all_entries()
+            by_name = {entry.name: entry.payload for entry in entries}
+            payloads = [by_name[name] for name in names if name in by_name]
+            encoded = json.dumps(payloads)
+            total = estimate_tokens(json.dumps([e.payload for e in entries]))
+            selection = ToolSelection(
+                names,
+                payloads,
+                encoded,
+                estimate_tokens(encoded),
+                len(entries),
+                total,
+            )
+            self._selections.put(key, selection)
+        return selection
+
+    @staticmethod
+    def _key(payload: dict) -> Tuple[str, str]:
+        function = payload["function"]
+        return function["name"], function.get("description") or ""
@@ -0,0 +1,137 @@
+import re
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from .tokens import TOKEN_RE
+
+_HEADING_RE = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+_FENCE_RE = re.compile(r"^\s*(```|~~~)")
+_VERSION = 2
+
+
+class Chunk(NamedTuple):
+    text: str
+    metadata: dict
+
+
+class _Piece(NamedTuple):
+    line: int
+    text: str
+    tokens: int
+
+
+class Chunker:
+    """按 Markdown 标题与词元窗口切分文档
+
+    逐行读取，遇到标题（代码块内除外）时结束当前分块；同一节内超过 max_tokens
+    时切出一块，并把末尾 overlap_tokens 个词元（必要时从行中间截取）带入下一块。
+    超长的单行按词元拆开。内存中只保留当前窗口，文件再大也不会整体读入。
+    """
+
+    def __init__(self, max_tokens: int = 256, overlap_tokens: int = 32):
+        if max_tokens <= 0:
+            raise ValueError("max_tokens must be positive.")
+        if not 0 <= overlap_tokens < max_tokens:
+            raise ValueError("overlap_tokens must be in [0, max_tokens).")
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+
+    @property
+    def settings(self) -> dict:
+        # version 随切分规则变化，旧索引中的分块随之失效
+        return {
+            "version": _VERSION,
+            "max_tokens": self.max_tokens,
+            "overlap_tokens": self.overlap_tokens,
+        }
+
+    def iter_file(self, path: str, source: Optional[str] = None) -> Iterator[Chunk]:
+        with open(path, "r", encoding="utf-8") as f:
+            yield from self.iter_lines(f, source or path)
+
+    def iter_lines(self, lines: Iterable[str], source: str) -> Iterator[Chunk]:
+        """产出的 metadata 含 source、chunk（序号）、heading（标题路径）与起止行号"""
+        headings: List[Tuple[int, str]] = []
+        window: List[_Piece] = []
+        heading = ""
+        total = 0
+        fresh = 0  # 窗口中上一块之后新加入的非空片段数
+        index = 0
+        in_fence = False
+
+        def emit() -> Optional[Chunk]:
+            nonlocal index
+            if not fresh:
+                return None
+            text = "".join(piece.text for piece in window).strip()
+            chunk = Chunk(
+                text,
+                {
+                    "source": source,
+                    "chunk": index,
+                    "heading": heading,
+                    "start_line": window[0].line,
+                    "end_line": window[-1].line,
+                },
+            )
+            index += 1
+            return chunk
+
+        for number, line in enumerate(lines, 1):
+            if _FENCE_RE.match(line):
+                in_fence = not in_fence
+            match = None if in_fence else _HEADING_RE.match(line)
+            if match:
+                chunk = emit()
+                if chunk:
+                    yield chunk
+                level = len(match.group(1))
+                headings = [h for h in headings if h[0] < level]
+                headings.append((level, match.group(2)))
+                heading = " > ".join(title for _, title in headings)
+                window, fresh, total = [], 0, 0
+
+            for piece in self._split_line(number, line):
+                if fresh and total + piece.tokens > self.max_tokens:
+                    yield emit()
+                    window, fresh = self._overlap(window), 0
+                    total = sum(p.tokens for p in window)
+                window.append(piece)
+                total += piece.tokens
+                if piece.tokens:
+                    fresh += 1
+
+        chunk = emit()
+        if chunk:
+            yield chunk
+
+    def _overlap(self, window: List[_Piece]) -> List[_Piece]:
+        """窗口末尾的 overlap_tokens 个词元，最早的一段可能从行中间开始"""
+        kept, remaining = [], self.overlap_tokens
+        for piece in reversed(window):
+            if remaining <= 0:
+                break
+            if piece.tokens > remaining:
+                tokens = list(TOKEN_RE.finditer(piece.text))
+                start = tokens[-remaining].start()
+                piece = _Piece(piece.line, piece.text[start:], remaining)
+            kept.append(piece)
+            remaining -= piece.tokens
+        kept.reverse()
+        # 去掉开头的空行，避免下一块以空白开始
+        while kept and not kept[0].tokens:
+            kept.pop(0)
+        return kept
+
+    def _split_line(self, number: int, line: str) -> List[_Piece]:
+        """超长的行按词元切开，每段留出 overlap_tokens 的位置给上一块的末尾"""
+        tokens = list(TOKEN_RE.finditer(line))
+        size = self.max_tokens - self.overlap_tokens
+        if len(tokens) <= size:
+            return [_Piece(number, line, len(tokens))]
+        pieces = []
+        for i in range(0, len(tokens), size):
+            start = tokens[i].start() if i else 0
+            stop = i + size
+            end = tokens[stop].start() if stop < len(tokens) else len(line)
+            pieces.append(_Piece(number, line[start:end], min(size, len(tokens) - i)))
+        return pieces
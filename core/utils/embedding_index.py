@@ -0,0 +1,174 @@
+import hashlib
+import json
+import os
+import uuid
+from collections import defaultdict
+from typing import Dict, List, Optional, Set
+
+import numpy as np
+
+from .vector_store import VectorStore
+
+INDEX_VERSION = 1
+MANIFEST_NAME = "index.json"
+
+
+def content_hash(path: str) -> str:
+    """分块读取文件计算 sha256，避免整文件读入内存"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class EmbeddingIndex:
+    """磁盘上的向量索引
+
+    index.json     版本、嵌入模型、分块参数、维度、向量文件名，以及每个源文件
+                   的内容哈希、行偏移、行数和对应的分块文本与 metadata
+    vectors-*.f32  所有行归一化后的 float32 向量，按行连续存放，
+                   加载时用 np.memmap 映射，不复制
+    """
+
+    def __init__(
+        self, index_dir: str, embedding_model: str, settings: Optional[dict] = None
+    ):
+        self.index_dir = index_dir
+        self.embedding_model = embedding_model
+        # 影响向量内容的其它参数（如分块大小），变化时索引失效
+        self.settings = settings or {}
+        self.dim: Optional[int] = None
+        self.entries: Dict[str, dict] = {}
+        self.vectors: Optional[np.ndarray] = None
+        self._vectors_name: Optional[str] = None
+
+    @property
+    def fingerprint(self) -> Optional[str]:
+        """当前向量文件名，每次保存都会变化，可用于判断派生数据是否过期"""
+        return self._vectors_name
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.index_dir, MANIFEST_NAME)
+
+    def load(self) -> bool:
+        """读取索引；版本、模型、分块参数或向量文件不匹配时视为无效"""
+        if not os.path.exists(self.manifest_path):
+            return False
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"索引读取失败，将重新编码: {e}")
+            return False
+
+        if (
+            manifest.get("version") != INDEX_VERSION
+            or manifest.get("model") != self.embedding_model
+            or manifest.get("settings", {}) != self.settings
+        ):
+            print("索引版本、嵌入模型或分块参数已变化，将重新编码")
+            return False
+
+        dim, rows = manifest["dim"], manifest["rows"]
+        vectors_path = os.path.join(self.index_dir, manifest["vectors"])
+        if rows:
+            if (
+                not os.path.exists(vectors_path)
+                or os.path.getsize(vectors_path) != rows * dim * 4
+            ):
+                print("索引向量文件不完整，将重新编码")
+                return False
+            self.vectors = np.memmap(
+                vectors_path, dtype=np.float32, mode="r", shape=(rows, dim)
+            )
+        self.dim = dim
+        self.entries = manifest["files"]
+        self._vectors_name = manifest["vectors"]
+        return True
+
+    def is_current(self, digests: Dict[str, str]) -> bool:
+        """索引中的文件及其哈希是否与 digests 完全一致"""
+        return {s: e["sha256"] for s, e in self.entries.items()} == digests
+
+    def load_into(self, store: VectorStore, digests: Dict[str, str]) -> Set[str]:
+        """把内容未变化的文件挂载到 store，返回被复用的文件集合"""
+        if self.vectors is None or store.dim not in (None, self.dim):
+            return set()
+
+        reused = sorted(
+            (
+                (source, entry)
+                for source, entry in self.entries.items()
+                if digests.get(source) == entry["sha256"]
+            ),
+            key=lambda item: item[1]["offset"],
+        )
+
+        # 合并相邻的行区间，减少挂载块的数量
+        ranges: List[list] = []
+        for source, entry in reused:
+            if ranges and ranges[-1][1] == entry["offset"]:
+                ranges[-1][1] += entry["count"]
+                ranges[-1][2].append((source, entry))
+            else:
+                start = entry["offset"]
+                ranges.append([start, start + entry["count"], [(source, entry)]])
+
+        for start, end, group in ranges:
+            documents, metadata = [], []
+            for source, entry in group:
+                documents.extend(entry["documents"])
+                metadata.extend(
+                    entry.get("metadata") or [{"source": source}] * entry["count"]
+                )
+            store.attach(self.vectors[start:end], documents, metadata)
+
+        return {source for source, _ in reused}
+
+    def save(self, store: VectorStore, digests: Dict[str, str]):
+        """按 digests 重写索引；store 中每行的 metadata["source"] 标明所属文件"""
+        rows_by_source: Dict[str, List[int]] = defaultdict(list)
+        for i, meta in enumerate(store.metadata):
+            source = meta.get("source")
+            if source in digests:
+                rows_by_source[source].append(i)
+
+        os.makedirs(self.index_dir, exist_ok=True)
+        vectors_name = f"vectors-{uuid.uuid4().hex}.f32"
+        entries, offset = {}, 0
+        with open(os.path.join(self.index_dir, vectors_name), "wb") as f:
+            for source, ids in rows_by_source.items():
+                store.rows(ids).tofile(f)
+                entries[source] = {
+                    "sha256": digests[source],
+                    "offset": offset,
+                    "count": len(ids),
+                    "documents": [store.documents[i] for i in ids],
+                    "metadata": [store.metadata[i] for i in ids],
+                }
+                offset += len(ids)
+
+        manifest = {
+            "version": INDEX_VERSION,
+            "model": self.embedding_model,
+            "settings": self.settings,
+            "dim": store.dim,
+            "rows": offset,
+            "vectors": vectors_name,
+            "files": entries,
+        }
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp_path, self.manifest_path)
+
+        self.dim, self.entries, self._vectors_name = store.dim, entries, vectors_name
+        for name in os.listdir(self.index_dir):
+            if name.startswith("vectors-") and name != vectors_name:
+                try:
+                    os.remove(os.path.join(self.index_dir, name))
+                except OSError:
+                    # Windows 下仍被映射的文件无法删除，留到下次保存时再清理
+                    pass
@@ -1,47 +1,355 @@
-import json
+import asyncio
 import os
-from typing import List
-
-import aiohttp
+import time
+from collections import deque
+from typing import AsyncIterator, Deque, Iterable, Iterator, List, Optional, Tuple
 
+from .cache import LRUCache
+from .http_client import HTTPClient
+from .ivf_index import IVFVectorStore
+from .lexical_index import BM25Index, LexicalHit, reciprocal_rank_fusion
+from .metrics import metrics
+from .model_lifecycle import ModelLifecycle
+from .ndjson import iter_ndjson
+from .scheduler import Priority
 from .util import log_title
 from .vector_store import VectorStore
 
 
+def normalize_query(query: str) -> str:
+    return " ".join(query.casefold().split())
+
+
+def create_vector_store(
+    index_type: str = "flat", quantization: Optional[str] = None, **options
+) -> VectorStore:
+    """按配置创建向量库：flat 为精确扫描，ivf 为倒排近似检索"""
+    if index_type == "flat":
+        return VectorStore(quantization=quantization, **options)
+    if index_type == "ivf":
+        return IVFVectorStore(quantization=quantization, **options)
+    raise ValueError(f"Unknown index type: {index_type}")
+
+
 class EmbeddingRetriever:
-    def __init__(self, embedding_model: str, api_url: str):
+    def __init__(
+        self,
+        embedding_model: str,
+        api_url: str,
+        batch_size: int = 32,
+        max_batch_chars: int = 64_000,
+        max_concurrency: int = 4,
+        http_client: Optional[HTTPClient] = None,
+        cache_size: int = 1024,
+        cache_ttl: Optional[float] = 600.0,
+        quantization: Optional[str] = None,
+        index_type: str = "flat",
+        index_options: Optional[dict] = None,
+        hybrid: bool = True,
+        fusion_candidates: int = 20,
+        fast_path_coverage: float = 0.8,
+        fast_path_margin: float = 2.0,
+        lifecycle: Optional[ModelLifecycle] = None,
+    ):
         self.embedding_model = embedding_model
         self.api_url = api_url
-        self.vector_store = VectorStore()
+        self.batch_size = batch_size
+        self.max_batch_chars = max_batch_chars
+        self.max_concurrency = max_concurrency
+        self.http_client = http_client or HTTPClient()
+        self.lifecycle = lifecycle
+        # quantization 为 "float16"/"int8" 时向量库以量化编码常驻内存；
+        # index_type 为 "ivf" 时使用倒排近似检索，参数见 IVFVectorStore
+        self.vector_store = create_vector_store(
+            index_type, quantization, **(index_options or {})
+        )
+        # hybrid 时与向量库并行维护 BM25 倒排索引：词法结果足够明确时直接返回，
+        # 不请求嵌入；否则与向量检索结果做 RRF 融合
+        self.lexical_index = BM25Index() if hybrid else None
+        self.fusion_candidates = fusion_candidates
+        self.fast_path_coverage = fast_path_coverage
+        self.fast_path_margin = fast_path_margin
+        # 查询向量与检索结果缓存，键为 (模型, 规范化后的查询[, top_k])
+        self.query_cache = LRUCache(cache_size, cache_ttl)
+        self.result_cache = LRUCache(cache_size, cache_ttl)
+        self._result_cache_version = self.vector_store.version
+        # 后台编码知识库期间为 warming：检索照常进行，但结果可能不完整
+        self._ready = asyncio.Event()
+        self._ready.set()
+
+    @property
+    def status(self) -> str:
+        return "ready" if self._ready.is_set() else "warming"
+
+    def begin_warming(self):
+        self._ready.clear()
+
+    def finish_warming(self):
+        self._ready.set()
+
+    async def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
 
-    async def embed_document(self, document: str) -> List[float]:
-        embedding = await self._embed(document)
+    async def embed_document(
+        self, document: str, metadata: Optional[dict] = None
+    ) -> List[float]:
+        embedding = await self._embed(document, Priority.BULK)
         print(f"Embedding: {embedding}\n")
-        await self.vector_store.add_embedding(embedding, document)
+        await self.vector_store.add_embedding(embedding, document, metadata)
         return embedding
 
+    async def embed_documents_batch(
+        self,
+        documents: List[str],
+        metadata: Optional[List[dict]] = None,
+        batch_size: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+    ) -> List[List[float]]:
+        """分批编码文档，多个批次并发请求，结果按输入顺序写入向量库"""
+        if metadata is not None and len(metadata) != len(documents):
+            raise ValueError("Metadata must match the number of documents.")
+
+        embeddings = []
+        items = zip(documents, metadata or [None] * len(documents))
+        async for batch, batch_embeddings in self._embed_stream(
+            items, batch_size, max_concurrency
+        ):
+            embeddings.extend(batch_embeddings)
+        await self.vector_store.prepare()
+        return embeddings
+
+    async def ingest(
+        self,
+        chunks: Iterable[Tuple[str, Optional[dict]]],
+        batch_size: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+    ) -> int:
+        """流式编码 (文本, metadata) 序列（如 Chunker 产出的分块），返回写入的条数
+
+        边读取边组批请求，最多 max_concurrency 个批次在途，已写入向量库的批次
+        随即释放，内存占用与输入总量无关。
+        """
+        count = 0
+        async for batch, _ in self._embed_stream(chunks, batch_size, max_concurrency):
+            count += len(batch)
+        await self.vector_store.prepare()
+        return count
+
+    async def _embed_stream(
+        self,
+        items: Iterable[Tuple[str, Optional[dict]]],
+        batch_size: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+    ) -> AsyncIterator[Tuple[List[tuple], List[List[float]]]]:
+        """按顺序产出 (批次, 向量)，产出前已写入向量库"""
+        concurrency = max_concurrency or self.max_concurrency
+        pending: Deque[Tuple[List[tuple], asyncio.Task]] = deque()
+        started = time.perf_counter()
+        total = batches = 0
+
+        async def run_batch(number: int, batch: List[tuple]) -> List[List[float]]:
+            batch_started = time.perf_counter()
+            embeddings = await self._embed_batch(
+                [document for document, _ in batch], Priority.BULK
+            )
+            elapsed = time.perf_counter() - batch_started
+            print(
+                f"批次 {number}: {len(batch)} 条，"
+                f"耗时 {elapsed:.2f}s，{len(batch) / max(elapsed, 1e-9):.1f} 条/秒"
+            )
+            return embeddings
+
+        async def finish_oldest():
+            batch, task = pending.popleft()
+            embeddings = await task
+            for (document, meta), embedding in zip(batch, embeddings):
+                await self.vector_store.add_embedding(embedding, document, meta)
+            return batch, embeddings
+
+        try:
+            for batch in self._iter_batches(items, batch_size or self.batch_size):
+                if len(pending) >= concurrency:
+                    yield await finish_oldest()
+                batches += 1
+                total += len(batch)
+                task = asyncio.create_task(run_batch(batches, batch))
+                pending.append((batch, task))
+            while pending:
+                yield await finish_oldest()
+        finally:
+            for _, task in pending:
+                task.cancel()
+
+        elapsed = time.perf_counter() - started
+        print(
+            f"编码完成: {total} 条文档，{batches} 个批次，"
+            f"耗时 {elapsed:.2f}s，{total / max(elapsed, 1e-9):.1f} 条/秒"
+        )
+
+    async def embed_texts(
+        self, texts: List[str], priority: Priority = Priority.INTERACTIVE
+    ) -> List[List[float]]:
+        """只计算向量，不写入向量库（如工具描述）"""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run_batch(batch: List[str]) -> List[List[float]]:
+            async with semaphore:
+                return await self._embed_batch(batch, priority)
+
+        results = await asyncio.gather(
+            *[run_batch(b) for b in self._make_batches(texts, self.batch_size)]
+        )
+        return [embedding for batch in results for embedding in batch]
+
     async def embed_query(self, query: str) -> List[float]:
-        log_title("EMBEDDING QUERY")
-        return await self._embed(query)
+        key = (self.embedding_model, normalize_query(query))
+        embedding = self.query_cache.get(key)
+        metrics.inc(
+            "retriever_cache_total",
+            cache="query",
+            result="miss" if embedding is None else "hit",
+        )
+        if embedding is None:
+            log_title("EMBEDDING QUERY")
+            embedding = await self._embed(query)
+            self.query_cache.put(key, embedding)
+        return embedding
 
-    async def _embed(self, document: str) -> List[float]:
+    def cached_query_embedding(self, query: str) -> Optional[List[float]]:
+        """之前已计算过的提问向量，没有时返回 None，不发起请求"""
+        return self.query_cache.get((self.embedding_model, normalize_query(query)))
+
+    async def _embed(
+        self, document: str, priority: Priority = Priority.INTERACTIVE
+    ) -> List[float]:
+        return (await self._embed_batch([document], priority))[0]
+
+    async def _embed_batch(
+        self, inputs: List[str], priority: Priority = Priority.INTERACTIVE
+    ) -> List[List[float]]:
 
         payload = {
             "model": self.embedding_model,
-            "input": document,
+            "input": inputs,
         }
+        if self.lifecycle is not None:
+            payload.update(self.lifecycle.request_fields(self.embedding_model))
+
+        embeddings = []
+        with metrics.span("embedding.request", batch_size=len(inputs)):
+            async with self.http_client.post(
+                self.api_url, lane="embed", priority=priority, json=payload
+            ) as response:
+                if response.status != 200:
+                    raise RuntimeError(f"嵌入请求失败: {response.status}")
+                async for data in iter_ndjson(response.content):
+                    embeddings = data.get("embeddings", [])
+        metrics.inc("embedding_inputs_total", len(inputs))
+
+        if len(embeddings) != len(inputs):
+            raise RuntimeError(
+                f"嵌入结果数量不匹配: 期望 {len(inputs)}，实际 {len(embeddings)}"
+            )
+        return embeddings
 
-        async with aiohttp.ClientSession() as session:
-            async with session.post(self.api_url, json=payload) as response:
-                async for raw_line in response.content:
-                    try:
-                        data = json.loads(raw_line.decode("utf-8"))
-                        embeddings = data.get("embeddings", {})
+    def _make_batches(self, documents: List[str], batch_size: int) -> List[List[str]]:
+        return [
+            [document for document, _ in batch]
+            for batch in self._iter_batches(((d, None) for d in documents), batch_size)
+        ]
 
-                    except Exception as e:
-                        print(f"解析错误: {e}")
-                return embeddings[0]
+    def _iter_batches(
+        self, items: Iterable[Tuple[str, Optional[dict]]], batch_size: int
+    ) -> Iterator[List[tuple]]:
+        """按条数和总字符数上限切分批次，逐批产出，不需要事先拿到全部输入"""
+        current, current_chars = [], 0
+        for document, meta in items:
+            if current and (
+                len(current) >= batch_size
+                or current_chars + len(document) > self.max_batch_chars
+            ):
+                yield current
+                current, current_chars = [], 0
+            current.append((document, meta))
+            current_chars += len(document)
+        if current:
+            yield current
 
     async def retrieve(self, query: str, top_k: int = 3) -> List[str]:
+        # 向量库有新文档写入后，之前的检索结果全部失效
+        if self._result_cache_version != self.vector_store.version:
+            self.result_cache.clear()
+            self._result_cache_version = self.vector_store.version
+
+        key = (self.embedding_model, normalize_query(query), top_k)
+        with metrics.span("retriever.retrieve", top_k=top_k) as span:
+            results = self.result_cache.get(key)
+            span.set(cached=results is not None)
+            metrics.inc(
+                "retriever_cache_total",
+                cache="result",
+                result="miss" if results is None else "hit",
+            )
+            if results is None:
+                ids = await self._search_ids(query, top_k)
+                results = [self.vector_store.documents[i] for i in ids]
+                self.result_cache.put(key, results)
+        return list(results)
+
+    def sync_lexical_index(self) -> int:
+        """把向量库中尚未建立倒排的文档（含从磁盘索引挂载的）加入 BM25 索引"""
+        if self.lexical_index is None:
+            return 0
+        documents = self.vector_store.documents
+        start = len(self.lexical_index)
+        for i in range(start, len(documents)):
+            self.lexical_index.add(documents[i])
+        return len(documents) - start
+
+    async def _search_ids(self, query: str, top_k: int) -> List[int]:
+        store = self.vector_store
+        if self.lexical_index is None:
+            query_embedding = await self.embed_query(query)
+            with metrics.span("vector_store.search", rows=len(store)):
+                return [i for i, _ in store.search_ids(query_embedding, top_k)]
+
+        self.sync_lexical_index()
+        candidates = max(top_k, self.fusion_candidates)
+        with metrics.span("lexical.search", rows=len(self.lexical_index)):
+            lexical = self.lexical_index.search(query, candidates)
+        if self._confident(lexical):
+            metrics.inc("retriever_route_total", route="lexical")
+            return [hit.id for hit in lexical[:top_k]]
+
         query_embedding = await self.embed_query(query)
-        return await self.vector_store.search(query_embedding, top_k)
+        with metrics.span("vector_store.search", rows=len(store)):
+            dense = store.search_ids(query_embedding, candidates)
+            if not lexical:
+                metrics.inc("retriever_route_total", route="dense")
+                return [i for i, _ in dense[:top_k]]
+            # 词法候选即使不在向量检索的前列，也按精确相似度参与向量侧排序
+            dense_ids = {i for i, _ in dense}
+            extra = [hit.id for hit in lexical if hit.id not in dense_ids]
+            dense.extend(zip(extra, store.score_ids(query_embedding, extra).tolist()))
+            dense.sort(key=lambda item: -item[1])
+        metrics.inc("retriever_route_total", route="hybrid")
+        fused = reciprocal_rank_fusion(
+            [[i for i, _ in dense], [hit.id for hit in lexical]]
+        )
+        return [i for i, _ in fused[:top_k]]
+
+    def _confident(self, hits: List[LexicalHit]) -> bool:
+        """最佳匹配覆盖了查询中的关键词，且分数明显高于第二名"""
+        if not hits or hits[0].coverage < self.fast_path_coverage:
+            return False
+        return len(hits) == 1 or hits[0].score >= self.fast_path_margin * hits[1].score
+
+    def cache_stats(self) -> dict:
+        return {
+            "query_embeddings": self.query_cache.stats(),
+            "results": self.result_cache.stats(),
+        }
@@ -0,0 +1,145 @@
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, NamedTuple, Optional
+
+import aiohttp
+
+from .scheduler import BackendScheduler, Priority
+
+
+class RequestTiming(NamedTuple):
+    url: str
+    connect: float  # 建立连接耗时，复用连接时为 0
+    ttfb: float  # 从发出请求到收到响应头
+    reused: bool
+
+
+class HTTPClient:
+    """LLM 与 EmbeddingRetriever 共享的长连接 HTTP 客户端
+
+    内部只有一个 ClientSession：连接池按主机限流并保持长连接，
+    DNS 结果会缓存，每个请求的建连耗时与首字节耗时记录在 timings 中。
+    配置了 scheduler 时，指定 lane 的请求先经过准入队列再发出。
+
+    timeout 限制整个请求（默认不限，流式回答可能很长）；connect_timeout 限制
+    建立连接，read_timeout 限制两次收到数据之间的间隔，卡住的连接会报错并
+    释放准入名额，而不是一直占用。
+    """
+
+    def __init__(
+        self,
+        limit: int = 100,
+        limit_per_host: int = 16,
+        keepalive_timeout: float = 60.0,
+        dns_cache_ttl: int = 300,
+        timeout: Optional[float] = None,
+        connect_timeout: Optional[float] = 30.0,
+        read_timeout: Optional[float] = 300.0,
+        max_timings: int = 1000,
+        scheduler: Optional[BackendScheduler] = None,
+    ):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.timings: Deque[RequestTiming] = deque(maxlen=max_timings)
+        self.scheduler = scheduler
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        # 在事件循环中首次使用时再创建
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                use_dns_cache=True,
+                ttl_dns_cache=self.dns_cache_ttl,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(
+                    total=self.timeout,
+                    connect=self.connect_timeout,
+                    sock_connect=self.connect_timeout,
+                    sock_read=self.read_timeout,
+                ),
+                trace_configs=[self._trace_config()],
+            )
+        return self._session
+
+    def post(
+        self,
+        url: str,
+        lane: Optional[str] = None,
+        priority: Priority = Priority.INTERACTIVE,
+        **kwargs,
+    ):
+        if self.scheduler is None or lane is None:
+            return self.session.post(url, **kwargs)
+        return self._scheduled_post(url, lane, priority, **kwargs)
+
+    @asynccontextmanager
+    async def _scheduled_post(self, url: str, lane: str, priority: Priority, **kwargs):
+        # 名额在整个响应读取完毕后才释放，流式对话期间一直占用
+        async with self.scheduler.slot(lane, priority):
+            async with self.session.post(url, **kwargs) as response:
+                yield response
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def stats(self) -> dict:
+        """汇总最近请求的建连与首字节耗时（秒）"""
+        if not self.timings:
+            return {"requests": 0}
+        ttfbs = sorted(t.ttfb for t in self.timings)
+        connects = [t.connect for t in self.timings if not t.reused]
+        return {
+            "requests": len(self.timings),
+            "reused": sum(t.reused for t in self.timings),
+            "avg_connect": sum(connects) / len(connects) if connects else 0.0,
+            "p50_ttfb": ttfbs[len(ttfbs) // 2],
+            "p95_ttfb": ttfbs[min(len(ttfbs) - 1, int(len(ttfbs) * 0.95))],
+        }
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(self._on_request_start)
+        trace_config.on_connection_create_start.append(self._on_connection_start)
+        trace_config.on_connection_create_end.append(self._on_connection_end)
+        trace_config.on_connection_reuseconn.append(self._on_connection_reuse)
+        trace_config.on_request_end.append(self._on_request_end)
+        return trace_config
+
+    @staticmethod
+    def _now() -> float:
+        return asyncio.get_running_loop().time()
+
+    async def _on_request_start(self, session, ctx, params):
+        ctx.start = self._now()
+        ctx.connect = 0.0
+        ctx.reused = False
+
+    async def _on_connection_start(self, session, ctx, params):
+        ctx.connect_start = self._now()
+
+    async def _on_connection_end(self, session, ctx, params):
+        ctx.connect = self._now() - ctx.connect_start
+
+    async def _on_connection_reuse(self, session, ctx, params):
+        ctx.reused = True
+
+    async def _on_request_end(self, session, ctx, params):
+        self.timings.append(
+            RequestTiming(
+                str(params.url), ctx.connect, self._now() - ctx.start, ctx.reused
+            )
+        )
@@ -0,0 +1,280 @@
+import asyncio
+import os
+import time
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .vector_store import Embedding, VectorStore, _top_k_indices
+
+# 分配、训练时每次处理的行数
+CHUNK_ROWS = 16384
+
+
+class IVFVectorStore(VectorStore):
+    """倒排文件（IVF）近似最近邻索引
+
+    用球面 k-means 把向量划分到 n_lists 个簇，查询时只扫描与查询最接近的
+    nprobe 个簇。向量仍由 VectorStore 保存（包括挂载的 memmap 与量化模式），
+    这里只维护簇中心与每个簇的行号表。
+
+    行数达到 min_train_size 之前（或尚未训练时）直接精确扫描。训练由 prepare()
+    在线程中完成，不阻塞事件循环；检索本身不会触发训练。训练后新写入的行在
+    检索前增量分配到最近的簇。n_lists 默认取 4 * sqrt(行数)。
+
+    nprobe 不指定时随簇数增长，取 n_lists 的 probe_fraction 且不少于 min_nprobe：
+    固定的 nprobe 在行数增大、簇数随之增多后召回率会持续下降。
+    """
+
+    def __init__(
+        self,
+        n_lists: Optional[int] = None,
+        nprobe: Optional[int] = None,
+        probe_fraction: float = 0.02,
+        min_nprobe: int = 32,
+        min_train_size: int = 10_000,
+        kmeans_iterations: int = 10,
+        seed: int = 0,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.n_lists = n_lists
+        self.nprobe = nprobe
+        self.probe_fraction = probe_fraction
+        self.min_nprobe = min_nprobe
+        self.min_train_size = min_train_size
+        self.kmeans_iterations = kmeans_iterations
+        self.seed = seed
+        self.centroids: Optional[np.ndarray] = None
+        # 每行所属的簇，以及每个簇的行号表（按容量倍增的数组）
+        self._labels = np.empty(0, dtype=np.int32)
+        self._list_ids: List[np.ndarray] = []
+        self._list_sizes = np.empty(0, dtype=np.int64)
+        self._assigned = 0
+        self._train_lock = asyncio.Lock()
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    async def prepare(self):
+        """行数达到 min_train_size 且尚未训练时在线程中训练，然后分配新写入的行"""
+        if not self.trained and len(self.documents) >= self.min_train_size:
+            async with self._train_lock:
+                if not self.trained:
+                    centroids, labels = await asyncio.to_thread(self._fit)
+                    self._install(centroids, labels)
+        self._sync()
+
+    def train(self, n_lists: Optional[int] = None):
+        """同步训练簇中心并重建倒排表，会阻塞调用方；在事件循环中请使用 prepare()"""
+        self._install(*self._fit(n_lists))
+
+    def _fit(self, n_lists: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """用当前所有行训练簇中心，返回 (簇中心, 各行所属的簇)，不修改索引状态"""
+        count = len(self.documents)
+        if count == 0:
+            raise ValueError("Cannot train an empty index.")
+        n_lists = n_lists or self.n_lists or int(4 * np.sqrt(count))
+        n_lists = max(1, min(n_lists, count))
+
+        started = time.perf_counter()
+        rng = np.random.default_rng(self.seed)
+        # 每簇约 40 个样本足以估计中心，限制训练开销
+        sample_size = min(count, max(n_lists * 40, 4096), 131_072)
+        sample = self.rows(np.sort(rng.choice(count, sample_size, replace=False)))
+        centroids = _spherical_kmeans(sample, n_lists, self.kmeans_iterations, rng)
+        labels = np.concatenate(
+            [
+                np.argmax(block @ centroids.T, axis=1).astype(np.int32)
+                for _, block in self._iter_rows(0, count)
+            ]
+        )
+        print(
+            f"IVF 训练完成: {count} 行，{n_lists} 个簇，"
+            f"耗时 {time.perf_counter() - started:.2f}s"
+        )
+        return centroids, labels
+
+    def _install(self, centroids: np.ndarray, labels: np.ndarray):
+        """一次性换上训练结果，训练期间新写入的行随后增量分配"""
+        self._set_centroids(centroids)
+        self._add_to_lists(0, labels)
+        self._assign_pending()
+
+    def search_ids_batch(
+        self, query_embeddings: Sequence[Embedding], top_k: int = 3
+    ) -> List[List[Tuple[int, float]]]:
+        if not self.trained:
+            return super().search_ids_batch(query_embeddings, top_k)
+        self._sync()
+
+        queries = [self._as_vector(q, "Query embedding") for q in query_embeddings]
+        if len(self.documents) == 0 or top_k <= 0:
+            return [[] for _ in queries]
+
+        results = []
+        for query in queries:
+            norm = np.linalg.norm(query)
+            if norm == 0:
+                count = min(top_k, len(self.documents))
+                results.append([(i, 0.0) for i in range(count)])
+                continue
+            query = query / norm
+            ids = self._candidates(query, top_k)
+            scores = self.rows(ids) @ query
+            order = _top_k_indices(scores, top_k)
+            results.append([(int(ids[i]), float(scores[i])) for i in order])
+        return results
+
+    def save_ivf(self, path: str, fingerprint: Optional[str] = None):
+        """保存簇中心与行分配；fingerprint 标识对应的向量数据（如索引文件名）
+
+        未训练时不保存，需要时先调用 prepare()。
+        """
+        self._sync()
+        if not self.trained:
+            return
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp.npz"
+        np.savez(
+            tmp_path,
+            centroids=self.centroids,
+            labels=self._labels[: self._assigned],
+            fingerprint=np.array(fingerprint or ""),
+        )
+        os.replace(tmp_path, path)
+
+    def load_ivf(self, path: str, fingerprint: Optional[str] = None) -> bool:
+        """载入簇中心；fingerprint 与行数都一致时直接复用行分配，否则重新分配"""
+        try:
+            with np.load(path) as data:
+                centroids = data["centroids"]
+                labels = data["labels"]
+                saved_fingerprint = str(data["fingerprint"])
+        except (OSError, ValueError, KeyError):
+            return False
+        if self.dim is not None and centroids.shape[1] != self.dim:
+            return False
+
+        self._set_centroids(centroids.astype(np.float32))
+        if (
+            fingerprint
+            and saved_fingerprint == fingerprint
+            and len(labels) == len(self)
+        ):
+            self._add_to_lists(0, labels.astype(np.int32))
+        self._assign_pending()
+        return True
+
+    @property
+    def probes(self) -> int:
+        """每次查询扫描的簇数"""
+        if self.nprobe is not None:
+            return self.nprobe
+        n_lists = 0 if self.centroids is None else self.centroids.shape[0]
+        return max(self.min_nprobe, int(np.ceil(n_lists * self.probe_fraction)))
+
+    def list_sizes(self) -> np.ndarray:
+        return self._list_sizes.copy()
+
+    def _sync(self):
+        if self.trained and self._assigned < len(self.documents):
+            self._assign_pending()
+
+    def _candidates(self, query: np.ndarray, top_k: int) -> np.ndarray:
+        """按簇中心相似度依次取簇，至少 probes 个且候选数不少于 top_k"""
+        order = np.argsort(-(self.centroids @ query), kind="stable")
+        probes = self.probes
+        selected, total = [], 0
+        for list_id in order:
+            size = self._list_sizes[list_id]
+            if size:
+                selected.append(self._list_ids[list_id][:size])
+                total += size
+            if len(selected) >= probes and total >= top_k:
+                break
+        if not selected:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate(selected))
+
+    def _set_centroids(self, centroids: np.ndarray):
+        self.centroids = centroids
+        n_lists = centroids.shape[0]
+        self._labels = np.empty(max(len(self.documents), 1), dtype=np.int32)
+        self._list_ids = [np.empty(16, dtype=np.int64) for _ in range(n_lists)]
+        self._list_sizes = np.zeros(n_lists, dtype=np.int64)
+        self._assigned = 0
+
+    def _assign_pending(self):
+        for start, block in self._iter_rows(self._assigned):
+            labels = np.argmax(block @ self.centroids.T, axis=1).astype(np.int32)
+            self._add_to_lists(start, labels)
+
+    def _add_to_lists(self, start: int, labels: np.ndarray):
+        end = start + labels.shape[0]
+        if self._labels.shape[0] < end:
+            grown = np.empty(max(end, self._labels.shape[0] * 2), dtype=np.int32)
+            grown[: self._assigned] = self._labels[: self._assigned]
+            self._labels = grown
+        self._labels[start:end] = labels
+
+        order = np.argsort(labels, kind="stable")
+        ids = np.arange(start, end, dtype=np.int64)[order]
+        list_ids, counts = np.unique(labels[order], return_counts=True)
+        offset = 0
+        for list_id, count in zip(list_ids, counts):
+            self._append_ids(int(list_id), ids[offset : offset + count])
+            offset += count
+        self._assigned = end
+
+    def _append_ids(self, list_id: int, ids: np.ndarray):
+        size = self._list_sizes[list_id]
+        current = self._list_ids[list_id]
+        if current.shape[0] < size + ids.shape[0]:
+            grown = np.empty(max(size + ids.shape[0], current.shape[0] * 2), np.int64)
+            grown[:size] = current[:size]
+            self._list_ids[list_id] = current = grown
+        current[size : size + ids.shape[0]] = ids
+        self._list_sizes[list_id] = size + ids.shape[0]
+
+    def _iter_rows(
+        self, start: int, stop: Optional[int] = None
+    ) -> Iterator[Tuple[int, np.ndarray]]:
+        """按块产出行号在 [start, stop) 内的行 (起始行号, 向量块)"""
+        offset = 0
+        for segment in self._segments():
+            end = offset + segment.shape[0]
+            if stop is not None:
+                end = min(end, stop)
+            for row in range(max(start, offset), end, CHUNK_ROWS):
+                block_end = min(row + CHUNK_ROWS, end)
+                yield row, np.asarray(segment[row - offset : block_end - offset])
+            offset += segment.shape[0]
+
+
+def _spherical_kmeans(
+    sample: np.ndarray, n_lists: int, iterations: int, rng: np.random.Generator
+) -> np.ndarray:
+    """余弦距离下的 k-means，返回归一化后的簇中心"""
+    centroids = sample[rng.choice(sample.shape[0], n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        labels = np.concatenate(
+            [
+                np.argmax(sample[i : i + CHUNK_ROWS] @ centroids.T, axis=1)
+                for i in range(0, sample.shape[0], CHUNK_ROWS)
+            ]
+        )
+        counts = np.bincount(labels, minlength=n_lists)
+        order = np.argsort(labels, kind="stable")
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        sums = np.zeros_like(centroids)
+        filled = counts > 0
+        sums[filled] = np.add.reduceat(sample[order], starts[filled], axis=0)
+        # 空簇用随机样本重新初始化
+        empty = counts == 0
+        if empty.any():
+            sums[empty] = sample[rng.choice(sample.shape[0], int(empty.sum()))]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = sums / np.where(norms == 0, 1.0, norms)
+    return centroids.astype(np.float32)
@@ -0,0 +1,111 @@
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List, NamedTuple, Sequence, Tuple
+
+import numpy as np
+
+from .tokens import CJK
+from .vector_store import _top_k_indices
+
+# 中日韩文字逐字切分（不含标点）；其余按字母数字串切分，忽略单个字符（如 "Bret's" 中的 s）
+_TERM_RE = re.compile(rf"(?![\W_])[{CJK}]|[^\W_{CJK}]{{2,}}")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TERM_RE.findall(text.casefold())
+
+
+class LexicalHit(NamedTuple):
+    id: int
+    score: float
+    # 查询中出现在语料里的词，按 IDF 加权有多少比例出现在该文档中
+    coverage: float
+
+
+class BM25Index:
+    """内存中的 BM25 倒排索引，文档编号按加入顺序，与 VectorStore 的行号一致"""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+        self._freqs: Dict[str, List[int]] = defaultdict(list)
+        self._lengths: List[int] = []
+        self._total_length = 0
+        # 查询时使用的 numpy 倒排表，写入新文档后对应的词条失效
+        self._arrays: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._length_array = np.empty(0, dtype=np.float32)
+
+    def __len__(self):
+        return len(self._lengths)
+
+    def add(self, text: str) -> int:
+        doc_id = len(self._lengths)
+        terms = Counter(tokenize(text))
+        for term, freq in terms.items():
+            self._postings[term].append(doc_id)
+            self._freqs[term].append(freq)
+            self._arrays.pop(term, None)
+        length = sum(terms.values())
+        self._lengths.append(length)
+        self._total_length += length
+        return doc_id
+
+    def idf(self, term: str) -> float:
+        df = len(self._postings.get(term, ()))
+        count = len(self._lengths)
+        return math.log(1 + (count - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, top_k: int = 10) -> List[LexicalHit]:
+        count = len(self._lengths)
+        terms = [t for t in dict.fromkeys(tokenize(query)) if t in self._postings]
+        if not terms or top_k <= 0:
+            return []
+
+        if self._length_array.shape[0] != count:
+            self._length_array = np.asarray(self._lengths, dtype=np.float32)
+        norm = self.k1 * (
+            1 - self.b + self.b * self._length_array / (self._total_length / count)
+        )
+        scores = np.zeros(count, dtype=np.float32)
+        matched = np.zeros(count, dtype=np.float64)
+        total_idf = 0.0
+        for term in terms:
+            ids, freqs = self._posting_arrays(term)
+            idf = self.idf(term)
+            scores[ids] += idf * freqs * (self.k1 + 1) / (freqs + norm[ids])
+            matched[ids] += idf
+            total_idf += idf
+
+        hit_ids = np.flatnonzero(scores)
+        order = _top_k_indices(scores[hit_ids], top_k)
+        return [
+            LexicalHit(
+                int(hit_ids[i]),
+                float(scores[hit_ids[i]]),
+                float(matched[hit_ids[i]] / total_idf),
+            )
+            for i in order
+        ]
+
+    def _posting_arrays(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        arrays = self._arrays.get(term)
+        if arrays is None:
+            arrays = (
+                np.asarray(self._postings[term], dtype=np.int64),
+                np.asarray(self._freqs[term], dtype=np.float32),
+            )
+            self._arrays[term] = arrays
+        return arrays
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[int]], k: int = 60
+) -> List[Tuple[int, float]]:
+    """RRF 融合多个排序：score = sum(1 / (k + rank))，按分数降序返回"""
+    scores: Dict[int, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            scores[doc_id] += 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: -item[1])
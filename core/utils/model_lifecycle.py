@@ -0,0 +1,194 @@
+import asyncio
+import re
+import time
+from typing import Dict, List, Optional, Union
+
+from .http_client import HTTPClient
+from .metrics import metrics
+from .scheduler import Priority
+
+KeepAlive = Union[str, float, int, None]
+
+_DURATION_RE = re.compile(r"^\s*(-?\d+(?:\.\d+)?)\s*(ms|s|m|h)?\s*$")
+_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600, None: 1}
+# 两次检查之间至少间隔的秒数
+_MIN_REWARM_INTERVAL = 0.05
+
+
+def parse_keep_alive(value: KeepAlive) -> Optional[float]:
+    """把 Ollama 的 keep_alive（"30m"、"1h"、秒数）换算为秒，负数表示常驻返回 None"""
+    if value is None:
+        return 300.0  # Ollama 默认 5 分钟
+    if isinstance(value, (int, float)):
+        seconds = float(value)
+    else:
+        match = _DURATION_RE.match(value)
+        if match is None:
+            raise ValueError(f"Invalid keep_alive: {value!r}")
+        seconds = float(match.group(1)) * _UNITS[match.group(2)]
+    return None if seconds < 0 else seconds
+
+
+def _request_keep_alive(value: KeepAlive) -> KeepAlive:
+    """Ollama 把字符串 keep_alive 当作 Go duration 解析，没有单位的字符串转为数字（秒）"""
+    if isinstance(value, str):
+        match = _DURATION_RE.match(value)
+        if match is not None and match.group(2) is None:
+            seconds = float(match.group(1))
+            return int(seconds) if seconds.is_integer() else seconds
+    return value
+
+
+class ManagedModel:
+    def __init__(self, kind: str, name: str, url: str, options: Optional[dict]):
+        self.kind = kind
+        self.name = name
+        self.url = url
+        self.options = options or {}
+        self.last_used: Optional[float] = None
+        self.warmups = 0
+        self.last_warmup_seconds: Optional[float] = None
+
+
+class ModelLifecycle:
+    """对话与嵌入模型的驻留管理
+
+    所有请求带上相同的 keep_alive 与 options（num_ctx 不同会让 Ollama 重新加载
+    模型，所以预热请求也使用同样的 options）。启动时用极小的请求预加载模型；
+    后台任务记录每个模型最后一次请求的时间，在 keep_alive 到期前 rewarm_margin
+    秒重新预热，使模型一直驻留。keep_alive 为负数时模型常驻，不需要重新预热。
+    """
+
+    def __init__(
+        self,
+        http_client: HTTPClient,
+        keep_alive: KeepAlive = "30m",
+        rewarm_margin: float = 60.0,
+        rewarm: bool = True,
+    ):
+        self.http_client = http_client
+        self.keep_alive_seconds = parse_keep_alive(keep_alive)
+        self.keep_alive = _request_keep_alive(keep_alive)
+        self.rewarm_margin = rewarm_margin
+        self.rewarm = rewarm
+        self.models: Dict[str, ManagedModel] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def add_model(
+        self, kind: str, name: str, url: str, options: Optional[dict] = None
+    ) -> ManagedModel:
+        """登记模型，kind 为 "chat" 或 "embed"，options 如 {"num_ctx": 8192}"""
+        if kind not in ("chat", "embed"):
+            raise ValueError(f"Unknown model kind: {kind}")
+        model = self.models[name] = ManagedModel(kind, name, url, options)
+        return model
+
+    def request_fields(self, name: str) -> dict:
+        """请求负载中需要附加的字段，同时记录该模型被使用"""
+        model = self.models.get(name)
+        if model is None:
+            return {}
+        model.last_used = time.monotonic()
+        fields = {}
+        if self.keep_alive is not None:
+            fields["keep_alive"] = self.keep_alive
+        if model.options:
+            fields["options"] = model.options
+        return fields
+
+    async def preload(self):
+        """并发预加载所有登记的模型，任一失败时抛出异常"""
+        await asyncio.gather(*[self.warm(name) for name in self.models])
+
+    async def warm(self, name: str) -> float:
+        """发送一次极小的请求让模型加载并刷新驻留时间，返回耗时（秒）"""
+        model = self.models[name]
+        if model.kind == "chat":
+            # 不含消息的对话请求只加载模型，不生成内容
+            payload = {"model": name, "messages": [], "stream": False}
+        else:
+            payload = {"model": name, "input": ["warm up"]}
+        payload.update(self.request_fields(name))
+
+        started = time.perf_counter()
+        with metrics.span("model.warm", model=name, kind=model.kind):
+            async with self.http_client.post(
+                model.url, lane=model.kind, priority=Priority.BULK, json=payload
+            ) as response:
+                if response.status != 200:
+                    raise RuntimeError(f"模型 {name} 预热失败: {response.status}")
+                await response.read()
+        elapsed = time.perf_counter() - started
+        model.warmups += 1
+        model.last_warmup_seconds = elapsed
+        metrics.inc("model_warmups_total", model=name)
+        metrics.observe("model_warmup_seconds", elapsed, model=name)
+        return elapsed
+
+    def start(self):
+        # 常驻的模型不需要重新预热；keep_alive 不长于 rewarm_margin（如 0，用完即卸载）
+        # 时无法提前预热，也不启动
+        if (
+            self._task is None
+            and self.rewarm
+            and self.keep_alive_seconds is not None
+            and self.keep_alive_seconds > self.rewarm_margin
+        ):
+            self._task = asyncio.create_task(self._rewarm_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def due(self, now: Optional[float] = None) -> List[str]:
+        """即将到期需要重新预热的模型"""
+        if self.keep_alive_seconds is None:
+            return []
+        now = time.monotonic() if now is None else now
+        return [
+            model.name
+            for model in self.models.values()
+            if model.last_used is not None and self._expires_in(model, now) <= 0
+        ]
+
+    @property
+    def _lead(self) -> float:
+        return min(self.rewarm_margin, self.keep_alive_seconds / 2)
+
+    def _expires_in(self, model: ManagedModel, now: float) -> float:
+        """距离需要重新预热还有多少秒"""
+        return model.last_used + self.keep_alive_seconds - self._lead - now
+
+    async def _rewarm_loop(self):
+        while True:
+            now = time.monotonic()
+            waits = [
+                self._expires_in(model, now)
+                for model in self.models.values()
+                if model.last_used is not None
+            ]
+            # 至多间隔 _lead 秒检查一次，睡眠期间才被使用的模型也不会错过
+            wait = min(waits, default=self._lead)
+            await asyncio.sleep(max(min(wait, self._lead), _MIN_REWARM_INTERVAL))
+            for name in self.due():
+                try:
+                    await self.warm(name)
+                except Exception as e:
+                    print(f"模型 {name} 重新预热失败: {e}")
+
+    def stats(self) -> Dict[str, dict]:
+        now = time.monotonic()
+        return {
+            name: {
+                "kind": model.kind,
+                "options": model.options,
+                "warmups": model.warmups,
+                "last_warmup_seconds": model.last_warmup_seconds,
+                "idle_seconds": (
+                    now - model.last_used if model.last_used is not None else None
+                ),
+            }
+            for name, model in self.models.items()
+        }
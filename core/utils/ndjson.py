@@ -0,0 +1,59 @@
+import json
+from typing import Any, AsyncIterator, List
+
+try:
+    import orjson
+
+    def loads(data: bytes) -> Any:
+        return orjson.loads(data)
+
+except ImportError:  # 未安装 orjson 时退回标准库
+
+    def loads(data: bytes) -> Any:
+        return json.loads(data)
+
+
+class NDJSONDecoder:
+    """增量解析 NDJSON：字节块可以在任意位置截断，只解析已完整的行"""
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self.errors = 0
+
+    def feed(self, chunk: bytes) -> List[Any]:
+        self._buffer += chunk
+        end = self._buffer.rfind(b"\n")
+        if end < 0:
+            return []
+        lines = bytes(self._buffer[:end]).split(b"\n")
+        del self._buffer[: end + 1]
+        return self._parse(lines)
+
+    def flush(self) -> List[Any]:
+        """流结束时解析缓冲区中最后一行（可能没有换行符）"""
+        lines = [bytes(self._buffer)]
+        self._buffer.clear()
+        return self._parse(lines)
+
+    def _parse(self, lines: List[bytes]) -> List[Any]:
+        objects = []
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                objects.append(loads(line))
+            except ValueError as e:
+                self.errors += 1
+                print(f"解析错误: {e}")
+        return objects
+
+
+async def iter_ndjson(stream) -> AsyncIterator[Any]:
+    """逐个产出 aiohttp 响应流中的 JSON 对象"""
+    decoder = NDJSONDecoder()
+    async for chunk in stream.iter_any():
+        for obj in decoder.feed(chunk):
+            yield obj
+    for obj in decoder.flush():
+        yield obj
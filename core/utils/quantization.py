@@ -0,0 +1,82 @@
+from typing import Optional, Tuple
+
+import numpy as np
+
+QUANTIZATION_MODES = ("float16", "int8")
+
+# 打分时每次反量化的行数：块小一些能留在缓存里，也限制临时 float32 内存
+SCORE_CHUNK_ROWS = 1024
+
+
+def quantize(rows: np.ndarray, mode: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """把 float32 行向量量化，返回 (codes, scales)；int8 每行单独缩放"""
+    if mode == "float16":
+        return rows.astype(np.float16), None
+    if mode == "int8":
+        scales = np.abs(rows).max(axis=1) / 127.0
+        safe = np.where(scales == 0, 1.0, scales)
+        codes = np.rint(rows / safe[:, None]).astype(np.int8)
+        return codes, scales.astype(np.float32)
+    raise ValueError(f"Unknown quantization mode: {mode}")
+
+
+class QuantizedMatrix:
+    """可追加的量化矩阵，常驻内存的只有编码与 int8 的逐行缩放系数"""
+
+    def __init__(self, mode: str, dim: int, initial_capacity: int = 1024):
+        if mode not in QUANTIZATION_MODES:
+            raise ValueError(f"Unknown quantization mode: {mode}")
+        self.mode = mode
+        self.dim = dim
+        self.size = 0
+        self._initial_capacity = max(1, initial_capacity)
+        self._codes: Optional[np.ndarray] = None
+        self._scales: Optional[np.ndarray] = None
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def nbytes(self) -> int:
+        per_row = self._codes.itemsize * self.dim if self._codes is not None else 0
+        if self.mode == "int8":
+            per_row += 4
+        return per_row * self.size
+
+    def append(self, rows: np.ndarray):
+        codes, scales = quantize(rows, self.mode)
+        self._reserve(self.size + rows.shape[0])
+        self._codes[self.size : self.size + rows.shape[0]] = codes
+        if scales is not None:
+            self._scales[self.size : self.size + rows.shape[0]] = scales
+        self.size += rows.shape[0]
+
+    def scores(self, queries: np.ndarray) -> np.ndarray:
+        """queries 与所有行的近似内积，形状 (查询数, 行数)"""
+        result = np.empty((queries.shape[0], self.size), dtype=np.float32)
+        for start in range(0, self.size, SCORE_CHUNK_ROWS):
+            end = min(start + SCORE_CHUNK_ROWS, self.size)
+            block = self._codes[start:end].astype(np.float32)
+            result[:, start:end] = queries @ block.T
+            if self._scales is not None:
+                result[:, start:end] *= self._scales[start:end]
+        return result
+
+    def _reserve(self, size: int):
+        if self._codes is not None and self._codes.shape[0] >= size:
+            return
+        capacity = self._initial_capacity
+        if self._codes is not None:
+            capacity = self._codes.shape[0]
+        while capacity < size:
+            capacity *= 2
+        dtype = np.float16 if self.mode == "float16" else np.int8
+        codes = np.empty((capacity, self.dim), dtype=dtype)
+        if self._codes is not None:
+            codes[: self.size] = self._codes[: self.size]
+        self._codes = codes
+        if self.mode == "int8":
+            scales = np.empty(capacity, dtype=np.float32)
+            if self._scales is not None:
+                scales[: self.size] = self._scales[: self.size]
+            self._scales = scales
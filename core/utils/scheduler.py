@@ -0,0 +1,170 @@
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import Dict, List, Optional
+
+from .metrics import metrics
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0  # 用户正在等待的对话与查询
+    BULK = 1  # 文档批量编码等后台任务
+
+
+class SchedulerError(RuntimeError):
+    pass
+
+
+class QueueFullError(SchedulerError):
+    """排队请求数已达上限，直接拒绝"""
+
+
+class QueueTimeoutError(SchedulerError):
+    """排队等待超时"""
+
+
+class Lane:
+    """一类后端请求的准入队列：最多 max_in_flight 个同时执行，其余按优先级排队"""
+
+    def __init__(
+        self,
+        name: str,
+        max_in_flight: int,
+        max_queue: int = 64,
+        queue_timeout: Optional[float] = 30.0,
+    ):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.queued = 0
+        self.granted = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        # (优先级, 序号, future)，同优先级先到先得；放弃等待的条目在出队时跳过
+        self._waiters: List[tuple] = []
+        self._seq = itertools.count()
+
+    async def acquire(self, priority: Priority = Priority.INTERACTIVE) -> float:
+        """获取执行名额，返回排队耗时（秒）"""
+        if self.in_flight < self.max_in_flight and not self.queued:
+            self.in_flight += 1
+            self._record(priority, 0.0)
+            return 0.0
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            metrics.inc("scheduler_rejected_total", lane=self.name, reason="full")
+            raise QueueFullError(
+                f"{self.name} 队列已满（{self.queued} 个请求排队），请稍后重试"
+            )
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (int(priority), next(self._seq), future))
+        self.queued += 1
+        self._report()
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(future, self.queue_timeout)
+        except BaseException as e:
+            if future.done() and not future.cancelled():
+                # 名额已转交过来但等待方放弃了，继续转交给下一个
+                self.release()
+            else:
+                future.cancel()
+                self.queued -= 1
+                self._report()
+            if isinstance(e, asyncio.TimeoutError):
+                self.timeouts += 1
+                metrics.inc(
+                    "scheduler_rejected_total", lane=self.name, reason="timeout"
+                )
+                raise QueueTimeoutError(
+                    f"{self.name} 排队超过 {self.queue_timeout}s"
+                ) from None
+            raise
+        waited = time.monotonic() - started
+        self._record(priority, waited)
+        return waited
+
+    def release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                # 名额直接转交给排在最前的等待者，in_flight 不变
+                self.queued -= 1
+                future.set_result(None)
+                self._report()
+                return
+        self.in_flight -= 1
+        self._report()
+
+    def _record(self, priority: Priority, waited: float):
+        self.granted += 1
+        self.total_wait += waited
+        metrics.observe(
+            "scheduler_wait_seconds",
+            waited,
+            lane=self.name,
+            priority=Priority(priority).name.lower(),
+        )
+        self._report()
+
+    def _report(self):
+        metrics.set_gauge("scheduler_queue_depth", self.queued, lane=self.name)
+        metrics.set_gauge("scheduler_in_flight", self.in_flight, lane=self.name)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "granted": self.granted,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "avg_wait": self.total_wait / self.granted if self.granted else 0.0,
+        }
+
+
+class BackendScheduler:
+    """Ollama 请求的准入控制
+
+    对话与嵌入请求分属不同队列，各自限制并发数，避免后端内部排队和两个模型
+    来回切换；同一队列中交互请求优先于批量编码，队列满或排队超时时抛出
+    SchedulerError，由调用方向上层报告。
+    """
+
+    def __init__(
+        self,
+        chat_in_flight: int = 2,
+        embed_in_flight: int = 2,
+        max_queue: int = 64,
+        queue_timeout: Optional[float] = 30.0,
+    ):
+        self.lanes: Dict[str, Lane] = {
+            "chat": Lane("chat", chat_in_flight, max_queue, queue_timeout),
+            "embed": Lane("embed", embed_in_flight, max_queue, queue_timeout),
+        }
+
+    def lane(self, name: str) -> Lane:
+        lane = self.lanes.get(name)
+        if lane is None:
+            raise KeyError(f"未知的请求队列: {name}")
+        return lane
+
+    @asynccontextmanager
+    async def slot(self, lane: str, priority: Priority = Priority.INTERACTIVE):
+        target = self.lane(lane)
+        await target.acquire(priority)
+        try:
+            yield
+        finally:
+            target.release()
+
+    def stats(self) -> Dict[str, dict]:
+        return {name: lane.stats() for name, lane in self.lanes.items()}
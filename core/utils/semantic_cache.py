@@ -0,0 +1,157 @@
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from typing import NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .metrics import metrics
+
+
+def document_id(document: str) -> str:
+    """按内容生成文档标识，重建索引后不变，内容修改后随之变化"""
+    return hashlib.sha1(document.encode("utf-8")).hexdigest()[:16]
+
+
+class CachedAnswer(NamedTuple):
+    vector: np.ndarray
+    context_ids: Tuple[str, ...]
+    prompt: str
+    answer: str
+
+
+class SemanticCache:
+    """按提问语义缓存回答
+
+    提问向量与已缓存提问的余弦相似度达到 threshold，且本次检索到的上下文文档
+    完全相同时才命中。容量满时淘汰最久未命中的条目；path 不为空时可用
+    save()/load() 持久化，文件中记录嵌入模型，模型变化后旧缓存不再载入。
+    """
+
+    def __init__(
+        self,
+        embedding_model: str,
+        threshold: float = 0.95,
+        max_size: int = 512,
+        path: Optional[str] = None,
+    ):
+        self.embedding_model = embedding_model
+        self.threshold = threshold
+        self.max_size = max_size
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[int, CachedAnswer]" = OrderedDict()
+        self._next_key = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def lookup(
+        self, embedding: Sequence[float], context_ids: Sequence[str]
+    ) -> Optional[CachedAnswer]:
+        context_ids = tuple(context_ids)
+        candidates = [
+            (key, entry)
+            for key, entry in self._entries.items()
+            if entry.context_ids == context_ids
+        ]
+        best, best_score = None, self.threshold
+        if candidates:
+            query = self._normalize(embedding)
+            scores = np.stack([entry.vector for _, entry in candidates]) @ query
+            index = int(np.argmax(scores))
+            if scores[index] >= best_score:
+                best, best_score = candidates[index], float(scores[index])
+
+        if best is None:
+            self.misses += 1
+            metrics.inc("response_cache_total", result="miss")
+            return None
+        self._entries.move_to_end(best[0])
+        self.hits += 1
+        metrics.inc("response_cache_total", result="hit")
+        return best[1]
+
+    def put(
+        self,
+        embedding: Sequence[float],
+        context_ids: Sequence[str],
+        prompt: str,
+        answer: str,
+    ):
+        entry = CachedAnswer(
+            self._normalize(embedding), tuple(context_ids), prompt, answer
+        )
+        self._entries[self._next_key] = entry
+        self._next_key += 1
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def save(self, path: Optional[str] = None):
+        path = path or self.path
+        if path is None:
+            return
+        entries = list(self._entries.values())
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        records = [
+            {"context_ids": e.context_ids, "prompt": e.prompt, "answer": e.answer}
+            for e in entries
+        ]
+        tmp_path = path + ".tmp.npz"
+        np.savez(
+            tmp_path,
+            vectors=(
+                np.stack([e.vector for e in entries])
+                if entries
+                else np.empty((0, 0), dtype=np.float32)
+            ),
+            records=np.array(json.dumps(records, ensure_ascii=False)),
+            model=np.array(self.embedding_model),
+        )
+        os.replace(tmp_path, path)
+
+    def load(self, path: Optional[str] = None) -> int:
+        """载入持久化的条目，返回条数；文件不存在或模型不一致时返回 0"""
+        path = path or self.path
+        if path is None or not os.path.exists(path):
+            return 0
+        try:
+            with np.load(path) as data:
+                if str(data["model"]) != self.embedding_model:
+                    return 0
+                vectors = data["vectors"]
+                records = json.loads(str(data["records"]))
+        except (OSError, ValueError, KeyError) as e:
+            print(f"回答缓存读取失败: {e}")
+            return 0
+        for vector, record in zip(vectors, records):
+            self.put(vector, record["context_ids"], record["prompt"], record["answer"])
+        return len(records)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hit_rate, 4),
+        }
+
+    @staticmethod
+    def _normalize(embedding: Sequence[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
@@ -0,0 +1,12 @@
+import re
+
+# 中日韩文字与全角符号的码位范围（含假名、谚文、兼容汉字）
+CJK = r"\u3000-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef"
+
+# 近似的分词：中日韩字符每个算一个词元，其余非空白字符约 4 个算一个词元
+TOKEN_RE = re.compile(rf"[{CJK}]|[^\s{CJK}]{{1,4}}")
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token 数，对话记忆、工具筛选与文档分块共用同一种估算"""
+    return sum(1 for _ in TOKEN_RE.finditer(text))
@@ -1,60 +1,306 @@
-import math
-from typing import List
+import tempfile
+from typing import List, Optional, Sequence, Tuple, Union
 
+import numpy as np
 
-class VectorStoreItem:
-    def __init__(self, embedding: List[float], document: str):
+from .quantization import QUANTIZATION_MODES, QuantizedMatrix
 
-        self.embedding = embedding
-        self.document = document
-        self.norm = math.sqrt(sum(x * x for x in embedding))  # Precompute norm
+Embedding = Union[List[float], np.ndarray]
+
+
+def _top_k_indices(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """返回 scores 中最大的 top_k 个下标（按分数降序）"""
+    if top_k >= scores.shape[0]:
+        return np.argsort(-scores, kind="stable")
+    # argpartition 只做部分选择，O(n)，再对选出的 top_k 个排序
+    candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
 
 
 class VectorStore:
-    def __init__(self):
-        self.vector_store: List[VectorStoreItem] = []
+    """余弦相似度检索的向量库
+
+    quantization 为 "float16" 或 "int8" 时内存中只保留量化编码，先用编码为所有行
+    打分，再取前 top_k * rescore_factor 个候选用原始 float32 向量精确重排。
+    原始向量不常驻内存：挂载的块（如索引文件的 np.memmap）直接引用，新写入的行
+    追加到 spill_dir 下的临时文件并按需映射。
+    """
+
+    def __init__(
+        self,
+        initial_capacity: int = 1024,
+        quantization: Optional[str] = None,
+        rescore_factor: int = 4,
+        spill_dir: Optional[str] = None,
+    ):
+        if quantization is not None and quantization not in QUANTIZATION_MODES:
+            raise ValueError(f"Unknown quantization mode: {quantization}")
+        self.quantization = quantization
+        self.rescore_factor = rescore_factor
+        self.spill_dir = spill_dir
+        self.documents: List[str] = []
+        self.metadata: List[dict] = []
+        self.dim: Optional[int] = None
+        # 每次写入后递增，供上层缓存判断是否失效
+        self.version = 0
+        # 只读的向量块（例如内存映射的索引文件），按加入顺序排在可写尾块之前
+        self._blocks: List[np.ndarray] = []
+        # 连续的 float32 矩阵，每行已归一化，容量不足时按倍数扩容
+        self._matrix: Optional[np.ndarray] = None
+        self._tail_size = 0
+        self._initial_capacity = max(1, initial_capacity)
+        # 量化模式：全部行的编码，以及新写入行的原始向量临时文件
+        self._codes: Optional[QuantizedMatrix] = None
+        self._spill = None
+        self._spill_rows = 0
+        self._spill_view: Optional[np.ndarray] = None
+
+    def __len__(self):
+        return len(self.documents)
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """当前所有向量（只读，行已归一化）；只有一个块时不复制"""
+        blocks = self._segments()
+        if not blocks:
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+        if len(blocks) == 1:
+            view = blocks[0].view()
+            view.flags.writeable = False
+            return view
+        return np.concatenate(blocks)
 
-    async def add_embedding(self, embedding: List[float], document: str):
-        if not isinstance(embedding, list):
+    def rows(self, ids: Sequence[int]) -> np.ndarray:
+        """按行号取出归一化后的向量"""
+        ids = np.asarray(ids, dtype=np.int64)
+        result = np.empty((ids.shape[0], self.dim or 0), dtype=np.float32)
+        offset = 0
+        for block in self._segments():
+            mask = (ids >= offset) & (ids < offset + block.shape[0])
+            if mask.any():
+                result[mask] = block[ids[mask] - offset]
+            offset += block.shape[0]
+        return result
+
+    async def add_embedding(
+        self, embedding: Embedding, document: str, metadata: Optional[dict] = None
+    ):
+        if not isinstance(embedding, (list, np.ndarray)):
             raise ValueError("Embedding must be a list of numbers.")
         if not isinstance(document, str):
             raise ValueError("Document must be a string.")
 
-        self.vector_store.append(VectorStoreItem(embedding, document))
+        vector = self._as_vector(embedding, "Embedding")
+        if self.dim is None:
+            self.dim = vector.shape[0]
+        if self.quantization:
+            row = self._normalize(vector)[None, :]
+            self._quantized().append(row)
+            self._spill_append(row)
+        else:
+            self._reserve(self._tail_size + 1)
+            self._matrix[self._tail_size] = self._normalize(vector)
+            self._tail_size += 1
+        self.documents.append(document)
+        self.metadata.append(metadata or {})
+        self.version += 1
+
+    async def prepare(self):
+        """写入一批数据后、检索前的准备（如训练近似索引），精确扫描无需处理"""
+
+    def attach(
+        self,
+        matrix: np.ndarray,
+        documents: List[str],
+        metadata: Optional[List[dict]] = None,
+    ):
+        """挂载一块已归一化的向量（如 np.memmap），不复制数据"""
+        if matrix.ndim != 2 or matrix.shape[0] != len(documents):
+            raise ValueError("Matrix rows must match the number of documents.")
+        if matrix.dtype != np.float32:
+            raise ValueError("Matrix must be float32.")
+        if self.dim is not None and matrix.shape[1] != self.dim:
+            raise ValueError(
+                f"Matrix dimension {matrix.shape[1]} does not match store dimension {self.dim}."
+            )
+        if matrix.shape[0] == 0:
+            return
+
+        self.dim = matrix.shape[1]
+        # 先封存当前尾块，保证行号与加入顺序一致
+        if self._tail_size:
+            self._blocks.append(self._matrix[: self._tail_size])
+            self._matrix = None
+            self._tail_size = 0
+        if self._spill_rows:
+            self._blocks.append(self._spill_segment())
+            self._spill, self._spill_rows, self._spill_view = None, 0, None
+        self._blocks.append(matrix)
+        if self.quantization:
+            codes = self._quantized()
+            for start in range(0, matrix.shape[0], 16384):
+                codes.append(np.asarray(matrix[start : start + 16384]))
+        self.documents.extend(documents)
+        self.metadata.extend(metadata or [{} for _ in documents])
+        self.version += 1
+
+    async def search(self, query_embedding: Embedding, top_k: int = 3) -> List[str]:
+        return [self.documents[i] for i, _ in self.search_ids(query_embedding, top_k)]
 
-    async def search(self, query_embedding: List[float], top_k: int = 3) -> List[str]:
-        if not isinstance(query_embedding, list) or not all(
-            isinstance(x, (int, float)) for x in query_embedding
-        ):
-            raise ValueError("Query embedding must be a list of numbers.")
+    async def search_batch(
+        self, query_embeddings: Sequence[Embedding], top_k: int = 3
+    ) -> List[List[str]]:
+        """一次矩阵乘法完成多个查询的检索"""
+        return [
+            [self.documents[i] for i, _ in hits]
+            for hits in self.search_ids_batch(query_embeddings, top_k)
+        ]
 
-        if len(self.vector_store) == 0:
-            return []
+    def search_ids(
+        self, query_embedding: Embedding, top_k: int = 3
+    ) -> List[Tuple[int, float]]:
+        """返回 (行号, 余弦相似度) 列表，按相似度降序"""
+        return self.search_ids_batch([query_embedding], top_k)[0]
 
-        query_norm = math.sqrt(sum(x * x for x in query_embedding))
-        if query_norm == 0:
-            # Avoid division by zero
-            return [item.document for item in self.vector_store[:top_k]]
+    def search_ids_batch(
+        self, query_embeddings: Sequence[Embedding], top_k: int = 3
+    ) -> List[List[Tuple[int, float]]]:
+        queries = [self._as_vector(q, "Query embedding") for q in query_embeddings]
+        if len(self.documents) == 0 or top_k <= 0:
+            return [[] for _ in queries]
 
-        scored = []
-        for item in self.vector_store:
-            dot_product = sum(a * b for a, b in zip(query_embedding, item.embedding))
-            score = dot_product / (query_norm * item.norm)
-            scored.append((score, item.document))
+        query_matrix = np.stack(queries)
+        norms = np.linalg.norm(query_matrix, axis=1)
+        # 行向量已归一化，只需把查询归一化后做一次矩阵乘法即可得到余弦相似度
+        safe_norms = np.where(norms == 0, 1.0, norms).astype(np.float32)
+        query_matrix = query_matrix / safe_norms[:, None]
+        if self.quantization:
+            scores = self._codes.scores(query_matrix)
+        else:
+            scores = np.concatenate(
+                [query_matrix @ block.T for block in self._segments()], axis=1
+            )
 
-        # Sort descending by score and take top_k documents
-        scored.sort(reverse=True, key=lambda x: x[0])
-        return [doc for score, doc in scored[:top_k]]
+        results = []
+        for query, row, norm in zip(query_matrix, scores, norms):
+            if norm == 0:
+                # Avoid division by zero
+                count = min(top_k, len(self.documents))
+                results.append([(i, 0.0) for i in range(count)])
+                continue
+            if self.quantization and self.rescore_factor > 0:
+                results.append(self._rescore(query, row, top_k))
+                continue
+            indices = _top_k_indices(row, top_k)
+            results.append([(int(i), float(row[i])) for i in indices])
+        return results
 
-    def cosine_similarity(self, vec_a: List[float], vec_b: List[float]) -> float:
+    def score_ids(self, query_embedding: Embedding, ids: Sequence[int]) -> np.ndarray:
+        """查询与指定行的精确余弦相似度（如对词法检索的候选打分）"""
+        query = self._as_vector(query_embedding, "Query embedding")
+        norm = np.linalg.norm(query)
+        if norm == 0 or len(ids) == 0:
+            return np.zeros(len(ids), dtype=np.float32)
+        return self.rows(ids) @ (query / norm)
+
+    def _rescore(
+        self, query: np.ndarray, approximate: np.ndarray, top_k: int
+    ) -> List[Tuple[int, float]]:
+        """按量化分数取候选，再用原始向量精确打分"""
+        candidates = _top_k_indices(approximate, top_k * self.rescore_factor)
+        exact = self.rows(candidates) @ query
+        order = _top_k_indices(exact, top_k)
+        return [(int(candidates[i]), float(exact[i])) for i in order]
+
+    def memory_stats(self) -> dict:
+        """常驻内存的向量字节数（不含文档文本）"""
+        count, dim = len(self.documents), self.dim or 0
+        if self.quantization:
+            resident = self._codes.nbytes if self._codes is not None else 0
+        else:
+            resident = count * dim * 4
+        return {
+            "mode": self.quantization or "float32",
+            "vectors": count,
+            "dim": dim,
+            "resident_bytes": resident,
+            "bytes_per_vector": resident / count if count else 0.0,
+        }
+
+    def cosine_similarity(self, vec_a: Embedding, vec_b: Embedding) -> float:
         if len(vec_a) != len(vec_b):
             raise ValueError("Vectors must have the same dimension.")
 
-        dot_product = sum(a * b for a, b in zip(vec_a, vec_b))
-        norm_a = math.sqrt(sum(a * a for a in vec_a))
-        norm_b = math.sqrt(sum(b * b for b in vec_b))
+        a = np.asarray(vec_a, dtype=np.float32)
+        b = np.asarray(vec_b, dtype=np.float32)
+        norm_a = np.linalg.norm(a)
+        norm_b = np.linalg.norm(b)
 
         if norm_a == 0 or norm_b == 0:
             return 0.0
 
-        return dot_product / (norm_a * norm_b)
+        return float(a @ b / (norm_a * norm_b))
+
+    def _as_vector(self, embedding: Embedding, label: str) -> np.ndarray:
+        try:
+            vector = np.asarray(embedding, dtype=np.float32)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"{label} must be a list of numbers.") from e
+        if vector.ndim != 1 or vector.size == 0:
+            raise ValueError(f"{label} must be a list of numbers.")
+        if self.dim is not None and vector.shape[0] != self.dim:
+            raise ValueError(
+                f"{label} dimension {vector.shape[0]} does not match store dimension {self.dim}."
+            )
+        return vector
+
+    def _segments(self) -> List[np.ndarray]:
+        if self._tail_size:
+            return self._blocks + [self._matrix[: self._tail_size]]
+        if self._spill_rows:
+            return self._blocks + [self._spill_segment()]
+        return list(self._blocks)
+
+    def _quantized(self) -> QuantizedMatrix:
+        if self._codes is None:
+            self._codes = QuantizedMatrix(
+                self.quantization, self.dim, self._initial_capacity
+            )
+        return self._codes
+
+    def _spill_append(self, rows: np.ndarray):
+        if self._spill is None:
+            self._spill = tempfile.TemporaryFile(dir=self.spill_dir)
+        self._spill.seek(0, 2)
+        self._spill.write(np.ascontiguousarray(rows, dtype=np.float32).tobytes())
+        self._spill_rows += rows.shape[0]
+        self._spill_view = None
+
+    def _spill_segment(self) -> np.ndarray:
+        if self._spill_view is None:
+            self._spill.flush()
+            self._spill_view = np.memmap(
+                self._spill,
+                dtype=np.float32,
+                mode="r",
+                shape=(self._spill_rows, self.dim),
+            )
+        return self._spill_view
+
+    @staticmethod
+    def _normalize(vector: np.ndarray) -> np.ndarray:
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _reserve(self, size: int):
+        if self._matrix is not None and self._matrix.shape[0] >= size:
+            return
+        capacity = self._initial_capacity
+        if self._matrix is not None:
+            capacity = self._matrix.shape[0]
+        while capacity < size:
+            capacity *= 2
+        matrix = np.empty((capacity, self.dim), dtype=np.float32)
+        if self._matrix is not None:
+            matrix[: self._tail_size] = self._matrix[: self._tail_size]
+        self._matrix = matrix
@@ -1,13 +1,29 @@
+import argparse
 import asyncio
+import json
 import os
-import subprocess
-import sys
+import shutil
+import threading
+from typing import Optional
 
+from aiohttp import web
 from dotenv import load_dotenv
 
 from core.agent import Agent
 from core.client import MCPClient
+from core.client_pool import MCPClientPool
+from core.server import create_app
+from core.session import SessionManager
+from core.startup import Startup
+from core.utils.chunking import Chunker
+from core.utils.embedding_index import EmbeddingIndex, content_hash
 from core.utils.embedding_retriever import EmbeddingRetriever
+from core.utils.http_client import HTTPClient
+from core.utils.ivf_index import IVFVectorStore
+from core.utils.metrics import metrics, start_metrics_server
+from core.utils.model_lifecycle import ModelLifecycle
+from core.utils.scheduler import BackendScheduler
+from core.utils.semantic_cache import SemanticCache
 from core.utils.util import log_title
 
 load_dotenv()
@@ -21,22 +37,171 @@ REQUEST_URL = f"{OLLAMA_HOST}:{OLLAMA_PORT}{OLLAMA_API_URL}"
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL")
 EMBEDDING_API_URL = os.getenv("EMBEDDING_API_URL")
 EMBEDDING_REQUEST_URL = f"{OLLAMA_HOST}:{OLLAMA_PORT}{EMBEDDING_API_URL}"
+# 向量量化方式：不设置为 float32，可选 float16 / int8
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION") or None
+# 检索索引：flat 为精确扫描，ivf 为倒排近似检索（大规模知识库）
+VECTOR_INDEX = os.getenv("VECTOR_INDEX", "flat")
+# IVF_NPROBE 为每次查询扫描的簇数，0 表示按簇数的 2% 取（至少 32 个）
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "0")) or None
+IVF_LISTS = int(os.getenv("IVF_LISTS", "0")) or None
+# 文档分块：每块词元数上限与相邻块重叠的词元数
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "256"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "32"))
+# 混合检索：BM25 倒排索引与向量检索融合，设为 0 时只用向量检索
+HYBRID_RETRIEVAL = os.getenv("HYBRID_RETRIEVAL", "1") != "0"
+INDEX_DIR = os.getenv("INDEX_DIR", os.path.join(os.getcwd(), ".index"))
+TOOL_SCHEMA_DIR = os.getenv(
+    "TOOL_SCHEMA_DIR", os.path.join(os.getcwd(), ".cache", "mcp_tools")
+)
+# MCP 服务端副本数 "最少:最多"，如 "1:4"；最多为 1 时每个服务端只启动一个子进程，
+# 大于 1 时按排队深度增减副本，调用发给最空闲的副本
+MCP_REPLICAS = os.getenv("MCP_REPLICAS", "1:1")
+# 模型驻留：keep_alive 格式同 Ollama（"30m"、"1h"，没有单位的数字按秒计，
+# "-1m" 或 -1 表示常驻，0 表示用完即卸载且不重新预热），
+# 到期前 MODEL_REWARM_MARGIN 秒在后台重新预热；
+# 模型参数为 JSON，如 CHAT_OPTIONS='{"num_ctx": 8192, "num_thread": 8}'
+MODEL_KEEP_ALIVE = os.getenv("MODEL_KEEP_ALIVE", "30m")
+MODEL_REWARM_MARGIN = float(os.getenv("MODEL_REWARM_MARGIN", "60"))
+CHAT_OPTIONS = json.loads(os.getenv("CHAT_OPTIONS") or "{}")
+EMBED_OPTIONS = json.loads(os.getenv("EMBED_OPTIONS") or "{}")
+# 每次提问只发送最相关的 TOOL_TOP_N 个工具（0 表示发送全部），
+# PINNED_TOOLS 为始终发送的工具名，逗号分隔；复用检索时计算的提问向量排序，
+# 检索走词法快速路径时按工具名称与描述的关键词匹配，不额外请求嵌入
+TOOL_TOP_N = int(os.getenv("TOOL_TOP_N", "8"))
+PINNED_TOOLS = [
+    t.strip() for t in os.getenv("PINNED_TOOLS", "").split(",") if t.strip()
+]
+# 语义回答缓存：提问向量相似度不低于阈值且检索到相同文档时直接返回之前的回答，
+# 只用于会话的第一轮；默认关闭，RESPONSE_CACHE_SIZE 为缓存条数（如 512）；
+# 设置 RESPONSE_CACHE_PATH 后退出时保存、启动时载入
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "0"))
+RESPONSE_CACHE_THRESHOLD = float(os.getenv("RESPONSE_CACHE_THRESHOLD", "0.95"))
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH") or None
+# 设置任意一项即开启链路与指标记录
+METRICS_JSONL = os.getenv("METRICS_JSONL")
+METRICS_PROM = os.getenv("METRICS_PROM")
+METRICS_PORT = os.getenv("METRICS_PORT")
+# Ollama 请求准入控制：对话与嵌入分别限制并发，排队超过上限或超时直接报错
+CHAT_CONCURRENCY = int(os.getenv("CHAT_CONCURRENCY", "2"))
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "2"))
+BACKEND_QUEUE_SIZE = int(os.getenv("BACKEND_QUEUE_SIZE", "64"))
+BACKEND_QUEUE_TIMEOUT = float(os.getenv("BACKEND_QUEUE_TIMEOUT", "30"))
+# Ollama 请求超时（秒）：建立连接的上限，以及两次收到数据之间的最长间隔
+# （包括首个数据块，需覆盖模型加载时间）；设为 0 表示不限
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "30")) or None
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "300")) or None
+# 多会话服务（python main.py --serve）
+SERVER_HOST = os.getenv("SERVER_HOST", "127.0.0.1")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8080"))
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", "64"))
+SESSION_IDLE_TIMEOUT = float(os.getenv("SESSION_IDLE_TIMEOUT", "900"))
 
 
-async def embed_documents():
+def create_lifecycle(http_client: HTTPClient) -> ModelLifecycle:
+    lifecycle = ModelLifecycle(
+        http_client,
+        keep_alive=MODEL_KEEP_ALIVE,
+        rewarm_margin=MODEL_REWARM_MARGIN,
+    )
+    lifecycle.add_model("chat", CHAT_MODEL, REQUEST_URL, CHAT_OPTIONS)
+    lifecycle.add_model("embed", EMBEDDING_MODEL, EMBEDDING_REQUEST_URL, EMBED_OPTIONS)
+    return lifecycle
+
+
+def create_retriever(
+    http_client: HTTPClient, lifecycle: ModelLifecycle
+) -> EmbeddingRetriever:
+    return EmbeddingRetriever(
+        EMBEDDING_MODEL,
+        EMBEDDING_REQUEST_URL,
+        http_client=http_client,
+        lifecycle=lifecycle,
+        quantization=VECTOR_QUANTIZATION,
+        index_type=VECTOR_INDEX,
+        index_options=(
+            {"nprobe": IVF_NPROBE, "n_lists": IVF_LISTS}
+            if VECTOR_INDEX == "ivf"
+            else None
+        ),
+        hybrid=HYBRID_RETRIEVAL,
+    )
+
+
+def create_response_cache() -> Optional[SemanticCache]:
+    if RESPONSE_CACHE_SIZE <= 0:
+        return None
+    cache = SemanticCache(
+        EMBEDDING_MODEL,
+        threshold=RESPONSE_CACHE_THRESHOLD,
+        max_size=RESPONSE_CACHE_SIZE,
+        path=RESPONSE_CACHE_PATH,
+    )
+    loaded = cache.load()
+    if loaded:
+        print(f"已载入 {loaded} 条缓存的回答")
+    return cache
+
+
+async def embed_documents(embedding_retriever: EmbeddingRetriever):
     # RAG
     log_title("编码文档")
-    embedding_retriever = EmbeddingRetriever(EMBEDDING_MODEL, EMBEDDING_REQUEST_URL)
     knowledge_dir = os.path.join(os.getcwd(), "knowledge")
-    files = os.listdir(knowledge_dir)
+    files = sorted(os.listdir(knowledge_dir))
+    # 在线程中计算哈希，不阻塞已经开始接受输入的事件循环
+    digests = await asyncio.to_thread(
+        lambda: {
+            file: content_hash(os.path.join(knowledge_dir, file)) for file in files
+        }
+    )
+
+    # 内容未变化的文件直接从磁盘索引映射，只编码新增或修改过的文件
+    chunker = Chunker(CHUNK_TOKENS, CHUNK_OVERLAP)
+    index = EmbeddingIndex(INDEX_DIR, EMBEDDING_MODEL, chunker.settings)
+    index.load()
+    vector_store = embedding_retriever.vector_store
+    reused = index.load_into(vector_store, digests)
+    # IVF 簇中心与索引一起持久化，重启时不必重新训练
+    ivf_path = os.path.join(INDEX_DIR, "ivf.npz")
+    use_ivf = isinstance(vector_store, IVFVectorStore)
+    ivf_loaded = use_ivf and vector_store.load_ivf(ivf_path, index.fingerprint)
+    print(f"复用索引: {len(reused)} 个文件，待编码: {len(files) - len(reused)} 个文件")
+
+    # 逐文件流式分块，分块一边产出一边送去编码，文件不会整体读入内存
+    pending = [file for file in files if file not in reused]
+    chunks = (
+        chunk
+        for file in pending
+        for chunk in chunker.iter_file(os.path.join(knowledge_dir, file), file)
+    )
+    if pending:
+        count = await embedding_retriever.ingest(chunks)
+        print(f"新增分块: {count} 个")
+
+    index_changed = not index.is_current(digests)
+    if index_changed:
+        index.save(vector_store, digests)
+    if use_ivf and (index_changed or not ivf_loaded):
+        # 训练在线程中进行，构建期间仍可响应输入
+        await vector_store.prepare()
+        vector_store.save_ivf(ivf_path, index.fingerprint)
+    print(f"向量内存占用: {vector_store.memory_stats()}")
+    if HYBRID_RETRIEVAL:
+        print(f"倒排索引: {embedding_retriever.sync_lexical_index()} 个分块")
+
+
+async def build_index(embedding_retriever: EmbeddingRetriever):
+    try:
+        await embed_documents(embedding_retriever)
+    finally:
+        embedding_retriever.finish_warming()
 
-    for file in files:
-        file_path = os.path.join(knowledge_dir, file)
-        with open(file_path, "r", encoding="utf-8") as f:
-            content = f.read()
-            await embedding_retriever.embed_document(content)
 
-    return embedding_retriever
+async def report_startup(startup: Startup):
+    """后台阶段全部结束后打印完整的启动耗时"""
+    await startup.wait()
+    startup.mark("all_ready")
+    log_title("启动完成")
+    print(startup.report())
 
 
 async def retrieve_context(embedding_retriever: EmbeddingRetriever, prompt: str):
@@ -49,61 +214,120 @@ async def retrieve_context(embedding_retriever: EmbeddingRetriever, prompt: str)
 
 
 def get_npx_path():
-    try:
-        if sys.platform == "win32":
-            result = subprocess.run(
-                ["where", "npx"], check=True, capture_output=True, text=True
-            )
-            lines = result.stdout.strip().splitlines()
-            if not lines:
-                raise RuntimeError("npx not found in system PATH")
-            npx_path = lines[-1]
-        else:
-            npx_path = "npx"
-        return npx_path
+    # shutil.which 会按 PATHEXT 查找 Windows 下的 npx.cmd，不必启动子进程
+    npx_path = shutil.which("npx")
+    if npx_path is None:
+        raise RuntimeError("npx not found in system PATH")
+    return npx_path
 
-    except subprocess.CalledProcessError as e:
-        raise RuntimeError("Failed to locate npx executable via 'where' command") from e
 
-    except IndexError as e:
-        raise RuntimeError("Unexpected output from 'where npx' command") from e
+def create_client(name: str, command: str, arguments: list, **kwargs) -> MCPClient:
+    min_replicas, max_replicas = (int(n) for n in MCP_REPLICAS.split(":"))
+    if max_replicas <= 1:
+        return MCPClient(name, command, arguments, **kwargs)
+    return MCPClientPool(
+        name,
+        command,
+        arguments,
+        min_replicas=min_replicas,
+        max_replicas=max_replicas,
+        **kwargs,
+    )
 
 
-async def main():
-    # 初始化客户端
+def create_clients():
     currentDir = os.getcwd()
-    fetchMCP = MCPClient("mcp-server-fetch", "uvx", ["mcp-server-fetch"])
-    fileMCP = MCPClient(
+    # 只读工具的结果按秒缓存，写文件等工具会使相关路径的缓存失效；
+    # 有工具列表缓存时服务端子进程延迟到第一次调用工具时启动
+    fetchMCP = create_client(
+        "mcp-server-fetch",
+        "uvx",
+        ["mcp-server-fetch"],
+        cache_tools={"fetch": 300},
+        lazy=True,
+        schema_cache_dir=TOOL_SCHEMA_DIR,
+    )
+    try:
+        npx_path = get_npx_path()
+    except RuntimeError as e:
+        print(f"跳过文件系统服务端: {e}")
+        return [fetchMCP]
+    fileMCP = create_client(
         "mcp-server-file",
-        get_npx_path(),
+        npx_path,
         [
             "-y",
             "@modelcontextprotocol/server-filesystem",
             currentDir,
         ],
+        cache_tools={
+            "read_file": 60,
+            "read_multiple_files": 60,
+            "list_directory": 30,
+            "directory_tree": 30,
+            "get_file_info": 30,
+            "search_files": 30,
+            "list_allowed_directories": None,
+        },
+        lazy=True,
+        schema_cache_dir=TOOL_SCHEMA_DIR,
     )
+    return [fileMCP, fetchMCP]
+
+
+_pending_input: Optional[asyncio.Future] = None
 
-    vector_database = await embed_documents()
-    # 初始化智能体
-    agent = Agent(
-        model=CHAT_MODEL,
-        api_url=REQUEST_URL,
-        clients=[fileMCP, fetchMCP],
-        sys_prompt="除非用户指定，否则默认回复中文",
-        vector_database=vector_database,
-        enable_memory=True,
-    )
 
-    await agent.init()
+async def read_input(prompt: str) -> str:
+    """在守护线程中读取一行标准输入
 
+    不使用 asyncio.to_thread：Ctrl+C 取消主任务后，asyncio.run 会等待默认线程池中
+    阻塞在 input() 上的线程，进程无法退出。守护线程不会阻止退出；等待被取消时
+    读取仍在进行，下次调用复用它，不会有两个线程同时读取标准输入。
+    """
+    global _pending_input
+    loop = asyncio.get_running_loop()
+    if _pending_input is None or _pending_input.get_loop() is not loop:
+        future = loop.create_future()
+
+        def read():
+            try:
+                line, error = input(prompt), None
+            except Exception as e:
+                line, error = None, e
+
+            def deliver():
+                if future.done():
+                    return
+                if error is None:
+                    future.set_result(line)
+                else:
+                    future.set_exception(error)
+
+            try:
+                loop.call_soon_threadsafe(deliver)
+            except RuntimeError:
+                pass  # 事件循环已关闭
+
+        _pending_input = future
+        threading.Thread(target=read, daemon=True).start()
+    try:
+        return await asyncio.shield(_pending_input)
+    finally:
+        if _pending_input.done():
+            _pending_input = None
+
+
+async def run_cli(agent: Agent):
     # 对话循环
     log_title("✅ 智能体已启动，输入你的问题（输入 'exit' 或 'quit' 退出）:")
 
     while True:
         try:
             log_title("用户提问：")
-            prompt = input(
-                "🧠 你："
+            # 等待输入时事件循环仍可处理后台任务
+            prompt = (
+                await read_input("🧠 你：")
             ).strip()  # 请从https://baijiahao.baidu.com/s?id=1830983245152297044获取新闻，并整理结果保存到E:\mmproject\test\mcp-client/output/antonette.md,输出一个漂亮md文件,如果指定目录不存在，则创建目录
             if prompt.lower() in ("exit", "quit"):
                 print("👋 正在关闭智能体...")
@@ -115,15 +339,117 @@ async def main():
                 continue  # 忽略空输入
             log_title("模型回复")
             await agent.invoke(prompt)
-        except KeyboardInterrupt:
+        except (KeyboardInterrupt, EOFError):
             print("\n🛑 检测到中断，正在关闭...")
             break
+        except asyncio.CancelledError:
+            # asyncio.run 收到 Ctrl+C 时取消主任务，清理由 main 的 finally 完成
+            print("\n🛑 检测到中断，正在关闭...")
+            raise
         except Exception as e:
             print(f"❌ 出现错误: {e}")
 
-    await agent.close()
-    log_title("✅ 智能体已关闭")
+
+async def serve(agent: Agent, host: str, port: int):
+    """以 HTTP/WebSocket 服务运行，多个会话共享智能体的客户端与连接池"""
+    manager = SessionManager(
+        agent, max_sessions=MAX_SESSIONS, idle_timeout=SESSION_IDLE_TIMEOUT
+    )
+    runner = web.AppRunner(create_app(manager))
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    log_title(f"✅ 服务已启动: http://{host}:{port}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="MCP 智能体")
+    parser.add_argument("--serve", action="store_true", help="以多会话服务方式运行")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    args = parser.parse_args()
+
+    metrics_runner = None
+    if METRICS_JSONL or METRICS_PROM or METRICS_PORT:
+        metrics.configure(jsonl_path=METRICS_JSONL, prometheus_path=METRICS_PROM)
+        if METRICS_PORT:
+            metrics_runner = await start_metrics_server(port=int(METRICS_PORT))
+
+    # LLM 与检索器共用一个长连接池和准入队列
+    scheduler = BackendScheduler(
+        chat_in_flight=CHAT_CONCURRENCY,
+        embed_in_flight=EMBED_CONCURRENCY,
+        max_queue=BACKEND_QUEUE_SIZE,
+        queue_timeout=BACKEND_QUEUE_TIMEOUT,
+    )
+    http_client = HTTPClient(
+        connect_timeout=HTTP_CONNECT_TIMEOUT,
+        read_timeout=HTTP_READ_TIMEOUT,
+        scheduler=scheduler,
+    )
+    lifecycle = create_lifecycle(http_client)
+    retriever = create_retriever(http_client, lifecycle)
+    response_cache = create_response_cache()
+    # 初始化智能体
+    agent = Agent(
+        model=CHAT_MODEL,
+        api_url=REQUEST_URL,
+        clients=create_clients(),
+        sys_prompt="除非用户指定，否则默认回复中文",
+        vector_database=retriever,
+        enable_memory=True,
+        http_client=http_client,
+        model_lifecycle=lifecycle,
+        tool_top_n=TOOL_TOP_N,
+        pinned_tools=PINNED_TOOLS,
+        response_cache=response_cache,
+    )
+
+    # 知识库编码与模型预热在后台进行；连接 MCP 服务端后即可接受输入，
+    # 编码完成前检索处于 warming 状态
+    startup = Startup()
+    retriever.begin_warming()
+    startup.background("ingestion", build_index(retriever))
+    startup.background("warm_up", agent.warm_up())
+    lifecycle.start()
+    try:
+        await startup.run("mcp_connect", agent.init())
+    except BaseException:
+        await startup.cancel()
+        await agent.close()
+        raise
+    startup.mark("accepting_input")
+    print(f"启动耗时:\n{startup.report()}")
+    startup_report = asyncio.create_task(report_startup(startup))
+
+    try:
+        if args.serve:
+            await serve(agent, args.host, args.port)
+        else:
+            await run_cli(agent)
+    finally:
+        startup_report.cancel()
+        await startup.cancel()
+        print(f"HTTP 连接统计: {http_client.stats()}")
+        print(f"请求队列统计: {scheduler.stats()}")
+        print(f"模型驻留统计: {lifecycle.stats()}")
+        if response_cache is not None:
+            print(f"回答缓存统计: {response_cache.stats()}")
+            response_cache.save()
+        await agent.close()
+        if metrics.enabled:
+            metrics.flush()
+            print(f"阶段耗时统计: {metrics.summary()}")
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        log_title("✅ 智能体已关闭")
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
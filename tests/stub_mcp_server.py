@@ -0,0 +1,47 @@
+"""测试用的 stdio MCP 服务端
+
+工具延迟（秒）由第一个命令行参数或 STUB_LATENCY 控制；stdio 客户端默认不向子进程
+传递自定义环境变量，因此通过客户端启动时使用命令行参数。
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+from mcp.server.fastmcp import FastMCP
+
+LATENCY = float(sys.argv[1] if len(sys.argv) > 1 else os.getenv("STUB_LATENCY", "0"))
+
+mcp = FastMCP("stub", log_level="WARNING")
+
+
+@mcp.tool()
+async def echo(text: str) -> str:
+    """Echo the given text back."""
+    await asyncio.sleep(LATENCY)
+    return text
+
+
+@mcp.tool()
+async def pid() -> str:
+    """Return the server process id."""
+    await asyncio.sleep(LATENCY)
+    return str(os.getpid())
+
+
+@mcp.tool()
+async def block(seconds: float) -> str:
+    """Block the server event loop, simulating CPU-bound work."""
+    time.sleep(seconds)
+    return str(os.getpid())
+
+
+@mcp.tool()
+async def crash() -> str:
+    """Exit the server process immediately."""
+    os._exit(1)
+
+
+if __name__ == "__main__":
+    mcp.run()
@@ -0,0 +1,137 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from core.agent import Agent
+from core.llm import (
+    DoneEvent,
+    LLMResponseData,
+    TextDelta,
+    ToolCall,
+    ToolResultEvent,
+)
+
+
+class FakeClient:
+    def __init__(self, name, tool_names, delay=0.05):
+        self.name = name
+        self.tools = [
+            SimpleNamespace(name=n, description=n, inputSchema={}) for n in tool_names
+        ]
+        self.delay = delay
+        self.calls = []
+
+    def get_all_tools(self):
+        return self.tools
+
+    async def call_tool(self, name, arguments):
+        self.calls.append((name, arguments))
+        await asyncio.sleep(self.delay)
+        return SimpleNamespace(content=f"{name}:{arguments}")
+
+
+class FakeLLM:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.messages = []
+        self.chat_calls = 0
+
+    async def stream_chat(self, prompt=None):
+        self.chat_calls += 1
+        response = self.responses.pop(0)
+        if response.content:
+            yield TextDelta(response.content)
+        yield DoneEvent(response, {"eval_count": 2})
+
+    def add_tool_message(self, content):
+        self.messages.append({"role": "tool", "content": content})
+
+    def add_assistant_message(self, content):
+        self.messages.append({"role": "assistant", "content": content})
+
+
+def tool_response(*calls):
+    tool_call = ToolCall()
+    tool_call.add_tool_call(
+        [{"function": {"name": name, "arguments": args}} for name, args in calls]
+    )
+    return LLMResponseData("", tool_call)
+
+
+def make_agent(clients, responses, **kwargs):
+    agent = Agent("model", "url", clients=clients, **kwargs)
+    for client in clients:
+        agent.tool_registry.register(client)
+    agent.llm = FakeLLM(responses)
+    return agent
+
+
+def test_tool_calls_run_in_parallel_with_one_follow_up():
+    client = FakeClient("fetch", ["fetch"], delay=0.2)
+    agent = make_agent(
+        [client],
+        [
+            tool_response(
+                ("fetch", {"url": "a"}),
+                ("fetch", {"url": "b"}),
+                ("fetch", {"url": "c"}),
+            ),
+            LLMResponseData("done", ToolCall()),
+        ],
+    )
+
+    started = time.perf_counter()
+    assert asyncio.run(agent.invoke("hi")) == "done"
+    elapsed = time.perf_counter() - started
+
+    assert elapsed < 0.5
+    assert agent.llm.chat_calls == 2
+    tool_messages = [m["content"] for m in agent.llm.messages if m["role"] == "tool"]
+    assert [m.split("结果: ")[1] for m in tool_messages] == [
+        "fetch:{'url': 'a'}",
+        "fetch:{'url': 'b'}",
+        "fetch:{'url': 'c'}",
+    ]
+
+
+def test_tool_timeout_and_missing_tool():
+    client = FakeClient("slow", ["slow"], delay=1.0)
+    agent = make_agent(
+        [client],
+        [
+            tool_response(("slow", {}), ("missing", {})),
+            LLMResponseData("done", ToolCall()),
+        ],
+        tool_timeout=0.05,
+    )
+
+    asyncio.run(agent.invoke("hi"))
+
+    timeout_message, missing_message = [
+        m["content"] for m in agent.llm.messages if m["role"] == "tool"
+    ]
+    assert "调用超时" in timeout_message
+    assert "工具未找到" in missing_message
+
+
+def test_stream_invoke_yields_typed_events():
+    client = FakeClient("fetch", ["fetch"], delay=0)
+    agent = make_agent(
+        [client],
+        [
+            tool_response(("fetch", {"url": "a"})),
+            LLMResponseData("done", ToolCall()),
+        ],
+    )
+
+    async def collect():
+        return [event async for event in agent.stream_invoke("hi")]
+
+    events = asyncio.run(collect())
+
+    assert [type(e) for e in events] == [ToolResultEvent, TextDelta, DoneEvent]
+    assert events[0].name == "fetch"
+    assert events[1] == TextDelta("done")
+    assert events[-1].response.content == "done"
+    assert events[-1].usage == {"eval_count": 4}
+    assert agent.llm.messages[-1] == {"role": "assistant", "content": "done"}
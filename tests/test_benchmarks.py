@@ -0,0 +1,48 @@
+import asyncio
+
+from benchmarks.fake_ollama import FakeOllama
+from benchmarks.run import compare
+from core.llm import LLM
+from core.utils.embedding_retriever import EmbeddingRetriever
+
+
+def test_fake_ollama_chat_and_embed():
+    async def scenario():
+        async with FakeOllama(
+            tokens_per_second=0, response_tokens=3, tool_name="pid", embedding_dim=8
+        ) as server:
+            llm = LLM(server.chat_url, "model")
+            retriever = EmbeddingRetriever("embed", server.embed_url)
+            try:
+                first = await llm.chat("hi", echo=False)
+                llm.add_tool_message("42")
+                second = await llm.chat(echo=False)
+                vectors = await retriever.embed_documents_batch(["a b", "a b", "c"])
+            finally:
+                await llm.http_client.close()
+                await retriever.http_client.close()
+        return first, second, vectors
+
+    first, second, vectors = asyncio.run(scenario())
+
+    assert first.tool_call.get_all_tools()[0]["function"]["name"] == "pid"
+    assert second.content == "tok0 tok1 tok2 "
+    assert vectors[0] == vectors[1] and vectors[0] != vectors[2]
+    assert len(vectors[0]) == 8
+
+
+def test_compare_flags_regressions_by_direction():
+    baseline = {
+        "retrieval": {"n=10": {"p50_ms": 1.0}},
+        "ingest": {"docs_per_second": 100},
+    }
+    results = {
+        "retrieval": {"n=10": {"p50_ms": 1.5}},
+        "ingest": {"docs_per_second": 95},
+    }
+
+    regressions = compare(results, baseline, tolerance=0.25)
+
+    assert len(regressions) == 1
+    assert regressions[0].startswith("retrieval.n=10.p50_ms")
+    assert compare(results, baseline, tolerance=0.6) == []
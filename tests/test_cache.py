@@ -0,0 +1,29 @@
+import time
+
+from core.utils.cache import LRUCache
+
+
+def test_lru_eviction_and_counters():
+    cache = LRUCache(max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+
+    assert "b" not in cache
+    assert cache.get("b") is None
+    assert cache.keys() == ["a", "c"]
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+    assert cache.evictions == 1
+
+
+def test_ttl_expiry():
+    cache = LRUCache(ttl=0.05)
+    cache.put("a", 1)
+    cache.put("b", 2, ttl=10)
+    time.sleep(0.06)
+
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+    assert len(cache) == 1
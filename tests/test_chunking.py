@@ -0,0 +1,86 @@
+from core.utils.chunking import Chunker
+from core.utils.tokens import TOKEN_RE, estimate_tokens
+
+
+def test_estimate_tokens_counts_cjk_characters_individually():
+    assert estimate_tokens("hello world") == 4
+    assert estimate_tokens("你好 world") == 4
+
+
+def test_headings_start_new_chunks_with_heading_path():
+    lines = [
+        "# Guide\n",
+        "intro text\n",
+        "## Install\n",
+        "run pip install\n",
+        "```\n",
+        "# not a heading\n",
+        "```\n",
+        "## Usage\n",
+        "call main\n",
+    ]
+    chunks = list(Chunker(max_tokens=50, overlap_tokens=5).iter_lines(lines, "a.md"))
+
+    assert [c.metadata["heading"] for c in chunks] == [
+        "Guide",
+        "Guide > Install",
+        "Guide > Usage",
+    ]
+    assert "# not a heading" in chunks[1].text
+    assert chunks[2].text == "## Usage\ncall main"
+    assert chunks[1].metadata == {
+        "source": "a.md",
+        "chunk": 1,
+        "heading": "Guide > Install",
+        "start_line": 3,
+        "end_line": 7,
+    }
+
+
+def test_long_sections_are_windowed_with_overlap():
+    lines = [f"w{i}a w{i}b w{i}c\n" for i in range(10)]
+    chunks = list(Chunker(max_tokens=9, overlap_tokens=3).iter_lines(lines, "b.md"))
+
+    assert all(estimate_tokens(c.text) <= 9 for c in chunks)
+    # 每块以上一块的最后一行开头
+    for previous, current in zip(chunks, chunks[1:]):
+        assert current.text.splitlines()[0] == previous.text.splitlines()[-1]
+    words = " ".join(c.text for c in chunks).split()
+    assert {f"w{i}a" for i in range(10)} <= set(words)
+    assert [c.metadata["chunk"] for c in chunks] == list(range(len(chunks)))
+
+
+def test_overlap_is_cut_inside_lines_longer_than_overlap():
+    long_line = " ".join(f"word{i}" for i in range(50)) + "\n"
+    short_lines = [
+        f"l{i}a l{i}b l{i}c l{i}d l{i}e l{i}f l{i}g l{i}h\n" for i in range(6)
+    ]
+
+    for lines in ([long_line], short_lines):
+        chunks = list(Chunker(max_tokens=20, overlap_tokens=5).iter_lines(lines, "d"))
+
+        assert len(chunks) > 1
+        assert all(estimate_tokens(c.text) <= 20 for c in chunks)
+        for previous, current in zip(chunks, chunks[1:]):
+            tail = TOKEN_RE.findall(previous.text)[-5:]
+            assert TOKEN_RE.findall(current.text)[:5] == tail
+
+
+def test_overlong_line_is_split():
+    line = " ".join(f"t{i}" for i in range(25)) + "\n"
+    chunks = list(Chunker(max_tokens=10, overlap_tokens=0).iter_lines([line], "c"))
+
+    assert [estimate_tokens(c.text) for c in chunks] == [10, 10, 5]
+    assert " ".join(c.text for c in chunks).split() == line.split()
+    assert all(c.metadata["start_line"] == 1 for c in chunks)
+
+
+def test_iter_file_streams_from_disk(tmp_path):
+    path = tmp_path / "doc.md"
+    path.write_text("# 标题\n\n中文内容\n", encoding="utf-8")
+
+    chunks = list(Chunker().iter_file(str(path), "doc.md"))
+
+    assert len(chunks) == 1
+    assert chunks[0].text == "# 标题\n\n中文内容"
+    assert chunks[0].metadata["source"] == "doc.md"
@@ -0,0 +1,92 @@
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+from core.client import MCPClient
+
+
+class FakeSession:
+    def __init__(self):
+        self.calls = []
+
+    async def call_tool(self, name, arguments):
+        self.calls.append((name, arguments))
+        return SimpleNamespace(content=f"{name}:{len(self.calls)}", isError=False)
+
+
+def make_client(cache_tools):
+    client = MCPClient("files", "cmd", [], cache_tools=cache_tools)
+    client.session = FakeSession()
+    return client
+
+
+def call(client, name, arguments):
+    return asyncio.run(client.call_tool(name, arguments)).content
+
+
+def test_read_only_results_are_cached_by_canonical_arguments():
+    client = make_client({"read_file": None})
+
+    first = call(client, "read_file", {"path": "/a/b.md", "encoding": "utf-8"})
+    second = call(client, "read_file", {"encoding": "utf-8", "path": "/a/b.md"})
+
+    assert first == second
+    assert len(client.session.calls) == 1
+    assert client.result_cache.hits == 1
+
+
+def test_uncached_client_always_calls_server():
+    client = make_client(None)
+    call(client, "fetch", {"url": "x"})
+    call(client, "fetch", {"url": "x"})
+    assert len(client.session.calls) == 2
+
+
+def test_write_invalidates_related_paths_only():
+    client = make_client({"read_file": None, "list_directory": None})
+    call(client, "read_file", {"path": "/a/b.md"})
+    call(client, "list_directory", {"path": "/a"})
+    call(client, "read_file", {"path": "/c/d.md"})
+
+    call(client, "write_file", {"path": "/a/b.md", "content": "new"})
+
+    cached_paths = sorted(key[1] for key in client.result_cache.keys())
+    assert cached_paths == ['{"path":"/c/d.md"}']
+
+
+def test_cache_ttl():
+    client = make_client({"fetch": 0.01})
+    call(client, "fetch", {"url": "x"})
+    asyncio.run(asyncio.sleep(0.02))
+    call(client, "fetch", {"url": "x"})
+    assert len(client.session.calls) == 2
+
+
+def stub_client(tmp_path, **kwargs):
+    server = os.path.join(os.path.dirname(__file__), "stub_mcp_server.py")
+    return MCPClient(
+        "stub", sys.executable, [server], schema_cache_dir=str(tmp_path), **kwargs
+    )
+
+
+def test_lazy_client_uses_cached_schemas(tmp_path):
+    async def scenario():
+        eager = stub_client(tmp_path)
+        await eager.connect_to_server()
+        await eager.close_connection()
+
+        lazy = stub_client(tmp_path, lazy=True)
+        await lazy.connect_to_server()
+        # 工具列表来自缓存，子进程在后台启动
+        names = [tool.name for tool in lazy.get_all_tools()]
+        connected_before_call = lazy.connected and lazy._refresh_task.done()
+        result = await lazy.call_tool("echo", {"text": "hi"})
+        await lazy.close_connection()
+        return names, connected_before_call, result
+
+    names, connected_before_call, result = asyncio.run(scenario())
+
+    assert sorted(names) == ["block", "crash", "echo", "pid"]
+    assert not connected_before_call
+    assert result.content[0].text == "hi"
@@ -0,0 +1,97 @@
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+
+from core.client_pool import MCPClientPool
+
+SERVER = os.path.join(os.path.dirname(__file__), "stub_mcp_server.py")
+
+
+def stub_pool(tmp_path, **kwargs):
+    return MCPClientPool(
+        "stub", sys.executable, [SERVER], schema_cache_dir=str(tmp_path), **kwargs
+    )
+
+
+async def wait_until(predicate, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not met in time")
+        await asyncio.sleep(0.05)
+
+
+def test_calls_spread_across_replicas(tmp_path):
+    async def scenario():
+        pool = stub_pool(tmp_path, min_replicas=3, max_replicas=3)
+        await pool.connect_to_server()
+        try:
+            started = time.perf_counter()
+            results = await asyncio.gather(
+                *[pool.call_tool("block", {"seconds": 0.3}) for _ in range(3)]
+            )
+            elapsed = time.perf_counter() - started
+        finally:
+            await pool.close_connection()
+        return pool, results, elapsed
+
+    pool, results, elapsed = asyncio.run(scenario())
+
+    assert sorted(t.name for t in pool.get_all_tools()) == [
+        "block",
+        "crash",
+        "echo",
+        "pid",
+    ]
+    # 每个副本各执行一次阻塞调用，总耗时约等于一次调用
+    assert len({r.content[0].text for r in results}) == 3
+    assert elapsed < 0.8
+    assert pool.replicas == []
+
+
+def test_crashed_replica_is_restarted(tmp_path):
+    async def scenario():
+        pool = stub_pool(tmp_path, min_replicas=1, max_replicas=1, health_interval=0.1)
+        await pool.connect_to_server()
+        try:
+            before = (await pool.call_tool("pid", {})).content[0].text
+            with pytest.raises(Exception):
+                await asyncio.wait_for(pool.call_tool("crash", {}), 5)
+            await wait_until(lambda: pool.replicas)
+            after = (await pool.call_tool("pid", {})).content[0].text
+        finally:
+            await pool.close_connection()
+        return pool, before, after
+
+    pool, before, after = asyncio.run(scenario())
+
+    assert before != after
+    assert pool.restarts == 1
+
+
+def test_scales_with_queue_depth(tmp_path):
+    async def scenario():
+        pool = stub_pool(
+            tmp_path,
+            min_replicas=1,
+            max_replicas=2,
+            scale_up_depth=1,
+            idle_timeout=0.2,
+            health_interval=0.1,
+        )
+        await pool.connect_to_server()
+        try:
+            await asyncio.gather(
+                *[pool.call_tool("echo", {"text": str(i)}) for i in range(2)]
+            )
+            # 新副本加入后，空闲的副本随即被回收，最终回到 min_replicas
+            await wait_until(lambda: pool.scale_downs == 1 and not pool._starting)
+            replicas = len(pool.replicas)
+        finally:
+            await pool.close_connection()
+        return pool.scale_ups, replicas
+
+    assert asyncio.run(scenario()) == (1, 1)
@@ -0,0 +1,62 @@
+import asyncio
+
+import numpy as np
+
+from core.utils.embedding_index import EmbeddingIndex
+from core.utils.vector_store import VectorStore
+
+
+def build_store(rows):
+    store = VectorStore()
+    for source, vector in rows:
+        asyncio.run(
+            store.add_embedding(vector, f"text of {source}", {"source": source})
+        )
+    return store
+
+
+def test_round_trip_reuses_unchanged_files(tmp_path):
+    store = build_store([("a.md", [1.0, 0.0]), ("b.md", [0.0, 2.0])])
+    digests = {"a.md": "h1", "b.md": "h2"}
+    EmbeddingIndex(str(tmp_path), "model").save(store, digests)
+
+    index = EmbeddingIndex(str(tmp_path), "model")
+    assert index.load()
+    assert index.is_current(digests)
+    assert isinstance(index.vectors, np.memmap)
+
+    changed = {"a.md": "h1", "b.md": "changed", "c.md": "h3"}
+    restored = VectorStore()
+    assert index.load_into(restored, changed) == {"a.md"}
+    assert restored.documents == ["text of a.md"]
+    assert not index.is_current(changed)
+
+    asyncio.run(restored.add_embedding([0.0, 1.0], "text of b.md", {"source": "b.md"}))
+    assert asyncio.run(restored.search([0.0, 1.0], 1)) == ["text of b.md"]
+    index.save(restored, {"a.md": "h1", "b.md": "changed"})
+
+    reloaded = EmbeddingIndex(str(tmp_path), "model")
+    assert reloaded.load()
+    final = VectorStore()
+    assert reloaded.load_into(final, {"a.md": "h1", "b.md": "changed"}) == {
+        "a.md",
+        "b.md",
+    }
+    assert asyncio.run(final.search([0.0, 1.0], 2)) == ["text of b.md", "text of a.md"]
+    assert len(list(tmp_path.glob("vectors-*.f32"))) == 1
+
+
+def test_model_change_invalidates_index(tmp_path):
+    store = build_store([("a.md", [1.0, 0.0])])
+    EmbeddingIndex(str(tmp_path), "model-a").save(store, {"a.md": "h1"})
+
+    assert not EmbeddingIndex(str(tmp_path), "model-b").load()
+
+
+def test_chunk_settings_change_invalidates_index(tmp_path):
+    store = build_store([("a.md", [1.0, 0.0])])
+    settings = {"max_tokens": 256, "overlap_tokens": 32}
+    EmbeddingIndex(str(tmp_path), "model", settings).save(store, {"a.md": "h1"})
+
+    assert EmbeddingIndex(str(tmp_path), "model", dict(settings)).load()
+    assert not EmbeddingIndex(str(tmp_path), "model", {"max_tokens": 128}).load()
@@ -0,0 +1,157 @@
+import asyncio
+
+from aiohttp import web
+
+from core.utils.chunking import Chunker
+from core.utils.embedding_retriever import EmbeddingRetriever
+
+
+def fake_vector(text: str):
+    return [float(len(text)), float(sum(map(ord, text)) % 97), 1.0]
+
+
+async def start_embed_server(requests: list):
+    async def embed(request):
+        payload = await request.json()
+        inputs = payload["input"]
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        requests.append(inputs)
+        await asyncio.sleep(0.01)
+        return web.json_response({"embeddings": [fake_vector(i) for i in inputs]})
+
+    app = web.Application()
+    app.router.add_post("/api/embed", embed)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    return runner, f"http://127.0.0.1:{port}/api/embed"
+
+
+def test_embed_documents_batch_keeps_input_order():
+    async def scenario():
+        requests = []
+        runner, url = await start_embed_server(requests)
+        retriever = EmbeddingRetriever("test-model", url, batch_size=4)
+        try:
+            documents = [f"document number {i}" * (i % 3 + 1) for i in range(10)]
+            embeddings = await retriever.embed_documents_batch(
+                documents,
+                [{"source": str(i)} for i in range(10)],
+                max_concurrency=3,
+            )
+        finally:
+            await retriever.http_client.close()
+            await runner.cleanup()
+        return requests, documents, embeddings, retriever
+
+    requests, documents, embeddings, retriever = asyncio.run(scenario())
+
+    assert [len(batch) for batch in requests] == [4, 4, 2]
+    assert embeddings == [fake_vector(d) for d in documents]
+    assert retriever.vector_store.documents == documents
+    assert retriever.vector_store.metadata[3] == {"source": "3"}
+
+
+def test_batches_are_capped_by_characters():
+    retriever = EmbeddingRetriever("test-model", "", batch_size=10, max_batch_chars=10)
+    batches = retriever._make_batches(["aaaa", "bbbb", "cccc", "dddddddddddd"], 10)
+    assert batches == [["aaaa", "bbbb"], ["cccc"], ["dddddddddddd"]]
+
+
+def test_ingest_streams_chunks_in_order():
+    consumed = []
+
+    def chunks():
+        lines = [f"line {i} of the document\n" for i in range(12)]
+        for chunk in Chunker(max_tokens=12, overlap_tokens=0).iter_lines(lines, "a"):
+            consumed.append(chunk.metadata["chunk"])
+            yield chunk
+
+    async def scenario():
+        requests = []
+        runner, url = await start_embed_server(requests)
+        retriever = EmbeddingRetriever("test-model", url, batch_size=2)
+        try:
+            count = await retriever.ingest(chunks(), max_concurrency=2)
+        finally:
+            await retriever.http_client.close()
+            await runner.cleanup()
+        return requests, count, retriever
+
+    requests, count, retriever = asyncio.run(scenario())
+
+    assert count == 6 and consumed == list(range(6))
+    assert [len(batch) for batch in requests] == [2, 2, 2]
+    store = retriever.vector_store
+    assert [m["chunk"] for m in store.metadata] == list(range(6))
+    assert store.documents[0] == "line 0 of the document\nline 1 of the document"
+
+
+def test_retrieve_caches_and_invalidates_on_add():
+    async def scenario():
+        requests = []
+        runner, url = await start_embed_server(requests)
+        # 关闭词法检索，保证每次未命中缓存的检索都走向量查询
+        retriever = EmbeddingRetriever("test-model", url, hybrid=False)
+        try:
+            await retriever.embed_documents_batch(["alpha", "beta"])
+            first = await retriever.retrieve("Alpha ", 1)
+            second = await retriever.retrieve("alpha", 1)
+            calls_before_add = len(requests)
+
+            await retriever.embed_document("gamma")
+            third = await retriever.retrieve("alpha", 1)
+        finally:
+            await retriever.http_client.close()
+            await runner.cleanup()
+        return requests, calls_before_add, first, second, third, retriever
+
+    requests, calls_before_add, first, second, third, retriever = asyncio.run(
+        scenario()
+    )
+
+    assert first == second
+    assert len(third) == 1
+    # 1 批文档 + 1 次查询；新增文档后查询向量仍命中缓存
+    assert calls_before_add == 2
+    assert len(requests) == 3
+    stats = retriever.cache_stats()
+    assert stats["results"]["hits"] == 1
+    # 新增文档后重新检索而不是返回旧结果
+    assert stats["results"]["misses"] == 2
+    assert stats["query_embeddings"]["hits"] == 1
+
+
+def test_hybrid_retrieval_routes():
+    documents = [
+        "Username: Bret, Email: Sincere@april.biz, City: Gwenborough",
+        "Username: Antonette, Email: Shanna@melissa.tv, City: Wisokyburgh",
+        "Username: Samantha, Email: Nathan@yesenia.net, City: McKenziehaven",
+    ]
+
+    async def scenario():
+        requests = []
+        runner, url = await start_embed_server(requests)
+        retriever = EmbeddingRetriever("test-model", url)
+        try:
+            await retriever.embed_documents_batch(documents)
+            indexed = len(requests)
+            lexical = await retriever.retrieve("What is Bret's email?", 1)
+            after_lexical = len(requests)
+            # 只匹配到所有文档都有的词，不够明确，需要向量检索并融合
+            fused = await retriever.retrieve("email city", 3)
+            after_fused = len(requests)
+        finally:
+            await retriever.http_client.close()
+            await runner.cleanup()
+        return indexed, lexical, after_lexical, fused, after_fused
+
+    indexed, lexical, after_lexical, fused, after_fused = asyncio.run(scenario())
+
+    assert lexical == [documents[0]]
+    assert after_lexical == indexed
+    assert sorted(fused) == sorted(documents)
+    assert after_fused == indexed + 1
@@ -0,0 +1,86 @@
+import asyncio
+
+from aiohttp import web
+
+from core.utils.http_client import HTTPClient
+from core.utils.scheduler import BackendScheduler
+
+
+def test_connections_are_reused_and_timed():
+    async def scenario():
+        async def ok(request):
+            return web.json_response({"ok": True})
+
+        app = web.Application()
+        app.router.add_post("/", ok)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        url = f"http://127.0.0.1:{runner.addresses[0][1]}/"
+
+        client = HTTPClient()
+        try:
+            for _ in range(3):
+                async with client.post(url, json={}) as response:
+                    assert (await response.json()) == {"ok": True}
+        finally:
+            await client.close()
+            await runner.cleanup()
+        return client
+
+    client = asyncio.run(scenario())
+
+    assert [t.reused for t in client.timings] == [False, True, True]
+    assert all(t.ttfb >= 0 for t in client.timings)
+    stats = client.stats()
+    assert stats["requests"] == 3 and stats["reused"] == 2
+
+
+def test_stalled_stream_times_out_and_releases_lane():
+    async def scenario():
+        release = asyncio.Event()
+
+        async def stall(request):
+            response = web.StreamResponse()
+            await response.prepare(request)
+            await response.write(b'{"done": false}\n')
+            await release.wait()
+            return response
+
+        async def ok(request):
+            return web.json_response({"ok": True})
+
+        app = web.Application()
+        app.router.add_post("/stall", stall)
+        app.router.add_post("/ok", ok)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        url = f"http://127.0.0.1:{runner.addresses[0][1]}"
+
+        scheduler = BackendScheduler(chat_in_flight=1)
+        client = HTTPClient(read_timeout=0.2, scheduler=scheduler)
+        try:
+            try:
+                async with client.post(f"{url}/stall", lane="chat", json={}) as r:
+                    async for _ in r.content:
+                        pass
+                stalled = None
+            except asyncio.TimeoutError as e:
+                stalled = e
+            # 超时后名额已释放，后续请求不会被卡住的连接饿死
+            async with client.post(f"{url}/ok", lane="chat", json={}) as r:
+                result = await r.json()
+        finally:
+            release.set()
+            await client.close()
+            await runner.cleanup()
+        return stalled, result, scheduler.stats()["chat"]
+
+    stalled, result, lane = asyncio.run(scenario())
+
+    assert stalled is not None
+    assert result == {"ok": True}
+    assert lane["in_flight"] == 0 and lane["granted"] == 2
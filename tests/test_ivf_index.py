@@ -0,0 +1,125 @@
+import asyncio
+import threading
+
+import numpy as np
+
+from core.utils.embedding_retriever import create_vector_store
+from core.utils.ivf_index import IVFVectorStore
+from core.utils.vector_store import VectorStore
+
+
+def clustered(rng, count, dim=16, clusters=8):
+    centers = rng.normal(size=(clusters, dim))
+    vectors = centers[rng.integers(0, clusters, count)] + 0.1 * rng.normal(
+        size=(count, dim)
+    )
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.astype(np.float32)
+
+
+def recall(store, exact, queries, top_k=5):
+    hits = 0
+    for query in queries:
+        expected = {i for i, _ in exact.search_ids(query, top_k)}
+        hits += len(expected & {i for i, _ in store.search_ids(query, top_k)})
+    return hits / (len(queries) * top_k)
+
+
+def test_ivf_search_with_incremental_inserts():
+    rng = np.random.default_rng(0)
+    vectors = clustered(rng, 600)
+    exact = VectorStore()
+    ivf = IVFVectorStore(n_lists=8, nprobe=2, min_train_size=400)
+    for store in (exact, ivf):
+        store.attach(vectors[:500], [f"doc-{i}" for i in range(500)])
+    queries = clustered(rng, 20)
+    # 检索本身不触发训练
+    ivf.search_ids(queries[0], 5)
+    assert not ivf.trained
+    asyncio.run(ivf.prepare())
+
+    assert recall(ivf, exact, queries) >= 0.9
+    assert ivf.trained and ivf.list_sizes().sum() == 500
+
+    # 训练后写入的行在下次检索前分配到簇
+    for i, vector in enumerate(vectors[500:], start=500):
+        for store in (exact, ivf):
+            asyncio.run(store.add_embedding(vector, f"doc-{i}"))
+    assert recall(ivf, exact, queries) >= 0.9
+    assert ivf.list_sizes().sum() == 600
+    assert asyncio.run(ivf.search(vectors[550], 1)) == ["doc-550"]
+
+
+def test_untrained_ivf_falls_back_to_exact_scan():
+    rng = np.random.default_rng(1)
+    vectors = clustered(rng, 50)
+    ivf = IVFVectorStore(min_train_size=100)
+    ivf.attach(vectors, [f"doc-{i}" for i in range(50)])
+
+    assert asyncio.run(ivf.search(vectors[7], 1)) == ["doc-7"]
+    assert not ivf.trained
+
+
+def test_save_and_load_reuses_assignments(tmp_path):
+    rng = np.random.default_rng(2)
+    vectors = clustered(rng, 300)
+    documents = [f"doc-{i}" for i in range(300)]
+    path = str(tmp_path / "ivf.npz")
+
+    trained = IVFVectorStore(n_lists=6, min_train_size=1)
+    trained.attach(vectors, documents)
+    trained.save_ivf(path, fingerprint="v1")
+    assert not trained.trained
+    asyncio.run(trained.prepare())
+    trained.save_ivf(path, fingerprint="v1")
+
+    restored = IVFVectorStore(n_lists=6, min_train_size=1)
+    restored.attach(vectors, documents)
+    assert restored.load_ivf(path, fingerprint="v1")
+    assert np.array_equal(restored.centroids, trained.centroids)
+    assert np.array_equal(restored.list_sizes(), trained.list_sizes())
+
+    stale = IVFVectorStore(min_train_size=1)
+    stale.attach(vectors[:200], documents[:200])
+    assert stale.load_ivf(path, fingerprint="v1")
+    assert stale.list_sizes().sum() == 200
+
+
+def test_prepare_trains_off_the_event_loop():
+    rng = np.random.default_rng(3)
+    ivf = IVFVectorStore(n_lists=4, min_train_size=100)
+    ivf.attach(clustered(rng, 200), [f"doc-{i}" for i in range(200)])
+    threads = []
+    fit = ivf._fit
+
+    def recording_fit(*args):
+        threads.append(threading.current_thread())
+        return fit(*args)
+
+    ivf._fit = recording_fit
+    asyncio.run(ivf.prepare())
+    asyncio.run(ivf.prepare())
+
+    assert ivf.trained and ivf.list_sizes().sum() == 200
+    assert len(threads) == 1 and threads[0] is not threading.main_thread()
+
+
+def test_default_nprobe_grows_with_list_count():
+    rng = np.random.default_rng(3)
+    vectors = clustered(rng, 4000)
+    ivf = IVFVectorStore(min_train_size=0, min_nprobe=4)
+    ivf.attach(vectors, [f"doc-{i}" for i in range(4000)])
+    ivf.train(n_lists=100)
+    assert ivf.probes == 4
+    ivf.train(n_lists=1000)
+    # 簇数增多后扫描的簇按比例增加
+    assert ivf.probes == 20
+    ivf.nprobe = 7
+    assert ivf.probes == 7
+
+
+def test_create_vector_store_by_type():
+    assert type(create_vector_store()) is VectorStore
+    store = create_vector_store("ivf", "int8", nprobe=3)
+    assert isinstance(store, IVFVectorStore)
+    assert store.nprobe == 3 and store.quantization == "int8"
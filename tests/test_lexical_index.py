@@ -0,0 +1,41 @@
+from core.utils.lexical_index import BM25Index, reciprocal_rank_fusion, tokenize
+
+
+def test_tokenize_folds_case_and_splits_cjk():
+    assert tokenize("Bret's Email: Sincere@april.biz") == [
+        "bret",
+        "email",
+        "sincere",
+        "april",
+        "biz",
+    ]
+    assert tokenize("北京 Beijing") == ["北", "京", "beijing"]
+
+
+def test_bm25_prefers_rare_terms_and_reports_coverage():
+    index = BM25Index()
+    index.add("name Leanne city Gwenborough")
+    index.add("name Ervin city Wisokyburgh")
+    index.add("name Clementine city Gwenborough")
+
+    hits = index.search("Ervin city", 3)
+
+    assert hits[0].id == 1
+    assert hits[0].coverage == 1.0
+    assert hits[0].score > hits[1].score
+    assert {hit.id for hit in hits} == {0, 1, 2}
+    assert 0 < hits[1].coverage < 1
+    assert index.search("unknown words", 3) == []
+
+
+def test_bm25_index_accepts_documents_after_search():
+    index = BM25Index()
+    index.add("alpha beta")
+    assert [hit.id for hit in index.search("gamma", 5)] == []
+    index.add("gamma delta")
+    assert [hit.id for hit in index.search("gamma", 5)] == [1]
+
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion([[1, 2, 3], [3, 1]], k=1)
+    assert [doc_id for doc_id, _ in fused] == [1, 3, 2]
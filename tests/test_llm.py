@@ -0,0 +1,86 @@
+import asyncio
+import json
+
+from aiohttp import web
+
+from core.llm import (
+    LLM,
+    DoneEvent,
+    TextDelta,
+    ToolCallEvent,
+    ToolResultEvent,
+    consume_stream,
+)
+
+
+async def start_chat_server(chunks):
+    async def chat(request):
+        response = web.StreamResponse()
+        await response.prepare(request)
+        for chunk in chunks:
+            await response.write((json.dumps(chunk) + "\n").encode("utf-8"))
+        await response.write_eof()
+        return response
+
+    app = web.Application()
+    app.router.add_post("/api/chat", chat)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    return runner, f"http://127.0.0.1:{runner.addresses[0][1]}/api/chat"
+
+
+def test_stream_chat_yields_deltas_tool_calls_and_usage():
+    tool_call = {"function": {"name": "fetch", "arguments": {"url": "x"}}}
+    chunks = [
+        {"message": {"role": "assistant", "content": "Hel"}, "done": False},
+        {"message": {"role": "assistant", "content": "lo"}, "done": False},
+        {
+            "message": {"role": "assistant", "content": "", "tool_calls": [tool_call]},
+            "done": False,
+        },
+        {
+            "message": {"role": "assistant", "content": ""},
+            "done": True,
+            "eval_count": 3,
+            "prompt_eval_count": 7,
+        },
+    ]
+
+    async def scenario():
+        runner, url = await start_chat_server(chunks)
+        llm = LLM(url, "model", "sys")
+        try:
+            events = [event async for event in llm.stream_chat("hi")]
+        finally:
+            await llm.http_client.close()
+            await runner.cleanup()
+        return events
+
+    events = asyncio.run(scenario())
+
+    assert events[:3] == [TextDelta("Hel"), TextDelta("lo"), ToolCallEvent(tool_call)]
+    done = events[-1]
+    assert isinstance(done, DoneEvent)
+    assert done.response.content == "Hello"
+    assert done.response.tool_call.get_all_tools()[0]["function"]["name"] == "fetch"
+    assert done.usage == {"eval_count": 3, "prompt_eval_count": 7}
+    assert done.stats.ttft is not None
+    assert done.stats.tokens == 2
+
+
+def test_consume_stream_prints_prefix_with_first_delta(capsys):
+    async def events():
+        print("检索中")
+        yield TextDelta("查询")
+        yield ToolCallEvent({})
+        yield ToolResultEvent("fetch", "ok")
+        print("工具完成")
+        yield TextDelta("回答")
+        yield DoneEvent(None, {})
+
+    done = asyncio.run(consume_stream(events()))
+
+    assert done == DoneEvent(None, {})
+    assert capsys.readouterr().out == "检索中\n模型: 查询工具完成\n模型: 回答"
@@ -0,0 +1,90 @@
+from core.memory import ContextMessage, ConversationMemory, estimate_tokens
+
+
+def add_turn(messages, i, tool_output=None):
+    messages.append(ContextMessage(role="user", content=f"context {i} " * 50))
+    messages.append({"role": "user", "content": f"question {i}"})
+    if tool_output is not None:
+        messages.append({"role": "tool", "content": tool_output})
+    messages.append({"role": "assistant", "content": f"answer {i}"})
+
+
+def test_keeps_system_prompt_and_latest_context():
+    memory = ConversationMemory(keep_recent_turns=10)
+    messages = [{"role": "system", "content": "sys"}]
+    for i in range(3):
+        add_turn(messages, i)
+
+    payload = memory.prepare(messages)
+
+    assert payload[0] == {"role": "system", "content": "sys"}
+    contexts = [m for m in payload if isinstance(m, ContextMessage)]
+    assert contexts == [messages[-3]]
+    assert [m["content"] for m in payload if m["role"] == "user"][-1] == "question 2"
+    assert memory.last_stats.saved_tokens > 0
+
+
+def test_old_turns_fold_into_summary():
+    memory = ConversationMemory(keep_recent_turns=2)
+    messages = [{"role": "system", "content": "sys"}]
+    for i in range(5):
+        add_turn(messages, i)
+
+    payload = memory.prepare(messages)
+
+    assert payload[1]["role"] == "system"
+    assert "question 0" in payload[1]["content"]
+    assert "context 0" not in payload[1]["content"]
+    assert [
+        m["content"]
+        for m in messages
+        if m["role"] == "user" and not isinstance(m, ContextMessage)
+    ] == [
+        "question 3",
+        "question 4",
+    ]
+    assert memory.last_stats.folded_turns == 3
+
+
+def test_token_budget_and_tool_truncation():
+    memory = ConversationMemory(
+        max_tokens=300, keep_recent_turns=10, max_tool_chars=100
+    )
+    messages = [{"role": "system", "content": "sys"}]
+    for i in range(4):
+        add_turn(messages, i, tool_output="x" * 2000)
+
+    payload = memory.prepare(messages)
+
+    assert sum(estimate_tokens(m["content"]) + 4 for m in payload) <= 300
+    assert all(len(m["content"]) < 200 for m in payload if m["role"] == "tool")
+    assert memory.last_stats.sent_tokens < memory.last_stats.history_tokens
+
+
+def test_truncated_tool_results_are_not_truncated_again():
+    memory = ConversationMemory(keep_recent_turns=10, max_tool_chars=100)
+    messages = [{"role": "system", "content": "sys"}]
+    add_turn(messages, 0, tool_output="x" * 550)
+    add_turn(messages, 1)
+    memory.prepare(messages)
+    tool = next(m for m in messages if m["role"] == "tool")
+    saved = memory.last_stats.saved_tokens
+
+    # 之后的轮次反复整理同一份历史，截断结果与节省量都不再变化
+    for i in range(2, 5):
+        add_turn(messages, i)
+        memory.prepare(messages)
+        assert next(m for m in messages if m["role"] == "tool") == tool
+
+    assert tool["content"].endswith("[已截断 450 字符]")
+    assert memory.last_stats.history_tokens - memory.last_stats.sent_tokens == (
+        memory.last_stats.saved_tokens
+    )
+    assert memory._removed_tokens == saved + sum(
+        estimate_tokens(f"context {i} " * 50) + 4 for i in range(1, 4)
+    )
+
+
+def test_estimate_tokens_counts_cjk_per_character():
+    assert estimate_tokens("你好世界") == 4
+    assert estimate_tokens("abcdefgh") == 2
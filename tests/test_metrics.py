@@ -0,0 +1,65 @@
+import asyncio
+import json
+
+from core.utils.metrics import NOOP_SPAN, Metrics
+
+
+def test_disabled_metrics_record_nothing():
+    metrics = Metrics()
+    with metrics.span("stage", a=1) as span:
+        span.set(b=2)
+    metrics.inc("calls_total")
+    metrics.observe("latency_seconds", 0.1)
+
+    assert metrics.span("stage") is NOOP_SPAN
+    assert not metrics.counters and not metrics.histograms
+    assert metrics.summary() == {}
+
+
+def test_nested_spans_and_summary():
+    metrics = Metrics(enabled=True)
+
+    async def run():
+        async with metrics.span("outer") as outer:
+            with metrics.span("inner", rows=3):
+                await asyncio.sleep(0)
+        return outer
+
+    outer = asyncio.run(run())
+    inner, recorded_outer = metrics._pending_spans
+    assert inner["name"] == "inner" and inner["attrs"] == {"rows": 3}
+    assert inner["parent_id"] == outer.span_id
+    assert recorded_outer["parent_id"] is None
+    assert metrics.summary()["outer"]["count"] == 1
+
+
+def test_prometheus_text_and_flush(tmp_path):
+    jsonl_path = tmp_path / "spans.jsonl"
+    prom_path = tmp_path / "metrics.prom"
+    metrics = Metrics(
+        enabled=True, jsonl_path=str(jsonl_path), prometheus_path=str(prom_path)
+    )
+    metrics.inc("cache_total", result="hit")
+    metrics.inc("cache_total", 2, result="hit")
+    metrics.inc("tool_calls_total", tool='a"b')
+    metrics.set_gauge("tokens_per_second", 42.5)
+    metrics.observe("ttft_seconds", 0.2)
+    try:
+        with metrics.span("tool", tool="read_file"):
+            raise ValueError("boom")
+    except ValueError:
+        pass
+    metrics.flush()
+
+    text = prom_path.read_text(encoding="utf-8")
+    assert 'cache_total{result="hit"} 3' in text
+    assert 'tool_calls_total{tool="a\\"b"} 1' in text
+    assert "tokens_per_second 42.5" in text
+    assert 'ttft_seconds_bucket{le="0.25"} 1' in text
+    assert 'ttft_seconds_bucket{le="0.1"} 0' in text
+    assert "ttft_seconds_count 1" in text
+
+    (record,) = [json.loads(line) for line in jsonl_path.read_text().splitlines()]
+    assert record["name"] == "tool"
+    assert record["attrs"] == {"tool": "read_file", "error": "ValueError"}
+    assert not metrics._pending_spans
@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+
+from benchmarks.fake_ollama import FakeOllama
+from core.agent import Agent
+from core.utils.embedding_retriever import EmbeddingRetriever
+from core.utils.http_client import HTTPClient
+from core.utils.model_lifecycle import ModelLifecycle, parse_keep_alive
+
+
+def test_parse_keep_alive():
+    assert parse_keep_alive("30m") == 1800
+    assert parse_keep_alive("1.5h") == 5400
+    assert parse_keep_alive(45) == 45
+    assert parse_keep_alive("-1") is None
+    assert parse_keep_alive(None) == 300
+    with pytest.raises(ValueError):
+        parse_keep_alive("soon")
+
+
+def test_preload_sends_keep_alive_and_options():
+    async def scenario():
+        async with FakeOllama(
+            tokens_per_second=0, response_tokens=1, load_seconds=0.05
+        ) as server:
+            http_client = HTTPClient()
+            lifecycle = ModelLifecycle(http_client, keep_alive="10m")
+            lifecycle.add_model(
+                "chat", "chat-model", server.chat_url, {"num_ctx": 4096}
+            )
+            lifecycle.add_model("embed", "embed-model", server.embed_url)
+            retriever = EmbeddingRetriever(
+                "embed-model",
+                server.embed_url,
+                http_client=http_client,
+                lifecycle=lifecycle,
+            )
+            agent = Agent(
+                "chat-model",
+                server.chat_url,
+                vector_database=retriever,
+                model_lifecycle=lifecycle,
+            )
+            await agent.init()
+            try:
+                await agent.warm_up()
+                loads_after_preload = server.loads
+                await retriever.embed_documents_batch(["alpha"])
+                await agent.invoke("hello", echo=False)
+            finally:
+                await agent.close()
+        return server, loads_after_preload, lifecycle.stats()
+
+    server, loads_after_preload, stats = asyncio.run(scenario())
+
+    assert loads_after_preload == 2
+    # 预热与正式请求使用相同的 options，不会触发重新加载
+    assert server.loads == 2
+    chat = server.last_payloads["chat"]
+    assert chat["keep_alive"] == "10m" and chat["options"] == {"num_ctx": 4096}
+    assert server.last_payloads["embed"]["keep_alive"] == "10m"
+    assert "options" not in server.last_payloads["embed"]
+    assert stats["chat-model"]["warmups"] == 1
+
+
+def test_models_are_rewarmed_before_keep_alive_expires():
+    async def scenario():
+        async with FakeOllama(load_seconds=0.01) as server:
+            http_client = HTTPClient()
+            lifecycle = ModelLifecycle(http_client, keep_alive=0.3, rewarm_margin=0.1)
+            lifecycle.add_model("embed", "embed-model", server.embed_url)
+            try:
+                await lifecycle.preload()
+                lifecycle.start()
+                await asyncio.sleep(1.0)
+            finally:
+                await lifecycle.stop()
+                await http_client.close()
+        return server, lifecycle
+
+    server, lifecycle = asyncio.run(scenario())
+
+    assert lifecycle.models["embed-model"].warmups >= 3
+    assert server.loads == 1
+
+
+def test_unitless_keep_alive_is_sent_as_number():
+    lifecycle = ModelLifecycle(HTTPClient(), keep_alive="-1")
+    lifecycle.add_model("chat", "chat-model", "url")
+    assert lifecycle.request_fields("chat-model")["keep_alive"] == -1
+    assert lifecycle.keep_alive_seconds is None
+    assert ModelLifecycle(HTTPClient(), keep_alive="45").keep_alive == 45
+    assert ModelLifecycle(HTTPClient(), keep_alive="30m").keep_alive == "30m"
+
+
+def test_keep_alive_zero_does_not_rewarm():
+    async def scenario():
+        async with FakeOllama() as server:
+            http_client = HTTPClient()
+            lifecycle = ModelLifecycle(http_client, keep_alive=0)
+            lifecycle.add_model("embed", "embed-model", server.embed_url)
+            try:
+                await lifecycle.preload()
+                lifecycle.start()
+                started = lifecycle._task is not None
+                await asyncio.sleep(0.2)
+            finally:
+                await lifecycle.stop()
+                await http_client.close()
+        return started, server.embed_requests
+
+    started, requests = asyncio.run(scenario())
+
+    assert not started
+    assert requests == 1
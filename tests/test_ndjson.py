@@ -0,0 +1,32 @@
+import asyncio
+
+from core.utils.ndjson import NDJSONDecoder, iter_ndjson
+
+
+def test_decoder_handles_arbitrary_chunk_boundaries():
+    payload = b'{"a": 1}\n{"b": "\xe4\xbd\xa0\xe5\xa5\xbd"}\n\n{"c": [1, 2]}'
+    for size in range(1, len(payload) + 1):
+        decoder = NDJSONDecoder()
+        objects = []
+        for start in range(0, len(payload), size):
+            objects.extend(decoder.feed(payload[start : start + size]))
+        objects.extend(decoder.flush())
+        assert objects == [{"a": 1}, {"b": "你好"}, {"c": [1, 2]}]
+
+
+def test_decoder_skips_malformed_lines():
+    decoder = NDJSONDecoder()
+    assert decoder.feed(b'{"a": 1}\nnot json\n{"b": 2}\n') == [{"a": 1}, {"b": 2}]
+    assert decoder.errors == 1
+
+
+def test_iter_ndjson_reads_stream():
+    class FakeStream:
+        async def iter_any(self):
+            for chunk in (b'{"x"', b': 1}\n{"y": 2}', b"\n"):
+                yield chunk
+
+    async def collect():
+        return [obj async for obj in iter_ndjson(FakeStream())]
+
+    assert asyncio.run(collect()) == [{"x": 1}, {"y": 2}]
@@ -1,14 +1,12 @@
-import os
+import shutil
 import subprocess
 import sys
 
 
 def test_npx_execution():
 
-    result = subprocess.run(
-        ["where", "npx"], check=True, capture_output=True, text=True
-    )
-    npx_path = result.stdout.strip().splitlines()[-1]
+    npx_path = shutil.which("npx")
+    assert npx_path is not None, "npx not found in system PATH"
     # 测试命令
     command = [npx_path, "-v"]  # 通过 npx 查看版本号，确认 npx 是否可用
 
@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+
+from benchmarks.fake_ollama import FakeOllama
+from core.utils.embedding_retriever import EmbeddingRetriever
+from core.utils.http_client import HTTPClient
+from core.utils.scheduler import (
+    BackendScheduler,
+    Priority,
+    QueueFullError,
+    QueueTimeoutError,
+)
+
+
+def test_interactive_requests_jump_ahead_of_bulk():
+    async def scenario():
+        scheduler = BackendScheduler(embed_in_flight=1)
+        order = []
+        gate = asyncio.Event()
+
+        async def job(name, priority):
+            async with scheduler.slot("embed", priority):
+                order.append(name)
+                await gate.wait()
+
+        first = asyncio.create_task(job("first", Priority.BULK))
+        await asyncio.sleep(0)
+        waiting = [
+            asyncio.create_task(job("bulk", Priority.BULK)),
+            asyncio.create_task(job("interactive", Priority.INTERACTIVE)),
+        ]
+        await asyncio.sleep(0)
+        depth = scheduler.lane("embed").queued
+        gate.set()
+        await asyncio.gather(first, *waiting)
+        return order, depth, scheduler.stats()["embed"]
+
+    order, depth, stats = asyncio.run(scenario())
+
+    assert order == ["first", "interactive", "bulk"]
+    assert depth == 2
+    assert stats["in_flight"] == 0 and stats["queued"] == 0
+    assert stats["granted"] == 3
+
+
+def test_backpressure_and_queue_timeout():
+    async def scenario():
+        scheduler = BackendScheduler(chat_in_flight=1, max_queue=1, queue_timeout=0.05)
+        lane = scheduler.lane("chat")
+        await lane.acquire()
+        waiter = asyncio.create_task(lane.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(QueueFullError):
+            await lane.acquire()
+        with pytest.raises(QueueTimeoutError):
+            await waiter
+        # 超时的等待者不会占用名额
+        lane.release()
+        await lane.acquire()
+        lane.release()
+        return lane.stats()
+
+    stats = asyncio.run(scenario())
+
+    assert stats["rejected"] == 1 and stats["timeouts"] == 1
+    assert stats["in_flight"] == 0 and stats["queued"] == 0
+
+
+def test_http_client_routes_requests_through_lanes():
+    async def scenario():
+        scheduler = BackendScheduler(embed_in_flight=1)
+        async with FakeOllama(embed_latency=0.01, embedding_dim=4) as server:
+            retriever = EmbeddingRetriever(
+                "embed",
+                server.embed_url,
+                batch_size=1,
+                http_client=HTTPClient(scheduler=scheduler),
+            )
+            try:
+                await retriever.embed_documents_batch(["a", "b", "c"])
+            finally:
+                await retriever.http_client.close()
+        return scheduler.stats()["embed"]
+
+    stats = asyncio.run(scenario())
+
+    assert stats["granted"] == 3
+    assert stats["avg_wait"] > 0
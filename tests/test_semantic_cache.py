@@ -0,0 +1,99 @@
+import asyncio
+
+from benchmarks.fake_ollama import FakeOllama
+from core.agent import Agent
+from core.utils.embedding_retriever import EmbeddingRetriever
+from core.utils.semantic_cache import SemanticCache, document_id
+
+
+def test_hit_requires_similarity_and_same_context():
+    cache = SemanticCache("embed", threshold=0.9)
+    cache.put([1.0, 0.0], ["a", "b"], "q", "answer")
+
+    assert cache.lookup([0.99, 0.05], ["a", "b"]).answer == "answer"
+    # 文档不同或语义相差较大时不命中
+    assert cache.lookup([0.99, 0.05], ["a", "c"]) is None
+    assert cache.lookup([0.5, 0.5], ["a", "b"]) is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+    assert document_id("x") == document_id("x") != document_id("y")
+
+
+def test_evicts_least_recently_hit():
+    cache = SemanticCache("embed", threshold=0.99, max_size=2)
+    cache.put([1.0, 0.0, 0.0], [], "q1", "a1")
+    cache.put([0.0, 1.0, 0.0], [], "q2", "a2")
+    assert cache.lookup([1.0, 0.0, 0.0], []) is not None
+    cache.put([0.0, 0.0, 1.0], [], "q3", "a3")
+
+    assert len(cache) == 2
+    assert cache.lookup([0.0, 1.0, 0.0], []) is None
+    assert cache.lookup([1.0, 0.0, 0.0], []).answer == "a1"
+    assert cache.evictions == 1
+
+
+def test_persistence_checks_embedding_model(tmp_path):
+    path = str(tmp_path / "responses.npz")
+    cache = SemanticCache("embed", path=path)
+    cache.put([0.6, 0.8], ["doc"], "问题", "回答")
+    cache.save()
+
+    restored = SemanticCache("embed", path=path)
+    assert restored.load() == 1
+    assert restored.lookup([0.6, 0.8], ["doc"]).answer == "回答"
+    assert SemanticCache("other", path=path).load() == 0
+
+
+def test_agent_replays_cached_answer_only_for_first_turns():
+    async def scenario(tool_name=None):
+        async with FakeOllama(
+            tokens_per_second=0, response_tokens=4, tool_name=tool_name
+        ) as server:
+            retriever = EmbeddingRetriever("embed", server.embed_url, hybrid=False)
+            await retriever.embed_documents_batch(
+                ["the weather in paris is sunny", "python is a language"]
+            )
+            agent = Agent(
+                "chat",
+                server.chat_url,
+                clients=[],
+                vector_database=retriever,
+                response_cache=SemanticCache("embed", threshold=0.95),
+            )
+            await agent.init()
+            try:
+                first = await agent.invoke("weather in paris", echo=False)
+                session = agent.fork()
+                second = await session.invoke("Weather in Paris?", echo=False)
+                messages = session.llm._prepare_messages()
+                requests_before_follow_up = server.chat_requests
+                # 同一会话的后续提问依赖前文，既不命中也不写入缓存
+                await session.invoke("weather in paris", echo=False)
+                follow_up_requests = server.chat_requests - requests_before_follow_up
+            finally:
+                await agent.close()
+        return (
+            first,
+            second,
+            messages,
+            requests_before_follow_up,
+            follow_up_requests,
+            agent.response_cache,
+        )
+
+    first, second, messages, chat_requests, follow_up, cache = asyncio.run(scenario())
+    assert second == first
+    assert chat_requests == 1
+    assert follow_up == 1
+    assert len(cache) == 1
+    assert cache.stats()["hits"] == 1
+    # 命中时对话历史与正常回答一致
+    assert messages[-2:] == [
+        {"role": "user", "content": "Weather in Paris?"},
+        {"role": "assistant", "content": first},
+    ]
+
+    # 调用工具的回答不缓存
+    _, _, _, chat_requests, _, cache = asyncio.run(scenario(tool_name="fetch"))
+    assert len(cache) == 0
+    assert chat_requests == 4
@@ -0,0 +1,135 @@
+import asyncio
+import json
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+from benchmarks.fake_ollama import FakeOllama
+from core.agent import Agent
+from core.server import create_app
+from core.session import SessionLimitError, SessionManager
+
+
+async def make_agent(server: FakeOllama) -> Agent:
+    agent = Agent("model", server.chat_url, sys_prompt="sys")
+    await agent.init()
+    return agent
+
+
+def user_messages(session):
+    return [m["content"] for m in session.agent.llm.messages if m["role"] == "user"]
+
+
+def test_sessions_have_independent_history_and_shared_resources():
+    async def scenario():
+        async with FakeOllama(tokens_per_second=0, response_tokens=2) as server:
+            agent = await make_agent(server)
+            manager = SessionManager(agent, max_sessions=2)
+            first, second = manager.create(), manager.create()
+            try:
+                await asyncio.gather(
+                    first.agent.invoke("one", echo=False),
+                    second.agent.invoke("two", echo=False),
+                )
+                await first.agent.invoke("three", echo=False)
+                with pytest.raises(SessionLimitError):
+                    manager.create()
+            finally:
+                await agent.close()
+        return agent, first, second
+
+    agent, first, second = asyncio.run(scenario())
+
+    assert user_messages(first) == ["one", "three"]
+    assert user_messages(second) == ["two"]
+    assert agent.llm.messages == [{"role": "system", "content": "sys"}]
+    assert first.agent.http_client is agent.http_client
+    assert first.agent.tool_registry is agent.tool_registry
+
+
+def test_idle_sessions_are_evicted():
+    async def scenario():
+        async with FakeOllama() as server:
+            agent = await make_agent(server)
+            manager = SessionManager(agent, max_sessions=1, idle_timeout=0.01)
+            try:
+                old = manager.create()
+                await asyncio.sleep(0.02)
+                new = manager.create()
+            finally:
+                await agent.close()
+        return manager, old, new
+
+    manager, old, new = asyncio.run(scenario())
+
+    assert manager.get(old.id) is None
+    assert manager.get(new.id) is new
+    assert manager.evicted == 1
+
+
+def test_sessions_with_open_websocket_are_not_evicted():
+    async def scenario():
+        async with FakeOllama(tokens_per_second=0, response_tokens=1) as server:
+            agent = await make_agent(server)
+            manager = SessionManager(agent, max_sessions=1, idle_timeout=0.01)
+            client = TestClient(TestServer(create_app(manager)))
+            await client.start_server()
+            try:
+                session = manager.create()
+                ws = await client.ws_connect(f"/sessions/{session.id}/ws")
+                await ws.send_json({"prompt": "hi"})
+                while (await ws.receive_json())["type"] != "done":
+                    pass
+                await asyncio.sleep(0.02)
+                evicted_while_open = manager.evict_idle()
+                with pytest.raises(SessionLimitError):
+                    manager.create()
+                await ws.close()
+                await asyncio.sleep(0.02)
+                evicted_after_close = manager.evict_idle()
+            finally:
+                await client.close()
+                await agent.close()
+        return evicted_while_open, evicted_after_close
+
+    assert asyncio.run(scenario()) == (0, 1)
+
+
+def test_http_and_websocket_streaming():
+    async def scenario():
+        async with FakeOllama(tokens_per_second=0, response_tokens=2) as server:
+            agent = await make_agent(server)
+            client = TestClient(TestServer(create_app(SessionManager(agent))))
+            await client.start_server()
+            try:
+                response = await client.post("/sessions")
+                session_id = (await response.json())["session_id"]
+
+                response = await client.post(
+                    f"/sessions/{session_id}/chat", json={"prompt": "hi"}
+                )
+                lines = (await response.text()).splitlines()
+                http_events = [json.loads(line) for line in lines]
+
+                ws = await client.ws_connect(f"/sessions/{session_id}/ws")
+                await ws.send_json({"prompt": "again"})
+                ws_events = []
+                while not ws_events or ws_events[-1]["type"] != "done":
+                    ws_events.append(await ws.receive_json())
+                await ws.close()
+
+                missing = await client.post("/sessions/nope/chat", json={"prompt": "x"})
+                closed = await client.delete(f"/sessions/{session_id}")
+                health = await (await client.get("/health")).json()
+            finally:
+                await client.close()
+                await agent.close()
+        return http_events, ws_events, missing.status, closed.status, health
+
+    http_events, ws_events, missing, closed, health = asyncio.run(scenario())
+
+    assert [e["type"] for e in http_events] == ["text", "text", "done"]
+    assert http_events[-1]["content"] == "tok0 tok1 "
+    assert ws_events[-1]["content"] == "tok0 tok1 "
+    assert missing == 404 and closed == 200
+    assert health["sessions"] == 0
@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+from benchmarks.fake_ollama import FakeOllama
+from core.agent import Agent
+from core.startup import Startup
+from core.utils.embedding_retriever import EmbeddingRetriever
+
+
+def test_stages_run_concurrently_and_failures_stay_in_background():
+    async def fail(error: Exception):
+        await asyncio.sleep(0.01)
+        raise error
+
+    async def scenario():
+        startup = Startup()
+        startup.background("slow", asyncio.sleep(0.1))
+        startup.background("broken", fail(RuntimeError("boom")))
+        await startup.run("critical", asyncio.sleep(0.02))
+        startup.mark("ready")
+        pending = startup.pending
+        await startup.wait()
+        with pytest.raises(ValueError):
+            await startup.run("critical_failure", fail(ValueError("bad")))
+        return startup, pending
+
+    startup, pending = asyncio.run(scenario())
+
+    assert pending == ["slow"]
+    assert startup.milestones["ready"] < 0.1
+    assert startup.stages["slow"]["status"] == "ok"
+    assert startup.stages["broken"] == {
+        "start": startup.stages["broken"]["start"],
+        "status": "failed",
+        "error": "boom",
+        "duration": startup.stages["broken"]["duration"],
+    }
+    assert startup.stages["critical_failure"]["status"] == "failed"
+    report = startup.report()
+    assert "critical" in report and "boom" in report
+
+
+def test_agent_answers_while_retrieval_is_warming():
+    async def scenario():
+        async with FakeOllama(
+            tokens_per_second=0, response_tokens=2, embed_latency=0.05
+        ) as server:
+            retriever = EmbeddingRetriever("embed", server.embed_url)
+            agent = Agent("model", server.chat_url, vector_database=retriever)
+            startup = Startup()
+            retriever.begin_warming()
+
+            async def ingest():
+                try:
+                    await retriever.embed_documents_batch(["alpha doc", "beta doc"])
+                finally:
+                    retriever.finish_warming()
+
+            startup.background("ingestion", ingest())
+            startup.background("warm_up", agent.warm_up())
+            try:
+                await startup.run("init", agent.init())
+                status_at_ready = retriever.status
+                answer = await agent.invoke("hello", echo=False)
+                await startup.wait()
+            finally:
+                await agent.close()
+        return status_at_ready, answer, retriever.status, startup, server
+
+    status_at_ready, answer, status, startup, server = asyncio.run(scenario())
+
+    assert status_at_ready == "warming"
+    assert answer == "tok0 tok1 "
+    assert status == "ready"
+    assert startup.stages["warm_up"]["status"] == "ok"
+    assert server.chat_requests == 2
@@ -0,0 +1,67 @@
+from types import SimpleNamespace
+
+from core.tool_registry import ToolRegistry
+
+
+class FakeClient:
+    def __init__(self, name, tool_names):
+        self.name = name
+        self.set_tools(tool_names)
+
+    def set_tools(self, tool_names, description="desc"):
+        self.tools = [
+            SimpleNamespace(name=n, description=description, inputSchema={})
+            for n in tool_names
+        ]
+
+    def get_all_tools(self):
+        return self.tools
+
+
+def exposed_names(registry):
+    return sorted(t["function"]["name"] for t in registry.tool_calls.get_all_tools())
+
+
+def test_resolve_plain_and_namespaced_names():
+    fetch = FakeClient("fetch", ["fetch"])
+    files = FakeClient("files", ["read_file", "write_file"])
+    registry = ToolRegistry()
+    registry.register(fetch)
+    registry.register(files)
+
+    assert exposed_names(registry) == ["fetch", "read_file", "write_file"]
+    assert registry.resolve("read_file").client is files
+    assert registry.resolve("files__read_file").client is files
+    assert registry.resolve("fetch__read_file") is None
+    assert registry.resolve("missing") is None
+
+
+def test_collisions_are_namespaced():
+    a = FakeClient("a", ["search", "only_a"])
+    b = FakeClient("b", ["search"])
+    registry = ToolRegistry()
+    registry.register(a)
+    registry.register(b)
+
+    assert exposed_names(registry) == ["a__search", "b__search", "only_a"]
+    assert registry.resolve("search") is None
+    assert registry.resolve("b__search").client is b
+
+    registry.unregister(b)
+    assert exposed_names(registry) == ["only_a", "search"]
+    assert registry.resolve("search").client is a
+
+
+def test_refresh_is_incremental():
+    client = FakeClient("files", ["read_file", "write_file"])
+    registry = ToolRegistry(namespaced=True)
+    registry.register(client)
+    unchanged = registry.resolve("files__read_file")
+
+    client.set_tools(["read_file", "list_directory"])
+    client.tools[0] = unchanged.tool
+    registry.refresh(client)
+
+    assert exposed_names(registry) == ["files__list_directory", "files__read_file"]
+    assert registry.resolve("files__read_file") is unchanged
+    assert registry.resolve("files__write_file") is None
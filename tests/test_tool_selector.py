@@ -0,0 +1,108 @@
+import asyncio
+from types import SimpleNamespace
+
+from benchmarks.fake_ollama import FakeOllama
+from core.agent import Agent
+from core.tool_registry import ToolRegistry
+from core.tool_selector import ToolSelector
+from core.utils.embedding_retriever import EmbeddingRetriever
+
+TOOLS = {
+    "fetch": "fetch a web page from a url on the internet",
+    "read_file": "read the contents of a file on disk",
+    "write_file": "write text content into a file on disk",
+    "list_directory": "list entries of a directory",
+    "search_files": "search files by name pattern",
+    "get_weather": "get the weather forecast for a city",
+    "send_email": "send an email message to a recipient",
+    "list_allowed_directories": "list directories the server may access",
+}
+
+
+class FakeClient:
+    def __init__(self, name, tools):
+        self.name = name
+        self.tools = [
+            SimpleNamespace(
+                name=n, description=d, inputSchema={"type": "object", "doc": d * 5}
+            )
+            for n, d in tools.items()
+        ]
+
+    def get_all_tools(self):
+        return self.tools
+
+    async def connect_to_server(self):
+        pass
+
+    async def close_connection(self):
+        pass
+
+
+def test_selects_relevant_and_pinned_tools():
+    async def scenario():
+        async with FakeOllama() as server:
+            retriever = EmbeddingRetriever("embed", server.embed_url)
+            registry = ToolRegistry()
+            registry.register(FakeClient("local", TOOLS))
+            selector = ToolSelector(
+                retriever, registry, top_n=2, pinned=["list_allowed_directories"]
+            )
+            try:
+                weather = await selector.select("what is the weather in the city")
+                again = await selector.select("what is the weather in the city")
+                email = await selector.select("send an email to my friend")
+                unmatched = await selector.select("xyzzy")
+                lexical_requests = server.embed_requests
+                # 检索已经计算过提问向量时复用它排序
+                await retriever.embed_query("forecast for Paris tomorrow")
+                forecast = await selector.select("forecast for Paris tomorrow")
+            finally:
+                await retriever.http_client.close()
+        return weather, again, email, unmatched, forecast, lexical_requests, server
+
+    weather, again, email, unmatched, forecast, lexical_requests, server = asyncio.run(
+        scenario()
+    )
+
+    assert "get_weather" in weather.names
+    assert "list_allowed_directories" in weather.names
+    assert len(weather.names) == 3
+    # 同一组工具复用缓存的序列化结果
+    assert again is weather
+    assert "send_email" in email.names
+    assert weather.total_tools == len(TOOLS)
+    assert weather.saved_tokens > 0
+    # 没有任何工具匹配时发送全部工具
+    assert len(unmatched.names) == len(TOOLS)
+    assert "get_weather" in forecast.names and len(forecast.names) == 3
+    # 工具描述只编码一次，选工具本身不为提问请求嵌入
+    assert lexical_requests == 1
+    assert server.embed_requests == 2
+
+
+def test_agent_sends_only_selected_tools():
+    async def scenario():
+        async with FakeOllama(tokens_per_second=0, response_tokens=1) as server:
+            retriever = EmbeddingRetriever("embed", server.embed_url, hybrid=False)
+            agent = Agent(
+                "chat",
+                server.chat_url,
+                clients=[FakeClient("local", TOOLS)],
+                vector_database=retriever,
+                tool_top_n=2,
+            )
+            await agent.init()
+            try:
+                await agent.invoke("read the file on disk", echo=False)
+            finally:
+                await agent.close()
+        return server.last_payloads["chat"], server.embed_requests
+
+    payload, embed_requests = asyncio.run(scenario())
+
+    names = [tool["function"]["name"] for tool in payload["tools"]]
+    assert len(names) == 2 and "read_file" in names
+    assert payload["messages"][-1]["content"] == "read the file on disk"
+    # 工具描述一次、检索提问一次，选工具复用检索的提问向量
+    assert embed_requests == 2
@@ -0,0 +1,92 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from core.utils.vector_store import VectorStore
+
+
+def build_store(vectors):
+    store = VectorStore(initial_capacity=2)
+    for i, vector in enumerate(vectors):
+        asyncio.run(store.add_embedding(vector, f"doc-{i}"))
+    return store
+
+
+def brute_force(vectors, query, top_k):
+    scores = []
+    for i, vector in enumerate(vectors):
+        score = np.dot(vector, query) / (np.linalg.norm(vector) * np.linalg.norm(query))
+        scores.append((score, f"doc-{i}"))
+    scores.sort(reverse=True, key=lambda x: x[0])
+    return [doc for _, doc in scores[:top_k]]
+
+
+def test_search_matches_brute_force():
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(50, 16)).tolist()
+    store = build_store(vectors)
+    query = rng.normal(size=16).tolist()
+
+    assert asyncio.run(store.search(query, 5)) == brute_force(vectors, query, 5)
+    assert len(store) == 50
+
+
+def test_search_batch_matches_single_queries():
+    rng = np.random.default_rng(1)
+    store = build_store(rng.normal(size=(30, 8)).tolist())
+    queries = rng.normal(size=(4, 8)).tolist()
+
+    batch = asyncio.run(store.search_batch(queries, 3))
+    assert batch == [asyncio.run(store.search(q, 3)) for q in queries]
+
+
+def test_zero_query_returns_first_documents():
+    store = build_store([[1.0, 0.0], [0.0, 1.0], [1.0, 1.0]])
+    assert asyncio.run(store.search([0.0, 0.0], 2)) == ["doc-0", "doc-1"]
+
+
+def test_top_k_larger_than_store():
+    store = build_store([[1.0, 0.0], [0.0, 1.0]])
+    assert asyncio.run(store.search([0.0, 1.0], 10)) == ["doc-1", "doc-0"]
+
+
+def test_invalid_input():
+    store = build_store([[1.0, 0.0]])
+    with pytest.raises(ValueError):
+        asyncio.run(store.add_embedding("not a vector", "doc"))
+    with pytest.raises(ValueError):
+        asyncio.run(store.add_embedding([1.0, 0.0, 0.0], "doc"))
+    with pytest.raises(ValueError):
+        asyncio.run(store.search([1.0, 0.0, 0.0]))
+
+
+@pytest.mark.parametrize("mode", ["float16", "int8"])
+def test_quantized_search_rescores_with_exact_vectors(mode):
+    rng = np.random.default_rng(2)
+    vectors = rng.normal(size=(200, 32))
+    exact = VectorStore()
+    quantized = VectorStore(quantization=mode)
+    half = np.asarray(vectors[:100], dtype=np.float32)
+    half /= np.linalg.norm(half, axis=1, keepdims=True)
+    for store in (exact, quantized):
+        store.attach(half.copy(), [f"doc-{i}" for i in range(100)])
+        for i, vector in enumerate(vectors[100:], start=100):
+            asyncio.run(store.add_embedding(vector.tolist(), f"doc-{i}"))
+    queries = rng.normal(size=(5, 32))
+
+    for query in queries:
+        expected = exact.search_ids(query, 5)
+        actual = quantized.search_ids(query, 5)
+        assert [i for i, _ in actual] == [i for i, _ in expected]
+        assert np.allclose([s for _, s in actual], [s for _, s in expected])
+    assert np.allclose(quantized.rows([3, 150]), exact.rows([3, 150]))
+
+    stats = quantized.memory_stats()
+    assert stats["mode"] == mode and stats["vectors"] == 200
+    assert stats["bytes_per_vector"] <= exact.memory_stats()["bytes_per_vector"] / 2
+
+
+def test_unknown_quantization_mode():
+    with pytest.raises(ValueError):
+        VectorStore(quantization="int4")